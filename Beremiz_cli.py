@@ -75,12 +75,14 @@ def build(session, target):
     return processor
 
 @cli.command()
+@click.option('--hot-reload', is_flag=True,
+              help="Replace running PLC without stopping it.")
 @pass_session
 @ensure_controller
-def transfer(session):
+def transfer(session, hot_reload):
     """Transfer program to PLC runtim."""
     def processor():
-        return session.controller.transfer_project()
+        return session.controller.transfer_project(hot_reload)
     return processor
 
 @cli.command()
@@ -92,6 +94,26 @@ def run(session):
         return session.controller.run_project()
     return processor
 
+@cli.command()
+@click.option(
+    "--prune", is_flag=True,
+    help="Remove least recently used entries exceeding cache size."
+)
+@click.option(
+    "--max-size", type=int, metavar="MB",
+    help="Cache size to prune to, instead of configured one."
+)
+@click.option(
+    "--clear", is_flag=True, help="Remove all entries."
+)
+@pass_session
+@ensure_controller
+def cache(session, prune, max_size, clear):
+    """Show or prune build cache. """
+    def processor():
+        return session.controller.manage_build_cache(prune, max_size, clear)
+    return processor
+
 
 @cli.resultcallback()
 @pass_session
@@ -14,6 +14,7 @@ import fake_wx
 from ProjectController import ProjectController
 from LocalRuntimeMixin import LocalRuntimeMixin
 from runtime.loglevels import LogLevelsCount, LogLevels
+from util.BuildCache import BuildCache
 
 
 class Log:
@@ -123,15 +124,11 @@ class CLIController(LocalRuntimeMixin, ProjectController):
                         dump_end = max(-1, count - 10)
                     else:
                         dump_end = prev - 1
-                    for msgidx in range(count-1, dump_end, -1):
-                        message = connector.GetLogMessage(level, msgidx)
-                        if message is not None:
-                            msg, _tick, tv_sec, tv_nsec = message
-                            date = datetime.utcfromtimestamp(tv_sec + tv_nsec * 1e-9)
-                            txt = "%s at %s: %s\n" % (LogLevels[level], date.isoformat(' '), msg)
-                            new_messages.append((date,txt))
-                        else:
-                            break
+                    for _msgidx, msg, _tick, tv_sec, tv_nsec in \
+                            connector.IterLogMessages(level, count-1, dump_end):
+                        date = datetime.utcfromtimestamp(tv_sec + tv_nsec * 1e-9)
+                        txt = "%s at %s: %s\n" % (LogLevels[level], date.isoformat(' '), msg)
+                        new_messages.append((date,txt))
                 self.previous_log_count[level] = count
             new_messages.sort()
             for date, txt in new_messages:
@@ -162,9 +159,9 @@ class CLIController(LocalRuntimeMixin, ProjectController):
 
     @with_project_loaded
     @connected
-    def transfer_project(self):
+    def transfer_project(self, hot_reload=False):
 
-        return 0 if self._Transfer() else 1
+        return 0 if self._Transfer(hot_reload) else 1
 
     @with_project_loaded
     @connected
@@ -173,6 +170,20 @@ class CLIController(LocalRuntimeMixin, ProjectController):
         return 0 if self._Run() else 1
         
 
+    def manage_build_cache(self, prune, max_size, clear):
+        cache = BuildCache()
+        if clear:
+            max_size = 0
+        elif max_size is not None:
+            max_size = max_size * 1024 * 1024
+        if prune or clear:
+            removed, freed = cache.Prune(max_size)
+            self.logger.write("Removed %d entries, %.1f MB\n" % (removed, freed / 1048576.))
+        self.logger.write("Build cache %s, %.1f MB max\n" % (cache.path, cache.max_size / 1048576.))
+        for kind, (count, size) in sorted(cache.GetStats().items()):
+            self.logger.write("   %s : %d entries, %.1f MB\n" % (kind, count, size / 1048576.))
+        return 0
+
     def finish(self):
 
         self._Disconnect()
@@ -263,6 +263,27 @@ class ConfigTreeNode(object):
             instances.extend(CTNChild._GlobalInstances())
         return instances
 
+    def CTNExclusiveResources(self):
+        """
+        Resources (network ports, serial devices...) that another PLC can't
+        use while this one runs. PLC can't be hot reloaded if both use one.
+        @return: ["kind:name",...] i.e. ["tcp:502", "serial:/dev/ttyS0"],
+        None if unknown, then PLC is never hot reloaded
+        """
+        return None
+
+    def _ExclusiveResources(self):
+        resources = self.CTNExclusiveResources()
+        if resources is None:
+            return None
+        resources = list(resources)
+        for CTNChild in self.IECSortedChildren():
+            child_resources = CTNChild._ExclusiveResources()
+            if child_resources is None:
+                return None
+            resources.extend(child_resources)
+        return resources
+
     def CTNGenerate_C(self, buildpath, locations):
         """
         Generate C code
@@ -39,12 +39,13 @@ import tempfile
 import hashlib
 from datetime import datetime
 from weakref import WeakKeyDictionary
-from functools import reduce
+from functools import reduce, partial
 from itertools import izip
 from distutils.dir_util import copy_tree
 from six.moves import xrange
 
 import wx
+import numpy as np
 
 import features
 import connectors
@@ -52,17 +53,21 @@ import util.paths as paths
 from util.misc import CheckPathPerm, GetClassImporter
 from util.MiniTextControler import MiniTextControler
 from util.ProcessLogger import ProcessLogger
+from util.BuildCache import BuildCache, HashKey
+from util.POUsSplitter import SplitPOUsC, GetResourcePreamble, POUS_C_INCLUDE
 from util.BitmapLibrary import GetBitmap
 from editors.FileManagementPanel import FileManagementPanel
 from editors.ProjectNodeEditor import ProjectNodeEditor
 from editors.IECCodeViewer import IECCodeViewer
 from editors.DebugViewer import DebugViewer, REFRESH_PERIOD
+from graphics.DebugDataConsumer import DebugValuesColumn
 from dialogs import UriEditor, IDManager
 from PLCControler import PLCControler
 from plcopen.structures import IEC_KEYWORDS
 from plcopen.types_enums import ComputeConfigurationResourceName, ITEM_CONFNODE
 import targets
-from runtime.typemapping import DebugTypesSize, UnpackDebugBuffer
+from runtime.typemapping import DebugTypesSize, DebugTypesStructFormat, \
+    UnpackDebugBuffer, DeltaDebugBufferUnpacker
 from runtime import PlcStatus
 from ConfigTreeNode import ConfigTreeNode, XSDSchemaErrorMessage
 from POULibrary import UserAddressedException
@@ -72,6 +77,14 @@ base_folder = paths.AbsParentDir(__file__)
 MATIEC_ERROR_MODEL = re.compile(
     r".*\.st:(\d+)-(\d+)\.\.(\d+)-(\d+): (?:error)|(?:warning) : (.*)$")
 
+# Debugger buffers and lists sizes : (name, default, minimum)
+DEBUGGER_SETTINGS = [
+    ("Trace_Buffer_Size", 4096, 64),
+    ("Trace_List_Size", 1024, 1),
+    ("Trace_Ring_Size", 16, 2),
+    ("Force_Buffer_Size", 1024, 8),
+    ("Force_List_Size", 256, 1)]
+
 
 def ExtractChildrenTypesFromCatalog(catalog):
     children_types = []
@@ -103,6 +116,7 @@ class Iec2CSettings(object):
     def __init__(self, controler):
         self.iec2c = None
         self.iec2c_buildopts = None
+        self.iec2c_version = None
         self.ieclib_path = self.findLibPath()
         self.ieclib_c_path = self.findLibCPath()
         self.controler = controler
@@ -179,6 +193,26 @@ class Iec2CSettings(object):
             self.iec2c_buildopts = self.findSupportedOptions()
         return self.iec2c_buildopts
 
+    def getVersion(self):
+        """
+        Returns IEC to C compiler version and binary identity,
+        part of build cache keys
+        """
+        if self.iec2c_version is None:
+            cmd = self.getCmd()
+            try:
+                _status, result, _err_result = ProcessLogger(
+                    None, "\"%s\" -v" % cmd).spin()
+            except Exception:
+                result = ""
+            try:
+                st = os.stat(cmd)
+                result += "%d %d" % (st.st_size, st.st_mtime)
+            except OSError:
+                pass
+            self.iec2c_version = result
+        return self.iec2c_version
+
     def getLibPath(self):
         return self.ieclib_path
 
@@ -188,6 +222,21 @@ class Iec2CSettings(object):
         return self.ieclib_c_path
 
 
+def GetDebugFramesDType(indexes, delta):
+    """
+    Return numpy record type matching trace frames holding given types,
+    or None if frames have no fixed layout or hold values that are
+    not plain numbers (STRING, TIME...)
+    """
+    if delta or not indexes or \
+       any([t not in DebugTypesStructFormat or t in ["TIME", "TOD", "DATE", "DT"]
+            for t in indexes]):
+        return None
+    # BOOL is stored in a byte, converted to bool once decoded
+    return np.dtype([("v%d" % i, "=" + ("B" if t == "BOOL" else DebugTypesStructFormat[t]))
+                     for i, t in enumerate(indexes)])
+
+
 def GetProjectControllerXSD():
     XSD = """<?xml version="1.0" encoding="ISO-8859-1" ?>
     <xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema">
@@ -210,9 +259,23 @@ def GetProjectControllerXSD():
                                for libname, _lib, default in features.libraries]) + """
               </xsd:complexType>
             </xsd:element>""") if len(features.libraries) > 0 else '') + """
+            <xsd:element name="Debugger" minOccurs="0">
+              <xsd:complexType>
+              """ + "\n              ".join([
+                  """<xsd:attribute name="%s" use="optional" default="%d">
+                <xsd:simpleType>
+                  <xsd:restriction base="xsd:integer">
+                    <xsd:minInclusive value="%d"/>
+                  </xsd:restriction>
+                </xsd:simpleType>
+              </xsd:attribute>""" % setting for setting in DEBUGGER_SETTINGS]) + """
+              <xsd:attribute name="Trace_Delta" type="xsd:boolean" use="optional" default="false"/>
+              </xsd:complexType>
+            </xsd:element>
           </xsd:sequence>
           <xsd:attribute name="URI_location" type="xsd:string" use="optional" default=""/>
           <xsd:attribute name="Disable_Extensions" type="xsd:boolean" use="optional" default="false"/>
+          <xsd:attribute name="Incremental_Build" type="xsd:boolean" use="optional" default="false"/>
         </xsd:complexType>
       </xsd:element>
     </xsd:schema>
@@ -250,8 +313,7 @@ class ProjectController(ConfigTreeNode, PLCControler):
         self._builder = None
         self._connector = None
         self.DispatchDebugValuesTimer = None
-        self.DebugValuesBuffers = []
-        self.DebugTicks = []
+        self.DebugDispatchEarliest = 0
         self.SetAppFrame(frame, logger)
 
         # Setup debug information
@@ -378,6 +440,20 @@ class ProjectController(ConfigTreeNode, PLCControler):
         else:
             return "Linux"
 
+    def GetDebuggerSettings(self):
+        """
+        Return sizes of debugger buffers and lists, and trace mode,
+        as set in project
+        """
+        settings = {}
+        for name, default in [setting[:2] for setting in DEBUGGER_SETTINGS] + \
+                             [("Trace_Delta", False)]:
+            value = None
+            if self.BeremizRoot.Debugger is not None:
+                value = getattr(self.BeremizRoot.Debugger, name)
+            settings[name] = value if value is not None else default
+        return settings
+
     def GetTarget(self):
         target = self.BeremizRoot.getTargetType()
         if target.getcontent() is None:
@@ -824,8 +900,128 @@ class ProjectController(ConfigTreeNode, PLCControler):
             self.logger.write(_("IEC program did no change, not re-compiling into C code.\n"))
             return True
 
-        self.logger.write(_("Compiling IEC Program into C code...\n"))
         buildpath = self._getBuildPath()
+        cache = BuildCache()
+        cachekey = HashKey(self.IECcodeDigest,
+                           self.iec2c_cfg.getVersion(),
+                           self.iec2c_cfg.getOptions(),
+                           iec2c_libpath)
+        result = cache.GetIEC2CResult(cachekey, buildpath)
+        if result is not None:
+            self.logger.write(_("IEC program found in build cache, not re-compiling into C code.\n"))
+        else:
+            result = self._Run_iec2c(buildpath, iec2c_libpath, cache, cachekey)
+            if result is None:
+                return False
+
+        # Now extract C files of stdout
+        C_files = [fname for fname in result.splitlines() if fname[
+            -2:] == ".c" or fname[-2:] == ".C"]
+        # remove those that are not to be compiled because included by others
+        C_files.remove("POUS.c")
+        if not C_files:
+            self.logger.write_error(
+                _("Error : At least one configuration and one resource must be declared in PLC !\n"))
+            return False
+        # transform those base names to full names with path
+        C_files = map(
+            lambda filename: os.path.join(buildpath, filename), C_files)
+
+        # prepend beremiz include to configuration header
+        H_files = [fname for fname in result.splitlines() if fname[
+            -2:] == ".h" or fname[-2:] == ".H"]
+        H_files.remove("LOCATED_VARIABLES.h")
+        H_files = map(
+            lambda filename: os.path.join(buildpath, filename), H_files)
+        for H_file in H_files:
+            with open(H_file, 'r') as original:
+                data = original.read()
+            with open(H_file, 'w') as modified:
+                modified.write('#include "beremiz.h"\n' + data)
+
+        if self.BeremizRoot.getIncremental_Build():
+            C_files = self._SplitPOUsC(buildpath, C_files)
+
+        self.logger.write(_("Extracting Located Variables...\n"))
+        # Keep track of generated located variables for later use by
+        # self._Generate_C
+        self.PLCGeneratedLocatedVars = self.GetLocations()
+        # Keep track of generated C files for later use by self.CTNGenerate_C
+        self.PLCGeneratedCFiles = C_files
+        # compute CFLAGS for plc
+        self.plcCFLAGS = '"-I%s" -Wno-unused-function' % self.iec2c_cfg.getLibCPath()
+
+        self.LastBuiltIECcodeDigest = self.IECcodeDigest
+
+        return True
+
+    def _SplitPOUsC(self, buildpath, C_files):
+        """
+        Split POUS.c in one C file per POU, compiled separately instead of
+        being included in resources C files, so that only changed POUs
+        are compiled again.
+        @return: C files to compile
+        """
+        with open(os.path.join(buildpath, "POUS.c")) as f:
+            units = SplitPOUsC(f.read())
+        resources = {}
+        for C_file in C_files:
+            with open(C_file) as f:
+                data = f.read()
+            if POUS_C_INCLUDE in data:
+                resources[C_file] = data
+        preambles = [GetResourcePreamble(data) for data in resources.values()]
+        if units is None or not preambles or None in preambles:
+            self.logger.write_warning(
+                _("Generated POUs C code can't be split, it is built as a whole.\n"))
+            return C_files
+
+        # split POU files are rewritten only if changed,
+        # so that build finds them unchanged
+        pou_files = []
+        written = 0
+        for pouname, code in units:
+            pou_file = os.path.join(buildpath, "POUS_%s.c" % pouname)
+            data = preambles[0] + code
+            try:
+                with open(pou_file) as f:
+                    unchanged = f.read() == data
+            except IOError:
+                unchanged = False
+            if not unchanged:
+                with open(pou_file, "w") as f:
+                    f.write(data)
+                written += 1
+            pou_files.append(pou_file)
+        for fname in os.listdir(buildpath):
+            path = os.path.join(buildpath, fname)
+            if fname.startswith("POUS_") and fname.endswith(".c") and \
+               path not in pou_files:
+                os.remove(path)
+
+        for C_file, data in resources.iteritems():
+            with open(C_file, "w") as f:
+                f.write(data.replace(POUS_C_INCLUDE, "/* POUs are in POUS_*.c files */"))
+
+        self.logger.write(_("POUs C code split in %d files, %d changed\n") %
+                          (len(pou_files), written))
+        return C_files + pou_files
+
+    def _GetBuildPathFilesStat(self, buildpath):
+        stats = {}
+        for fname in os.listdir(buildpath):
+            path = os.path.join(buildpath, fname)
+            if os.path.isfile(path):
+                st = os.stat(path)
+                stats[fname] = (st.st_mtime, st.st_size)
+        return stats
+
+    def _Run_iec2c(self, buildpath, iec2c_libpath, cache, cachekey):
+        """
+        Compile IEC code into C code, and store generated files in build cache
+        @return: IEC to C compiler output, or None if failed
+        """
+        self.logger.write(_("Compiling IEC Program into C code...\n"))
         buildcmd = "\"%s\" %s -I \"%s\" -T \"%s\" \"%s\"" % (
             self.iec2c_cfg.getCmd(),
             self.iec2c_cfg.getOptions(),
@@ -833,6 +1029,7 @@ class ProjectController(ConfigTreeNode, PLCControler):
             buildpath,
             self._getIECcodepath())
 
+        before = self._GetBuildPathFilesStat(buildpath)
         try:
             # Invoke compiler.
             # Output files are listed to stdout, errors to stderr
@@ -842,7 +1039,7 @@ class ProjectController(ConfigTreeNode, PLCControler):
         except Exception as e:
             self.logger.write_error(buildcmd + "\n")
             self.logger.write_error(repr(e) + "\n")
-            return False
+            return None
 
         if status:
             # Failed !
@@ -876,45 +1073,21 @@ class ProjectController(ConfigTreeNode, PLCControler):
 
             self.logger.write_error(
                 _("Error : IEC to C compiler returned %d\n") % status)
-            return False
-
-        # Now extract C files of stdout
-        C_files = [fname for fname in result.splitlines() if fname[
-            -2:] == ".c" or fname[-2:] == ".C"]
-        # remove those that are not to be compiled because included by others
-        C_files.remove("POUS.c")
-        if not C_files:
-            self.logger.write_error(
-                _("Error : At least one configuration and one resource must be declared in PLC !\n"))
-            return False
-        # transform those base names to full names with path
-        C_files = map(
-            lambda filename: os.path.join(buildpath, filename), C_files)
-
-        # prepend beremiz include to configuration header
-        H_files = [fname for fname in result.splitlines() if fname[
-            -2:] == ".h" or fname[-2:] == ".H"]
-        H_files.remove("LOCATED_VARIABLES.h")
-        H_files = map(
-            lambda filename: os.path.join(buildpath, filename), H_files)
-        for H_file in H_files:
-            with open(H_file, 'r') as original:
-                data = original.read()
-            with open(H_file, 'w') as modified:
-                modified.write('#include "beremiz.h"\n' + data)
-
-        self.logger.write(_("Extracting Located Variables...\n"))
-        # Keep track of generated located variables for later use by
-        # self._Generate_C
-        self.PLCGeneratedLocatedVars = self.GetLocations()
-        # Keep track of generated C files for later use by self.CTNGenerate_C
-        self.PLCGeneratedCFiles = C_files
-        # compute CFLAGS for plc
-        self.plcCFLAGS = '"-I%s" -Wno-unused-function' % self.iec2c_cfg.getLibCPath()
+            return None
 
-        self.LastBuiltIECcodeDigest = self.IECcodeDigest
+        # generated files are those listed by compiler, and any other
+        # file it has written in build path
+        after = self._GetBuildPathFilesStat(buildpath)
+        fnames = set([fname for fname in result.splitlines()
+                      if fname in after])
+        fnames.update([fname for fname, stat in after.iteritems()
+                       if before.get(fname) != stat])
+        fnames.discard(os.path.basename(self._getIECcodepath()))
+        cache.PutIEC2CResult(cachekey, buildpath, fnames, result)
+        if cache.enabled:
+            cache.Prune()
 
-        return True
+        return result
 
     def GetBuilder(self):
         """
@@ -949,6 +1122,10 @@ class ProjectController(ConfigTreeNode, PLCControler):
                 "",  # no ldflags
                 False)  # do not expose retreive/publish calls
 
+    def CTNExclusiveResources(self):
+        # IEC code doesn't use any, extensions list theirs
+        return []
+
     def ResetIECProgramsAndVariables(self):
         """
         Reset variable and program list that are parsed from
@@ -961,6 +1138,8 @@ class ProjectController(ConfigTreeNode, PLCControler):
         self._Ticktime = 0
         self.TracedIECPath = []
         self.TracedIECTypes = []
+        self.DebugBufferUnpacker = partial(UnpackDebugBuffer, indexes=[])
+        self.DebugFramesDType = None
 
     def GetIECProgramsAndVariables(self):
         """
@@ -1056,6 +1235,7 @@ class ProjectController(ConfigTreeNode, PLCControler):
         # prepare debug code
         variable_decl_array = []
         retain_indexes = []
+        retain_names = []
         for i, v in enumerate(self._DbgVariablesList):
             variable_decl_array.append(
                 "{&(%(C_path)s), " % v +
@@ -1070,8 +1250,23 @@ class ProjectController(ConfigTreeNode, PLCControler):
 
             if v["retain"] == "1":
                 retain_indexes.append("/* "+v["C_path"]+" */ "+str(i))
+                retain_names.append('"%(IEC_path)s:%(type)s"' % v)
+
+        settings = self.GetDebuggerSettings()
+        ring_size = settings["Trace_Ring_Size"]
+        if ring_size & (ring_size - 1):
+            # trace ring size must be a power of 2
+            ring_size = 1 << ring_size.bit_length()
+            self.logger.write_warning(
+                _("Debugger trace ring size rounded up to %d\n") % ring_size)
 
         debug_code = targets.GetCode("plc_debug.c") % {
+            "trace_buffer_size": settings["Trace_Buffer_Size"],
+            "trace_list_size": settings["Trace_List_Size"],
+            "trace_ring_size": ring_size,
+            "trace_delta": int(settings["Trace_Delta"]),
+            "force_buffer_size": settings["Force_Buffer_Size"],
+            "force_list_size": settings["Force_List_Size"],
             "programs_declarations": "\n".join(["extern %(type)s %(C_path)s;" %
                                                 p for p in self._ProgramList]),
             "extern_variables_declarations": "\n".join([
@@ -1086,11 +1281,22 @@ class ProjectController(ConfigTreeNode, PLCControler):
                 for v in self._VariablesList if v["C_path"].find('.') < 0]),
             "variable_decl_array": ",\n".join(variable_decl_array),
             "retain_vardsc_index_array": ",\n".join(retain_indexes),
+            "retain_names_array": ",\n".join(retain_names),
             "var_access_code": targets.GetCode("var_access.c")
         }
 
         return debug_code
 
+    def _ExclusiveResourcesCode(self, resources):
+        """
+        ExclusiveResources C array, left undefined if resources are unknown
+        """
+        if resources is None:
+            return ""
+        return "const char *ExclusiveResources[] = {\n    %sNULL};" % "".join([
+            '"%s",\n    ' % resource.replace('\\', '\\\\').replace('"', '\\"')
+            for resource in resources])
+
     def Generate_plc_main(self):
         """
         Use confnodes layout given in LocationCFilesAndCFLAGS to
@@ -1121,7 +1327,9 @@ class ProjectController(ConfigTreeNode, PLCControler):
                     "return res;}" for i, locstr in enumerate(locstrs)]),
                 "cleanup_calls": "\n    ".join([
                     "if(init_level >= %d) " % i +
-                    "__cleanup_%s();" % locstrs[i - 1] for i in xrange(len(locstrs), 0, -1)])
+                    "__cleanup_%s();" % locstrs[i - 1] for i in xrange(len(locstrs), 0, -1)]),
+                "exclusive_resources": self._ExclusiveResourcesCode(
+                    self._ExclusiveResources())
             }
         else:
             plc_main_code = targets.GetCode("plc_main_head.c") % {
@@ -1129,7 +1337,8 @@ class ProjectController(ConfigTreeNode, PLCControler):
                 "retrieve_calls":   "\n",
                 "publish_calls":    "\n",
                 "init_calls":       "\n",
-                "cleanup_calls":    "\n"
+                "cleanup_calls":    "\n",
+                "exclusive_resources": self._ExclusiveResourcesCode([])
             }
         plc_main_code += targets.GetTargetCode(
             self.GetTarget().getcontent().getLocalTag())
@@ -1540,47 +1749,72 @@ class ProjectController(ConfigTreeNode, PLCControler):
     def PullPLCStatusProc(self, event):
         self.UpdateMethodsFromPLCStatus()
 
+    def UnpackDebugTraces(self, Traces):
+        """
+        Decode a batch of trace frames
+        @return: (ticks, columns) with one column of values per traced
+        variable, or None if no frame could be decoded
+        """
+        if self.DebugFramesDType is not None:
+            # fast path: all frames decoded at once as fixed size records
+            size = self.DebugFramesDType.itemsize
+            if all([len(debug_buff) == size for _tick, debug_buff in Traces]):
+                frames = np.frombuffer(
+                    "".join([debug_buff for _tick, debug_buff in Traces]),
+                    self.DebugFramesDType)
+                return ([debug_tick for debug_tick, _buff in Traces],
+                        [frames[name] != 0 if iectype == "BOOL" else frames[name]
+                         for name, iectype in zip(self.DebugFramesDType.names,
+                                                  self.TracedIECTypes)])
+
+        ticks = []
+        rows = []
+        for debug_tick, debug_buff in Traces:
+            debug_vars = self.DebugBufferUnpacker(debug_buff)
+            if debug_vars is not None:
+                ticks.append(debug_tick)
+                rows.append(debug_vars)
+            else:
+                # complain if trace is incomplete, but only once per debug session
+                if self.LastComplainDebugToken != self.DebugToken :
+                    self.logger.write_warning(
+                        _("Debug: target couldn't trace all requested variables.\n"))
+                    debug_stats = self._connector.GetDebugStats() \
+                        if self._connector.HasRemoteCall("GetDebugStats") \
+                        else None
+                    if debug_stats is not None:
+                        self.logger.write_warning(
+                            _("Debug: trace buffer needs {a1} bytes, {a2} available.\n").format(
+                                a1=debug_stats["trace_buffer_hwm"],
+                                a2=debug_stats["trace_buffer_size"]))
+                    self.LastComplainDebugToken = self.DebugToken
+        if len(rows) == 0:
+            return None
+        return ticks, zip(*rows)
+
     def SnapshotAndResetDebugValuesBuffers(self):
         debug_status = PlcStatus.Disconnected
+        ticks = []
+        buffers = [list() for dummy in xrange(len(self.TracedIECPath))]
         if self._connector is not None and self.DebugToken is not None:
             debug_status, Traces = self._connector.GetTraceVariables(self.DebugToken)
             # print [dict.keys() for IECPath, (dict, log, status, fvalue) in
             # self.IECdebug_datas.items()]
-            if debug_status == PlcStatus.Started:
-                if len(Traces) > 0:
-                    for debug_tick, debug_buff in Traces:
-                        debug_vars = UnpackDebugBuffer(
-                            debug_buff, self.TracedIECTypes)
-                        if debug_vars is not None:
-                            for IECPath, values_buffer, value in izip(
-                                    self.TracedIECPath,
-                                    self.DebugValuesBuffers,
-                                    debug_vars):
-                                IECdebug_data = self.IECdebug_datas.get(
-                                    IECPath, None)
-                                if IECdebug_data is not None and value is not None:
-                                    forced = (IECdebug_data[2] == "Forced") \
-                                        and (value is not None) and \
-                                        (IECdebug_data[3] is not None)
-
-                                    if not IECdebug_data[4] and len(values_buffer) > 0:
-                                        values_buffer[-1] = (value, forced)
-                                    else:
-                                        values_buffer.append((value, forced))
-                            self.DebugTicks.append(debug_tick)
-                        else:
-                            # complain if trace is incomplete, but only once per debug session
-                            if self.LastComplainDebugToken != self.DebugToken :
-                                self.logger.write_warning(
-                                    _("Debug: target couldn't trace all requested variables.\n"))
-                                self.LastComplainDebugToken = self.DebugToken
-
-
-
-        buffers, self.DebugValuesBuffers = (self.DebugValuesBuffers,
-                                            [list() for dummy in xrange(len(self.TracedIECPath))])
-
-        ticks, self.DebugTicks = self.DebugTicks, []
+            if debug_status == PlcStatus.Started and len(Traces) > 0:
+                unpacked = self.UnpackDebugTraces(Traces)
+                if unpacked is not None:
+                    ticks, columns = unpacked
+                    for idx, (IECPath, column) in enumerate(izip(
+                            self.TracedIECPath, columns)):
+                        IECdebug_data = self.IECdebug_datas.get(
+                            IECPath, None)
+                        if IECdebug_data is not None:
+                            forced = (IECdebug_data[2] == "Forced") and \
+                                (IECdebug_data[3] is not None)
+                            if not IECdebug_data[4]:
+                                # only last value is needed
+                                column = column[-1:]
+                            buffers[idx] = DebugValuesColumn(column, forced)
 
         return debug_status, ticks, buffers
 
@@ -1588,16 +1822,39 @@ class ProjectController(ConfigTreeNode, PLCControler):
         # Connector only can return None
         None : _("Debug: connection problem.\n"),
         # TRACE_LIST_OVERFLOW
-        1 : _("Debug: Too many variables traced. Max 1024.\n"),
+        1 : _("Debug: Too many variables traced. Max {Trace_List_Size}.\n"),
         # FORCE_LIST_OVERFLOW
-        2 : _("Debug: Too many variables forced. Max 256.\n"),
+        2 : _("Debug: Too many variables forced. Max {Force_List_Size}.\n"),
         # FORCE_BUFFER_OVERFLOW
-        3 : _("Debug: Cumulated forced variables size too large. Max 1KB.\n"),
+        3 : _("Debug: Cumulated forced variables size too large. Max {Force_Buffer_Size} bytes.\n"),
         # DEBUG_SUSPENDED
         4 : _("Debug: suspended.\n")
     }
 
+    def RequestDebugKeyFrame(self):
+        """
+        Ask PLC for a trace frame with all variables, after frames were lost
+        """
+        if self._connector is not None and self.DebugToken is not None and \
+           self._connector.HasRemoteCall("RequestDebugKeyFrame"):
+            self._connector.RequestDebugKeyFrame(self.DebugToken)
+
+    def ReportDebugFramesCount(self):
+        """
+        Warn user if some trace frames were lost in current debug session
+        """
+        if self._connector is not None and self.DebugToken is not None and \
+           self._connector.HasRemoteCall("GetDebugFramesCount"):
+            frames_count = self._connector.GetDebugFramesCount()
+            if frames_count is not None:
+                captured, dropped = frames_count
+                if dropped:
+                    self.logger.write_warning(
+                        _("Debug: {a1} trace frames dropped, {a2} captured.\n").format(
+                            a1=dropped, a2=captured))
+
     def RegisterDebugVarToConnector(self):
+        self.ReportDebugFramesCount()
         Idxs = []
         self.TracedIECPath = []
         self.TracedIECTypes = []
@@ -1630,18 +1887,38 @@ class ProjectController(ConfigTreeNode, PLCControler):
                 IdxsT = zip(*Idxs)
                 self.TracedIECPath = IdxsT[3]
                 self.TracedIECTypes = IdxsT[1]
+                # running PLC may not be built with current settings
+                trace_delta = self._connector.GetDebugTraceDelta() \
+                    if self._connector.HasRemoteCall("GetDebugTraceDelta") \
+                    else None
+                if trace_delta is None:
+                    trace_delta = self.GetDebuggerSettings()["Trace_Delta"]
+                if trace_delta:
+                    # decoder keeps last values of this debug session
+                    self.DebugBufferUnpacker = DeltaDebugBufferUnpacker(
+                        self.TracedIECTypes, self.RequestDebugKeyFrame)
+                else:
+                    self.DebugBufferUnpacker = partial(
+                        UnpackDebugBuffer, indexes=self.TracedIECTypes)
+                self.DebugFramesDType = GetDebugFramesDType(
+                    self.TracedIECTypes, trace_delta)
                 res = self._connector.SetTraceVariablesList(zip(*IdxsT[0:3]))
                 if res is not None and res > 0:
                     self.DebugToken = res
+                    # have traces pushed by runtime if connector supports it
+                    self._connector.SubscribeTraces(
+                        self.DebugToken, self.WakeDebugValuesDispatch)
                 else:
                     self.DebugToken = None
                     self.logger.write_warning(
                         self.RegisterDebugVariableErrorCodes.get(
                             -res if res is not None else None,
-                            _("Debug: Unknown error")))
+                            _("Debug: Unknown error")).format(
+                                **self.GetDebuggerSettings()))
             else:
                 self.TracedIECPath = []
                 self._connector.SetTraceVariablesList([])
+                self._connector.SubscribeTraces(None)
                 self.DebugToken = None
             self.debug_status, _debug_ticks, _buffers = self.SnapshotAndResetDebugValuesBuffers()
         self.DebugUpdatePending = False
@@ -1774,10 +2051,26 @@ class ProjectController(ConfigTreeNode, PLCControler):
 
         delay = time.time() - start_time
         next_refresh = max(REFRESH_PERIOD - delay, 0.2 * delay)
+        # pushed traces may be dispatched sooner, see WakeDebugValuesDispatch
+        self.DebugDispatchEarliest = time.time() + 0.2 * delay
         if self.DispatchDebugValuesTimer is not None:
             res = self.DispatchDebugValuesTimer.Start(
                 int(next_refresh * 1000), oneShot=True)
 
+    def WakeDebugValuesDispatch(self):
+        """
+        Called by connector, from its own thread, when runtime pushed
+        traces, so that they are dispatched without waiting for timer
+        """
+        wx.CallAfter(self._WakeDebugValuesDispatch)
+
+    def _WakeDebugValuesDispatch(self):
+        if self.DispatchDebugValuesTimer is not None and \
+           self.DispatchDebugValuesTimer.IsRunning():
+            self.DispatchDebugValuesTimer.Start(
+                max(int((self.DebugDispatchEarliest - time.time()) * 1000), 1),
+                oneShot=True)
+
     def KillDebugThread(self):
         if self.DispatchDebugValuesTimer is not None:
             self.DispatchDebugValuesTimer.Stop()
@@ -1927,17 +2220,42 @@ class ProjectController(ConfigTreeNode, PLCControler):
     def _Disconnect(self):
         self._SetConnector(None)
 
-    def _Transfer(self):
+    def _Transfer(self, hot_reload=None):
+        """
+        @param hot_reload: if PLC is running, replace it without stopping
+        it (True) or stop it first (False). User is asked if None.
+        """
         success = False
         if self.IsPLCStarted():
-            dialog = wx.MessageDialog(
-                self.AppFrame,
-                _("Cannot transfer while PLC is running. Stop it now?"),
-                style=wx.YES_NO | wx.CENTRE)
-            if dialog.ShowModal() == wx.ID_YES:
+            can_hot_reload = \
+                self._connector.HasRemoteCall("CanHotReloadPLC") and \
+                self._connector.CanHotReloadPLC()
+            if hot_reload and not can_hot_reload:
+                self.logger.write_warning(
+                    _("Running PLC can't be hot reloaded, stopping it instead.\n"))
+                hot_reload = False
+            if hot_reload is None:
+                if can_hot_reload:
+                    dialog = wx.MessageDialog(
+                        self.AppFrame,
+                        _("Cannot transfer while PLC is running. Stop it now?\n"
+                          "Choose No to replace it without stopping it (hot reload)."),
+                        style=wx.YES_NO | wx.CANCEL | wx.CENTRE)
+                else:
+                    dialog = wx.MessageDialog(
+                        self.AppFrame,
+                        _("Cannot transfer while PLC is running. Stop it now?"),
+                        style=wx.YES_NO | wx.CENTRE)
+                answer = dialog.ShowModal()
+                dialog.Destroy()
+                if answer == wx.ID_YES:
+                    hot_reload = False
+                elif answer == wx.ID_NO and can_hot_reload:
+                    hot_reload = True
+                else:
+                    return
+            if not hot_reload:
                 self._Stop()
-            else:
-                return
 
         builder = self.GetBuilder()
         if builder is None:
@@ -1963,29 +2281,32 @@ class ProjectController(ConfigTreeNode, PLCControler):
         self._connector.PurgeBlobs()
 
         try:
-            # transfer extra files
-            extrafiles = []
+            # transfer extra files, then PLC
+            files = []
             for extrafilespath in [self._getExtraFilesPath(),
                                    self._getProjectFilesPath()]:
 
                 for name in os.listdir(extrafilespath):
-                    extrafiles.append((
-                        name,
-                        self._connector.BlobFromFile(
-                            # use file name as a seed to avoid collisions
-                            # with files having same content
-                            os.path.join(extrafilespath, name), name)))
-
-            # Send PLC on target
-            object_path = builder.GetBinaryPath()
+                    # use file name as a seed to avoid collisions
+                    # with files having same content
+                    files.append((os.path.join(extrafilespath, name), name, name))
+
             # arbitrarily use MD5 as a seed, could be any string
-            object_blob = self._connector.BlobFromFile(object_path, MD5)
+            files.append((builder.GetBinaryPath(), MD5, None))
+
+            # only send what differs from files already on target
+            blobs, sent, total = self._connector.BlobsFromFiles(files)
+            extrafiles = [(name, blob) for (_path, _seed, name), blob
+                          in zip(files[:-1], blobs[:-1])]
+            object_blob = blobs[-1]
         except IOError as e:
             self.HidePLCProgress()
             self.logger.write_error(repr(e))
         else:
             self.HidePLCProgress()
-            self.logger.write(_("PLC data transfered successfully.\n"))
+            self.logger.write(
+                _("PLC data transfered successfully ({sent} of {total} bytes sent).\n").format(
+                    sent=sent, total=total))
 
             if self._connector.NewPLC(MD5, object_blob, extrafiles):
                 if self.GetIECProgramsAndVariables():
@@ -1996,11 +2317,17 @@ class ProjectController(ConfigTreeNode, PLCControler):
                         self.AppFrame.RefreshPouInstanceVariablesPanel()
                         self.AppFrame.LogViewer.ResetLogCounters()
                     self.logger.write(_("PLC installed successfully.\n"))
+                    if hot_reload:
+                        # PLC kept running, debug new PLC variables
+                        self._connect_debug()
                     success = True
                 else:
                     self.logger.write_error(_("Missing debug data\n"))
             else:
                 self.logger.write_error(_("PLC couldn't be installed\n"))
+                if hot_reload:
+                    # previous PLC may have been restarted, debug it again
+                    self._connect_debug()
 
         wx.CallAfter(self.UpdateMethodsFromPLCStatus)
         return success
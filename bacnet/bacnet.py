@@ -565,6 +565,9 @@ class RootClass(object):
 
 
 
+    def CTNExclusiveResources(self):
+        return ["udp:%s" % self.BACnetServerNode.getUDP_Port_Number()]
+
     #
     # Generate the C source code files
     #
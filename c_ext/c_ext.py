@@ -36,6 +36,7 @@ class CFile(CodeFile):
         <xsd:complexType>
           <xsd:attribute name="CFLAGS" type="xsd:string" use="required"/>
           <xsd:attribute name="LDFLAGS" type="xsd:string" use="required"/>
+          <xsd:attribute name="ExclusiveResources" type="xsd:string" use="optional"/>
         </xsd:complexType>
       </xsd:element>
     </xsd:schema>
@@ -56,6 +57,19 @@ class CFile(CodeFile):
     def CodeFileName(self):
         return os.path.join(self.CTNPath(), "cfile.xml")
 
+    def CTNExclusiveResources(self):
+        """
+        User C code can use anything, unless ExclusiveResources lists what
+        it uses, comma separated, or "none"
+        """
+        resources = self.CExtension.getExclusiveResources()
+        if not resources:
+            return None
+        if resources.strip() == "none":
+            return []
+        return [resource.strip() for resource in resources.split(",")
+                if resource.strip()]
+
     def CTNGenerate_C(self, buildpath, locations):
         """
         Generate C code
@@ -161,6 +161,9 @@ class _SlaveCTN(NodeManager):
     def GetCanDevice(self):
         return self.CanFestivalSlaveNode.getCAN_Device()
 
+    def CTNExclusiveResources(self):
+        return ["can:%s" % self.GetCanDevice()]
+
     def _OpenView(self, name=None, onlyopened=False):
         ConfigTreeNode._OpenView(self, name, onlyopened)
         if self._View is not None:
@@ -323,6 +326,9 @@ class _NodeListCTN(NodeList):
     def GetCanDevice(self):
         return self.CanFestivalNode.getCAN_Device()
 
+    def CTNExclusiveResources(self):
+        return ["can:%s" % self.GetCanDevice()]
+
     def SetParamsAttribute(self, path, value):
         if path == "CanFestivalNode.NodeId":
             nodeid = self.CanFestivalNode.getNodeId()
@@ -506,6 +512,10 @@ class RootClass(object):
             return ""
         return res
 
+    def CTNExclusiveResources(self):
+        # CAN devices are listed by masters and slaves
+        return []
+
     def CTNGenerate_C(self, buildpath, locations):
         can_driver = self.GetCanDriver()
         if can_driver is not None:
@@ -4,14 +4,97 @@
 # See COPYING file for copyrights details.
 
 from __future__ import absolute_import
+import os
+import sys
 import hashlib
+from threading import Thread, Lock
+
+import six
+
+from runtime.FileDelta import FileDigest, FindBlocks
+from runtime import BlobCompression
 
 
 class ConnectorBase(object):
 
     chuncksize = 1024*1024
+    # count of chunks sent concurrently by BlobFromFile
+    blobwindow = 4
+    # chunk size agreed with runtime, 0 if runtime can only append chunks
+    blobchunksize = None
+    # compression agreed with runtime, "" if chunks are sent as is
+    blobcompression = None
+    deltablocksize = 4096
+    # bytes scanned one by one without finding a block, before only
+    # checking block aligned data, as scanning is slow compared to LAN
+    deltamaxroll = 4 * 4096
+    # maximum count of ranges copied in one call to AppendBlocksToBlob
+    deltarangescount = 4096
+    # names of calls runtime provides, None until asked
+    remotecalls = None
+
+    def HasRemoteCall(self, name):
+        """
+        Tell if runtime provides given call. Calls added to runtime must
+        be checked this way, since calling a missing one would disconnect.
+        Runtime without GetRemoteCalls is assumed to have none of them.
+        """
+        if self.remotecalls is None:
+            self.remotecalls = frozenset(self.GetRemoteCalls() or [])
+        return name in self.remotecalls
+
+    def SubscribeTraces(self, DebugToken, OnTraces=None):
+        """
+        Traces are polled with GetTraceVariables unless connector
+        overrides this to have them pushed by runtime. OnTraces is then
+        called from connector's thread when new traces are received.
+        """
+        return False
+
+    def GetBlobChunkSize(self):
+        if self.blobchunksize is None:
+            size = None
+            if self.HasRemoteCall("NegotiateBlobChunkSize"):
+                size = self.NegotiateBlobChunkSize(self.chuncksize)
+            self.blobchunksize = 0 if size is None else size
+        return self.blobchunksize
+
+    def GetBlobCompression(self):
+        if self.blobcompression is None:
+            supported = []
+            if self.HasRemoteCall("GetBlobCompressions"):
+                supported = self.GetBlobCompressions() or []
+            self.blobcompression = ([name for name in BlobCompression.GetCodecs()
+                                     if name in supported] + [""])[0]
+        return self.blobcompression
+
+    def CompressChunk(self, chunk):
+        """
+        @return: data to send, and compression, None if chunk is sent as is
+        """
+        compression = self.GetBlobCompression()
+        if compression:
+            data = BlobCompression.Compress(compression, chunk)
+            if len(data) < len(chunk):
+                return data, compression
+        return chunk, None
+
+    def AppendCompressedChunkToBlob(self, chunk, blobID):
+        data, compression = self.CompressChunk(chunk)
+        if compression is None:
+            return self.AppendChunkToBlob(chunk, blobID)
+        return self.AppendChunkToBlob(data, blobID, compression)
+
+    def WriteCompressedBlobChunk(self, blobID, offset, chunk):
+        data, compression = self.CompressChunk(chunk)
+        if compression is None:
+            return self.WriteBlobChunk(blobID, offset, chunk)
+        return self.WriteBlobChunk(blobID, offset, data, compression)
 
     def BlobFromFile(self, filepath, seed):
+        chunksize = self.GetBlobChunkSize()
+        if chunksize:
+            return self.BlobFromFileWindowed(filepath, seed, chunksize)
         s = hashlib.new('md5')
         s.update(seed)
         blobID = self.SeedBlob(seed)
@@ -20,6 +103,196 @@ class ConnectorBase(object):
                 chunk = f.read(self.chuncksize)
                 if len(chunk) == 0:
                     return blobID
-                blobID = self.AppendChunkToBlob(chunk, blobID)
+                blobID = self.AppendCompressedChunkToBlob(chunk, blobID)
+                s.update(chunk)
+        raise IOError("Data corrupted during transfer or connection lost")
+
+    def BlobFromFileWindowed(self, filepath, seed, chunksize):
+        """
+        Same as BlobFromFile, but chunks are written at their offset in
+        blob, up to blobwindow chunks at a time, so that transfer isn't
+        paced by round trip time. Blob is checked once complete.
+        First exception raised while sending a chunk stops sending and
+        is raised again.
+        """
+        s = hashlib.new('md5')
+        s.update(seed)
+        blobID = self.SeedBlob(seed)
+        lock = Lock()
+        failed = []
+        errors = []
+        with open(filepath, "rb") as f:
+            def SendChunks():
+                try:
+                    while not failed and not errors:
+                        # chunks are read and hashed in order
+                        with lock:
+                            offset = f.tell()
+                            chunk = f.read(chunksize)
+                            s.update(chunk)
+                        if len(chunk) == 0:
+                            return
+                        if self.WriteCompressedBlobChunk(blobID, offset, chunk) != len(chunk):
+                            failed.append(offset)
+                except Exception:
+                    errors.append(sys.exc_info())
+
+            if self.blobwindow > 1:
+                threads = [Thread(target=SendChunks)
+                           for _i in range(self.blobwindow)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            else:
+                SendChunks()
+
+        if errors:
+            six.reraise(*errors[0])
+        if not failed:
+            blobID = self.SealBlob(blobID)
+            if blobID == s.digest():
+                return blobID
+        raise IOError("Data corrupted during transfer or connection lost")
+
+    def BlobsFromFiles(self, files):
+        """
+        Same as BlobFromFile for many files, but send only what runtime
+        doesn't already have : files with same content as an installed
+        file aren't sent, and only differences with installed file
+        having same name are sent for others
+        @param files: list of (file path, seed, installed file name),
+        name being None for PLC library
+        @return: (list of blob IDs, sent bytes, total bytes)
+        """
+        blobIDs = None
+        if self.HasRemoteCall("BlobsFromDigests"):
+            digests = [FileDigest(filepath) for filepath, _seed, _name in files]
+            blobIDs = self.BlobsFromDigests(
+                [(digest, seed) for digest, (_path, seed, _name) in zip(digests, files)])
+        # None if runtime can't reuse installed files
+        delta = blobIDs is not None
+        if not delta:
+            blobIDs = [None] * len(files)
+
+        result = []
+        sent = total = 0
+        for (filepath, seed, name), blobID in zip(files, blobIDs):
+            size = os.path.getsize(filepath)
+            total += size
+            if blobID is not None:
+                s = hashlib.new('md5')
+                s.update(seed)
+                with open(filepath, "rb") as f:
+                    s.update(f.read())
+                if blobID == s.digest():
+                    result.append(blobID)
+                    continue
+            blobID = None
+            if delta and size > self.deltablocksize:
+                blobID, count = self.BlobFromFileDelta(filepath, seed, name)
+            if blobID is None:
+                blobID, count = self.BlobFromFile(filepath, seed), size
+            sent += count
+            result.append(blobID)
+        return result, sent, total
+
+    def BlobFromFileDelta(self, filepath, seed, name):
+        """
+        Same as BlobFromFile, but only send parts of file that differ
+        from installed file with given name
+        @return: (blob ID, sent bytes), blob ID being None if there is
+        no such installed file
+        """
+        signatures = self.GetFileSignatures(name, self.deltablocksize)
+        if signatures is None:
+            return None, 0
+        digest, signatures = signatures
+        with open(filepath, "rb") as f:
+            data = f.read()
+        matches = FindBlocks(data, signatures, self.deltablocksize, self.deltamaxroll)
+
+        s = hashlib.new('md5')
+        s.update(seed)
+        blobID = self.SeedBlob(seed)
+        sent = 0
+        # data up to pos is in blob, data up to end is in ranges
+        pos = end = 0
+        ranges = []
+        # end marker, to send data after last matching block
+        for start, offset in matches + [(len(data), None)]:
+            if start > end or offset is None or \
+               len(ranges) == self.deltarangescount:
+                if ranges:
+                    blobID = self.AppendBlocksToBlob(digest, ranges, blobID)
+                    s.update(data[pos:end])
+                    pos = end
+                    ranges = []
+                while pos < start and blobID == s.digest():
+                    chunk = data[pos:min(start, pos + self.chuncksize)]
+                    blobID = self.AppendCompressedChunkToBlob(chunk, blobID)
+                    s.update(chunk)
+                    pos += len(chunk)
+                    sent += len(chunk)
+                end = pos
+            if blobID != s.digest():
+                raise IOError("Data corrupted during transfer or connection lost")
+            if offset is not None:
+                if ranges and sum(ranges[-1]) == offset:
+                    # merge with previous range
+                    ranges[-1] = (ranges[-1][0], ranges[-1][1] + self.deltablocksize)
+                else:
+                    ranges.append((offset, self.deltablocksize))
+                end += self.deltablocksize
+        return blobID, sent
+
+    def FileFromBlob(self, blobID, filepath):
+        s = hashlib.new('md5')
+        offset = 0
+        with open(filepath, "wb") as f:
+            while True:
+                chunk = self.GetBlobChunk(blobID, offset, self.chuncksize)
+                if chunk is None:
+                    break
+                if len(chunk) == 0:
+                    if s.digest() == blobID:
+                        return
+                    break
+                f.write(chunk)
                 s.update(chunk)
+                offset += len(chunk)
         raise IOError("Data corrupted during transfer or connection lost")
+
+    def TraceRecordToFile(self, filepath, start_tick=None, end_tick=None):
+        """
+        Download part of trace recording overlapping given ticks range
+        """
+        blobID = self.TraceRecordToBlob(start_tick, end_tick)
+        if blobID is None:
+            return False
+        self.FileFromBlob(blobID, filepath)
+        return True
+
+    def IterLogMessages(self, level, from_id, to_id):
+        """
+        Yield (msgidx, message, tick, tv_sec, tv_nsec) for messages
+        from from_id down to to_id (excluded), newest first, until
+        first message already overwritten in PLC log buffer
+        """
+        msgidx = from_id
+        while msgidx > to_id and self.HasRemoteCall("GetLogMessages"):
+            messages = self.GetLogMessages(level, msgidx, msgidx - to_id)
+            if messages is None:
+                # no PLC loaded, or call failed
+                break
+            if len(messages) == 0:
+                return
+            for message in messages:
+                yield message
+            msgidx = messages[-1][0] - 1
+        while msgidx > to_id:
+            message = self.GetLogMessage(level, msgidx)
+            if message is None:
+                return
+            yield (msgidx,) + tuple(message)
+            msgidx -= 1
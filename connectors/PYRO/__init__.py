@@ -131,6 +131,20 @@ def PYRO_connector_factory(uri, confnodesroot):
         A proxy proxy class to handle Beremiz Pyro interface specific behavior.
         And to put Pyro exception catcher in between caller and Pyro proxy
         """
+        # Pyro proxy can't be shared by threads sending blob chunks
+        blobwindow = 1
+
+        def GetRemoteCalls(self):
+            def GetRemoteCallsOrNone():
+                try:
+                    return RemotePLCObjectProxy.__getattr__("GetRemoteCalls")()
+                except (Pyro.errors.ConnectionClosedError, Pyro.errors.ProtocolError):
+                    raise
+                except Exception:
+                    # runtime older than GetRemoteCalls, keep connection
+                    return None
+            return PyroCatcher(GetRemoteCallsOrNone)()
+
         def __getattr__(self, attrName):
             member = self.__dict__.get(attrName, None)
             if member is None:
@@ -28,14 +28,15 @@ from __future__ import print_function
 import sys
 import traceback
 from functools import partial
-from threading import Thread, Event
+from threading import Thread, Event, Lock
+from time import time
 from six import text_type as text
 
 from twisted.internet import reactor, threads
 from autobahn.twisted import wamp
 from autobahn.twisted.websocket import WampWebSocketClientFactory, connectWS
 from autobahn.wamp import types
-from autobahn.wamp.exception import TransportLost
+from autobahn.wamp.exception import TransportLost, ApplicationError
 from autobahn.wamp.serializer import MsgPackSerializer
 
 from runtime import PlcStatus
@@ -110,7 +111,11 @@ def _WAMP_connector_factory(cls, uri, confnodesroot):
         AddToDoBeforeQuit(reactor.stop)
         reactor.run(installSignalHandlers=False)
 
-    def WampSessionProcMapper(funcname):
+    def WampSessionProcMapper(funcname, optional=False):
+        """
+        @param optional: runtime may not have that call, None is then
+        returned without logging error
+        """
         wampfuncname = text('.'.join((ID, funcname)))
 
         def catcher_func(*args, **kwargs):
@@ -122,7 +127,10 @@ def _WAMP_connector_factory(cls, uri, confnodesroot):
                 except TransportLost:
                     confnodesroot.logger.write_error(_("Connection lost!\n"))
                     confnodesroot._SetConnector(None)
-                except Exception:
+                except Exception as e:
+                    if optional and isinstance(e, ApplicationError) and \
+                       e.error == ApplicationError.NO_SUCH_PROCEDURE:
+                        return None
                     errmess = traceback.format_exc()
                     confnodesroot.logger.write_error(errmess+"\n")
                     print(errmess)
@@ -130,6 +138,123 @@ def _WAMP_connector_factory(cls, uri, confnodesroot):
             return PLCObjDefaults.get(funcname)
         return catcher_func
 
+    class TraceSubscription(object):
+        """
+        Receive traces pushed by runtime as WAMP events,
+        and keep them until GetTraceVariables is called
+        """
+
+        # count of events runtime can publish before being acknowledged
+        Window = 4
+
+        # acknowledge at least that often, even if nothing was received
+        AckPeriod = 1
+
+        # runtime is considered not pushing traces anymore if neither
+        # event nor positive acknowledge answer came for that long,
+        # as runtime's TraceStreamer.Timeout
+        Timeout = 3
+
+        def __init__(self):
+            self.lock = Lock()
+            self.DebugToken = None
+            self.Status = PlcStatus.Started
+            self.Traces = []
+            self.LastSeq = 0
+            self.AckedSeq = 0
+            self.LastAck = 0
+            # last time runtime was known to push traces
+            self.LastAlive = 0
+            self.Lost = False
+            self.subscribed = False
+            # called once traces are received, until next Swap
+            self.OnTracesCallback = None
+            self.Notified = False
+
+        def OnTraces(self, event):
+            DebugToken, seq, status, traces = event
+            notify = False
+            self.lock.acquire()
+            if DebugToken == self.DebugToken:
+                self.Status = status
+                self.Traces.extend([tuple(trace) for trace in traces])
+                self.LastSeq = max(self.LastSeq, seq)
+                self.LastAlive = time()
+                notify = not self.Notified
+                self.Notified = True
+            callback = self.OnTracesCallback
+            self.lock.release()
+            if notify and callback is not None:
+                callback()
+
+        def Subscribe(self, DebugToken, OnTraces=None):
+            if not self.subscribed:
+                threads.blockingCallFromThread(
+                    reactor, _WampSession.subscribe, self.OnTraces,
+                    text('.'.join((ID, "Traces"))))
+                self.subscribed = True
+            self.lock.acquire()
+            self.DebugToken = DebugToken
+            self.OnTracesCallback = OnTraces
+            self.Notified = False
+            self.Status = PlcStatus.Started
+            self.Traces = []
+            self.LastSeq = 0
+            self.AckedSeq = 0
+            self.LastAck = time()
+            self.LastAlive = self.LastAck
+            self.Lost = False
+            self.lock.release()
+
+        def Unsubscribe(self):
+            self.lock.acquire()
+            self.DebugToken = None
+            self.OnTracesCallback = None
+            self.Traces = []
+            self.lock.release()
+
+        def Swap(self):
+            self.lock.acquire()
+            status, traces, self.Traces = self.Status, self.Traces, []
+            self.Notified = False
+            seq = self.LastSeq
+            DebugToken = self.DebugToken
+            self.lock.release()
+            now = time()
+            if seq != self.AckedSeq or now - self.LastAck > self.AckPeriod:
+                # acknowledge without waiting for answer
+                self.AckedSeq = seq
+                self.LastAck = now
+                reactor.callFromThread(self.Ack, DebugToken, seq)
+            return status, traces
+
+        def IsAlive(self):
+            """
+            Tell if runtime still pushes traces for current DebugToken
+            """
+            self.lock.acquire()
+            alive = not self.Lost and time() - self.LastAlive <= self.Timeout
+            self.lock.release()
+            return alive
+
+        def Ack(self, DebugToken, seq):
+            # called in reactor thread
+            if _WampSession is not None:
+                _WampSession.call(
+                    text('.'.join((ID, "AckTraces"))), DebugToken, seq
+                ).addCallbacks(self.OnAck, lambda _failure: None,
+                               callbackArgs=(DebugToken,))
+
+        def OnAck(self, live, DebugToken):
+            self.lock.acquire()
+            if DebugToken == self.DebugToken:
+                if live:
+                    self.LastAlive = time()
+                elif live is not None:
+                    # runtime dropped subscription
+                    self.Lost = True
+            self.lock.release()
+
     class WampPLCObjectProxy(object):
         def __init__(self):
             global _WampConnection
@@ -141,12 +266,57 @@ def _WAMP_connector_factory(cls, uri, confnodesroot):
             if not _WampSessionEvent.wait(5):
                 _WampConnection.stopConnecting()
                 raise Exception(_("WAMP connection timeout"))
+            self._traces = TraceSubscription()
 
         def __del__(self):
             _WampConnection.disconnect()
             #
             # reactor.stop()
 
+        def GetRemoteCalls(self):
+            return WampSessionProcMapper("GetRemoteCalls", optional=True)()
+
+        def SubscribeTraces(self, DebugToken, OnTraces=None):
+            """
+            Ask runtime to push traces instead of having them polled.
+            GetTraceVariables then gives traces already received.
+            OnTraces is called in reactor thread when traces arrive.
+            DebugToken None stops traces push.
+            """
+            if not self.HasRemoteCall("SubscribeTraces"):
+                return False
+            if DebugToken is None:
+                self._traces.Unsubscribe()
+                WampSessionProcMapper("UnsubscribeTraces")()
+                return False
+            self._traces.Subscribe(DebugToken, OnTraces)
+            if WampSessionProcMapper("SubscribeTraces")(
+                    DebugToken, self._traces.Window):
+                return True
+            # runtime doesn't push traces, poll them
+            self._traces.Unsubscribe()
+            return False
+
+        def GetTraceVariables(self, DebugToken):
+            if DebugToken is not None and \
+               DebugToken == self._traces.DebugToken:
+                res = self._traces.Swap()
+                if self._traces.IsAlive():
+                    return res
+                # runtime stopped pushing traces, as if acknowledge came
+                # too late. Subscribe again, or else poll traces.
+                if self.SubscribeTraces(
+                        DebugToken, self._traces.OnTracesCallback):
+                    return res
+                confnodesroot.logger.write_warning(
+                    _("Traces are not pushed by runtime anymore, polling them\n"))
+                status, traces = WampSessionProcMapper(
+                    "GetTraceVariables")(DebugToken)
+                if traces is None:
+                    return status, traces
+                return status, res[1] + [tuple(trace) for trace in traces]
+            return WampSessionProcMapper("GetTraceVariables")(DebugToken)
+
         def __getattr__(self, attrName):
             member = self.__dict__.get(attrName, None)
             if member is None:
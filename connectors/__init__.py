@@ -118,9 +118,10 @@ def ConnectorFactory(uri, confnodesroot):
     if connector_specific_class is None:
         return None
 
-    # new class inheriting from generic and specific connector base classes
+    # new class inheriting from generic and specific connector base classes,
+    # specific connector can override generic behavior
     return type(_scheme + "_connector",
-                (ConnectorBase, connector_specific_class), {})()
+                (connector_specific_class, ConnectorBase), {})()
 
 
 def EditorClassFromScheme(scheme):
@@ -27,7 +27,7 @@ from __future__ import absolute_import
 from datetime import timedelta
 import binascii
 import numpy as np
-from graphics.DebugDataConsumer import DebugDataConsumer, TYPE_TRANSLATOR
+from graphics.DebugDataConsumer import DebugDataConsumer, DebugValuesColumn, TYPE_TRANSLATOR
 from controls.DebugVariablePanel.RingBuffer import RingBuffer
 
 # -------------------------------------------------------------------------------
@@ -250,6 +250,32 @@ class DebugVariableItem(DebugDataConsumer):
 
         if self.Data is not None:
 
+            if isinstance(values, DebugValuesColumn) and \
+               self.VariableType not in ["STRING", "WSTRING", "TIME", "TOD", "DT", "DATE"]:
+                # Whole batch of numeric values is stored at once
+                num_values = np.asarray(values.Values, dtype=float)
+                data_values = np.empty((len(num_values), 3))
+                data_values[:, 0] = ticks
+                data_values[:, 1] = num_values
+                data_values[:, 2] = float(values.Forced)
+
+                # Update variable range values
+                min_value = float(num_values.min())
+                max_value = float(num_values.max())
+                self.MinValue = (min(self.MinValue, min_value)
+                                 if self.MinValue is not None
+                                 else min_value)
+                self.MaxValue = (max(self.MaxValue, max_value)
+                                 if self.MaxValue is not None
+                                 else max_value)
+
+                # Add New data to stored data table
+                self.Data.append(data_values)
+
+                # Signal to debug variable panel to refresh
+                self.Parent.HasNewData = True
+                return
+
             if self.VariableType in ["STRING", "WSTRING"]:
                 last_raw_data = (self.RawData[-1]
                                  if len(self.RawData) > 0 else None)
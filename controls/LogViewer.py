@@ -422,12 +422,12 @@ class LogViewer(DebugViewer, wx.Panel):
                     oldest_message = (-1, None)
                 else:
                     dump_end = prev - 1
-                for msgidx in xrange(count-1, dump_end, -1):
-                    new_message = self.GetLogMessageFromSource(msgidx, level)
-                    if new_message is None:
-                        if prev is None:
-                            oldest_message = (-1, None)
-                        break
+                if self.LogSource is not None:
+                    messages = self.LogSource.IterLogMessages(level, count-1, dump_end)
+                else:
+                    messages = []
+                for msgidx, msg, _tick, tv_sec, tv_nsec in messages:
+                    new_message = LogMessage(tv_sec, tv_nsec, level, self.LevelIcons[level], msg)
                     if prev is None:
                         oldest_message = (msgidx, new_message)
                         if len(new_messages) == 0:
@@ -436,6 +436,9 @@ class LogViewer(DebugViewer, wx.Panel):
                             new_messages.insert(0, new_message)
                     else:
                         new_messages.insert(0, new_message)
+                if prev is None and oldest_message[0] != dump_end + 1:
+                    # some messages were already lost
+                    oldest_message = (-1, None)
                 if prev is None and len(self.OldestMessages) <= level:
                     self.OldestMessages.append(oldest_message)
                 self.previous_log_count[level] = count
@@ -26,6 +26,8 @@
 from __future__ import absolute_import
 from __future__ import division
 import datetime
+import numpy as np
+from six.moves import xrange
 
 
 # -------------------------------------------------------------------------------
@@ -153,6 +155,44 @@ TYPE_TRANSLATOR = {
     "LREAL": lambda v: "%.6g" % v}
 
 
+# -------------------------------------------------------------------------------
+#                            Debug Values Column Class
+# -------------------------------------------------------------------------------
+
+
+class DebugValuesColumn(object):
+    """
+    Class that holds values captured for one variable in a batch of ticks.
+    Behaves as a sequence of (value, forced) tuples, while values can also
+    be accessed at once, as an array when possible
+    """
+
+    def __init__(self, values, forced):
+        """
+        Constructor
+        @param values: Sequence or numpy array of values captured
+        @param forced: Forced flag, same for all values
+        """
+        self.Values = values
+        self.Forced = forced
+
+    def __len__(self):
+        return len(self.Values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return DebugValuesColumn(self.Values[index], self.Forced)
+        value = self.Values[index]
+        # Give plain python values to consumers
+        if isinstance(value, np.generic):
+            value = value.item()
+        return value, self.Forced
+
+    def __iter__(self):
+        for index in xrange(len(self.Values)):
+            yield self[index]
+
+
 # -------------------------------------------------------------------------------
 #                            Debug Data Consumer Class
 # -------------------------------------------------------------------------------
@@ -50,8 +50,8 @@ static const char *modbus_error_messages[MAX_MODBUS_ERROR_CODE+1] = {
 };    
 
 
-/* Execute a modbus client transaction/request */
-static int __execute_mb_request(int request_id){
+/* Execute a modbus client transaction/request, on the given modbus library node */
+static int __execute_mb_request(int request_id, int mb_nd){
 	switch (client_requests[request_id].mb_function){
 	
 	case  1: /* read coils */
@@ -60,7 +60,7 @@ static int __execute_mb_request(int request_id){
 					client_requests[request_id].count,
 					client_requests[request_id].coms_buffer,
 					(int) client_requests[request_id].count,
-					client_nodes[client_requests[request_id].client_node_id].mb_nd,
+					mb_nd,
 					client_requests[request_id].retries,
 					&(client_requests[request_id].mb_error_code),
 					&(client_requests[request_id].resp_timeout),
@@ -72,7 +72,7 @@ static int __execute_mb_request(int request_id){
 					client_requests[request_id].count,
 					client_requests[request_id].coms_buffer,
 					(int) client_requests[request_id].count,
-					client_nodes[client_requests[request_id].client_node_id].mb_nd,
+					mb_nd,
 					client_requests[request_id].retries,
 					&(client_requests[request_id].mb_error_code),
 					&(client_requests[request_id].resp_timeout),
@@ -84,7 +84,7 @@ static int __execute_mb_request(int request_id){
 					client_requests[request_id].count,
 					client_requests[request_id].coms_buffer,
 					(int) client_requests[request_id].count,
-					client_nodes[client_requests[request_id].client_node_id].mb_nd,
+					mb_nd,
 					client_requests[request_id].retries,
 					&(client_requests[request_id].mb_error_code),
 					&(client_requests[request_id].resp_timeout),
@@ -96,7 +96,7 @@ static int __execute_mb_request(int request_id){
 					client_requests[request_id].count,
 					client_requests[request_id].coms_buffer,
 					(int) client_requests[request_id].count,
-					client_nodes[client_requests[request_id].client_node_id].mb_nd,
+					mb_nd,
 					client_requests[request_id].retries,
 					&(client_requests[request_id].mb_error_code),
 					&(client_requests[request_id].resp_timeout),
@@ -106,7 +106,7 @@ static int __execute_mb_request(int request_id){
 		return write_output_bit(client_requests[request_id].slave_id,
 					client_requests[request_id].address,
 					client_requests[request_id].coms_buffer[0],
-					client_nodes[client_requests[request_id].client_node_id].mb_nd,
+					mb_nd,
 					client_requests[request_id].retries,
 					&(client_requests[request_id].mb_error_code),
 					&(client_requests[request_id].resp_timeout),
@@ -116,7 +116,7 @@ static int __execute_mb_request(int request_id){
 		return write_output_word(client_requests[request_id].slave_id,
 					client_requests[request_id].address,
 					client_requests[request_id].coms_buffer[0],
-					client_nodes[client_requests[request_id].client_node_id].mb_nd,
+					mb_nd,
 					client_requests[request_id].retries,
 					&(client_requests[request_id].mb_error_code),
 					&(client_requests[request_id].resp_timeout),
@@ -136,7 +136,7 @@ static int __execute_mb_request(int request_id){
 					 client_requests[request_id].address,
 					 client_requests[request_id].count,
 					 client_requests[request_id].coms_buffer,
-					 client_nodes[client_requests[request_id].client_node_id].mb_nd,
+					 mb_nd,
 					 client_requests[request_id].retries,
 					 &(client_requests[request_id].mb_error_code),
 					 &(client_requests[request_id].resp_timeout),
@@ -147,7 +147,7 @@ static int __execute_mb_request(int request_id){
 					client_requests[request_id].address,
 					client_requests[request_id].count,
 					client_requests[request_id].coms_buffer,
-					client_nodes[client_requests[request_id].client_node_id].mb_nd,
+					mb_nd,
 					client_requests[request_id].retries,
 					&(client_requests[request_id].mb_error_code),
 					&(client_requests[request_id].resp_timeout),
@@ -326,6 +326,40 @@ static void *__mb_server_thread(void *_server_node)  {
 }
 
 
+/* Check if the user program asked to execute any of the requests coalesced into a frame */
+static int __frame_exec_req(int request_id) {
+	for (; request_id >= 0; request_id = client_requests[request_id].frame_next)
+		if (client_requests[request_id].flag_exec_req != 0)
+			return 1;
+	return 0;
+}
+
+
+/* Hand over the result of a frame, executed by its head request, to the other requests coalesced into it */
+static void __scatter_frame(int head, int res) {
+	int req;
+
+	for (req = client_requests[head].frame_next; req >= 0; req = client_requests[req].frame_next) {
+		if (res >= 0) {
+			// the frame data is only written by the client thread, so no need to lock the head's coms_buffer
+			pthread_mutex_lock(&(client_requests[req].coms_buf_mutex));
+			memcpy((void *)client_requests[req].coms_buffer /* destination */,
+			       (void *)&(client_requests[head].coms_buffer[client_requests[req].frame_offset]) /* source */,
+			       client_requests[req].count * sizeof(u16) /* size in bytes */);
+			pthread_mutex_unlock(&(client_requests[req].coms_buf_mutex));
+		}
+		client_requests[req].mb_error_code      = client_requests[head].mb_error_code;
+		client_requests[req].tn_error_code      = client_requests[head].tn_error_code;
+		client_requests[req].flag_mb_error_code = client_requests[head].mb_error_code;
+		client_requests[req].flag_tn_error_code = client_requests[head].tn_error_code;
+		if (0 != client_requests[req].flag_exec_req) {
+			client_requests[req].flag_exec_req     = 0;
+			client_requests[req].flag_exec_started = 0;
+		}
+	}
+}
+
+
 #define timespec_add(ts, sec, nsec) {		\
 	ts.tv_sec  +=  sec;			\
 	ts.tv_nsec += nsec;			\
@@ -336,6 +370,211 @@ static void *__mb_server_thread(void *_server_node)  {
 }
 
 
+/* Pick the next request to be executed in the current communication cycle of a client node
+ * (-1 if none is left). Called by every lane of the client node.
+ */
+static int __next_client_request(int client_node_id) {
+	int req;
+
+	pthread_mutex_lock(&(client_nodes[client_node_id].lanes_mutex));
+	for (req = client_nodes[client_node_id].next_req; req < NUMBER_OF_CLIENT_REQTS; req ++){
+		/* just do the requests belonging to the client */
+		if (client_requests[req].client_node_id != client_node_id)
+			continue;
+		/* requests coalesced into a frame are executed by the frame's head request */
+		if (client_requests[req].frame_head != req)
+			continue;
+        
+        /* only do the request if:
+         *   - this request (or another one coalesced into the same frame) was explictly asked
+         *     to be executed by the client program
+         *  OR
+         *   - the client thread was activated periodically
+         *     (in which case we execute all the requests belonging to the client node)
+         */
+        if ((__frame_exec_req(req) == 0) && (client_nodes[client_requests[req].client_node_id].periodic_act == 0))
+            continue;
+
+		break;
+	}
+	client_nodes[client_node_id].next_req = req + 1;
+	pthread_mutex_unlock(&(client_nodes[client_node_id].lanes_mutex));
+
+	return (req < NUMBER_OF_CLIENT_REQTS)? req : -1;
+}
+
+
+/* Execute requests of the current communication cycle of a client node, on the given
+ * modbus library node (i.e. connection), until there are none left.
+ * prev_error is the error code of the last error message printed for that connection.
+ */
+static void __run_client_requests(int client_node_id, int mb_nd, int *prev_error) {
+	/* Variable use to specify delay to introduce between any two consecutive requests we send out to the same client
+	 * Initially set to 0 since we don't want to introduce a delay before the very first request.
+	 */
+	struct timespec inter_request_delay;
+	inter_request_delay.tv_sec  = 0;
+	inter_request_delay.tv_nsec = 0;
+	
+	int req;
+	while ((req = __next_client_request(client_node_id)) >= 0) {
+        /*
+        fprintf(stderr, "Modbus client thread (%%d): RUNNING Modbus request %%d  (periodic = %%d  flag_exec_req = %%d)\n", 
+                client_node_id, req, client_nodes[client_requests[req].client_node_id].periodic_act, client_requests[req].flag_exec_req );
+        */
+		
+		/* Insert a delay between any two consecutive requests to the same client
+		 * Needed because some clients will ignore our requests if we send them out too fast.
+		 *
+		 * Note that since we don't want to insert a delay before the very first request we will send, the inter_request_delay variable
+		 * is first initialised to 0. It will be set to the correct delay after the first (and second, third, etc..) request has completed.
+		 */
+		clock_nanosleep(CLOCK_MONOTONIC, 0 /* relative sleep */, &inter_request_delay, NULL);
+        
+		int res_tmp = __execute_mb_request(req, mb_nd);
+		client_requests[req].tn_error_code = 0; // assume success
+		switch (res_tmp) {
+		  case PORT_FAILURE: {
+			if (res_tmp != *prev_error)
+				fprintf(stderr, "Modbus plugin: Error connecting Modbus client %%s to remote server.\n", client_nodes[client_node_id].location);
+			*prev_error = res_tmp;
+			client_requests[req].tn_error_code = 1; // error accessing IP network, or serial interface
+			break;
+		  }
+		  case INVALID_FRAME: {
+			if ((res_tmp != client_requests[req].prev_error) && (0 == *prev_error))
+				fprintf(stderr, "Modbus plugin: Modbus client request configured at location %%s was unsuccesful. Server/slave returned an invalid/corrupted frame.\n", client_requests[req].location);
+			client_requests[req].prev_error = res_tmp;
+			client_requests[req].tn_error_code = 2; // reply received from server was an invalid frame
+			break;
+		  }
+		  case TIMEOUT: {
+			if ((res_tmp != client_requests[req].prev_error) && (0 == *prev_error))
+				fprintf(stderr, "Modbus plugin: Modbus client request configured at location %%s timed out waiting for reply from server.\n", client_requests[req].location);
+			client_requests[req].prev_error = res_tmp;
+			client_requests[req].tn_error_code = 3; // server did not reply before timeout expired
+			break;
+		  }
+		  case MODBUS_ERROR: {
+			if (client_requests[req].prev_error != client_requests[req].mb_error_code) {
+				fprintf(stderr, "Modbus plugin: Modbus client request configured at location %%s was unsuccesful. Server/slave returned error code 0x%%2x", client_requests[req].location, client_requests[req].mb_error_code);
+				if (client_requests[req].mb_error_code <= MAX_MODBUS_ERROR_CODE ) {
+					fprintf(stderr, "(%%s)", modbus_error_messages[client_requests[req].mb_error_code]);
+					fprintf(stderr, ".\n");
+				}
+			}
+			client_requests[req].prev_error = client_requests[req].mb_error_code;
+			client_requests[req].tn_error_code = 4; // server returned a valid Modbus error frame
+			break;
+		  }
+		  default: {
+			if ((res_tmp >= 0) && (*prev_error != 0)) {
+				fprintf(stderr, "Modbus plugin: Modbus client %%s has reconnected to server/slave.\n", client_nodes[client_node_id].location);
+			}
+			if ((res_tmp >= 0) && (client_requests[req]        .prev_error != 0)) {
+				fprintf(stderr, "Modbus plugin: Modbus client request configured at location %%s has succesfully resumed comunication.\n", client_requests[req].location);
+			}
+			*prev_error = 0;
+			client_requests[req]        .prev_error = 0;
+			break;
+		  }
+		}
+
+		/* Set the flag_tn_error_code and flag_mb_error_code that are mapped onto
+         * located BYTE variables, so the user program
+         * knows how the communication is going.
+         */
+        client_requests[req].flag_mb_error_code = client_requests[req].mb_error_code;
+        client_requests[req].flag_tn_error_code = client_requests[req].tn_error_code;
+        
+        /* We have just finished executing a client transaction request.
+         * If the current cycle was activated by user request we reset the flag used to ask to run it
+         */
+        if (0 != client_requests[req].flag_exec_req) {
+            client_requests[req].flag_exec_req     = 0;
+            client_requests[req].flag_exec_started = 0;   
+        }
+        
+        /* Copy data and error codes to the other requests coalesced into this request's frame */
+        __scatter_frame(req, res_tmp);
+        
+        /* We have just finished executing a client transaction request.
+         * Set the inter request delay before we send the next request. Value of delay is set by user in beremiz GUI
+         */
+        inter_request_delay.tv_sec  =  client_nodes[client_node_id].req_delay / 1000; /* ms to seconds */
+        inter_request_delay.tv_nsec = (client_nodes[client_node_id].req_delay %% 1000) * 1000 * 1000; /* ms to ns */
+        
+        //fprintf(stderr, "Modbus plugin: RUNNING<---> of Modbus request %%d  (periodic = %%d  flag_exec_req = %%d)\n", 
+        //        req, client_nodes[client_requests[req].client_node_id].periodic_act, client_requests[req].flag_exec_req );
+    }
+}
+
+
+static void __unlock_mutex(void *mutex) {
+	pthread_mutex_unlock((pthread_mutex_t *)mutex);
+}
+
+
+/* Run one communication cycle of a client node.
+ * 
+ * The client thread is the first lane of the client node. When the node is configured to keep
+ * several requests in flight, the extra lanes (each one with its own connection to the remote server)
+ * are woken up to pick requests in parallel, and the cycle ends once all of them are done.
+ */
+static void __run_client_cycle(int client_node_id) {
+	client_node_t *node = &(client_nodes[client_node_id]);
+
+	pthread_mutex_lock(&(node->lanes_mutex));
+	node->next_req   = 0;
+	node->busy_lanes = (node->lane_count > 1)? node->lane_count - 1 : 0;
+	node->lanes_cycle++;
+	pthread_cond_broadcast(&(node->lanes_condv));
+	pthread_mutex_unlock(&(node->lanes_mutex));
+
+	__run_client_requests(client_node_id, node->mb_nd, &(node->prev_error));
+
+	/* wait for the extra lanes to complete the requests they picked */
+	pthread_mutex_lock(&(node->lanes_mutex));
+	pthread_cleanup_push(__unlock_mutex, &(node->lanes_mutex));
+	while (node->busy_lanes > 0)
+		pthread_cond_wait(&(node->lanes_condv), &(node->lanes_mutex));
+	pthread_cleanup_pop(1);
+}
+
+
+/* Thread running an extra lane of a client node, i.e. executing requests of the node's
+ * communication cycles in parallel with the client thread, on its own connection.
+ */
+static void *__mb_client_lane_thread(void *_lane)  {
+	client_lane_t *lane = _lane;
+	client_node_t *node = &(client_nodes[lane->client_node_id]);
+	int cycle = 0;
+
+	// Enable thread cancelation. Enabled is default, but set it anyway to be safe.
+	pthread_setcancelstate(PTHREAD_CANCEL_ENABLE, NULL);
+
+	while (1) {
+		/* wait for the client thread to start a new cycle */
+		pthread_mutex_lock(&(node->lanes_mutex));
+		pthread_cleanup_push(__unlock_mutex, &(node->lanes_mutex));
+		while (node->lanes_cycle == cycle)
+			pthread_cond_wait(&(node->lanes_condv), &(node->lanes_mutex));
+		cycle = node->lanes_cycle;
+		pthread_cleanup_pop(1);
+
+		__run_client_requests(lane->client_node_id, lane->mb_nd, &(lane->prev_error));
+
+		pthread_mutex_lock(&(node->lanes_mutex));
+		if (--node->busy_lanes == 0)
+			pthread_cond_broadcast(&(node->lanes_condv));
+		pthread_mutex_unlock(&(node->lanes_mutex));
+	}
+
+	// humour the compiler.
+	return NULL;
+}
+
+
 static void *__mb_client_thread(void *_index)  {
 	int client_node_id = (char *)_index - (char *)NULL; // Use pointer arithmetic (more portable than cast)
 
@@ -374,114 +613,7 @@ static void *__mb_client_thread(void *_index)  {
 		fprintf(stderr, "Modbus client thread (%%d) - new cycle (%%ld:%%ld)!\n", client_node_id, cur_time.tv_sec, cur_time.tv_nsec);
 		*/
 		
-		/* Variable use to specify delay to introduce between any two consecutive requests we send out to the same client
-		 * Initially set to 0 since we don't want to introduce a delay before the very first request.
-		 */
-		struct timespec inter_request_delay;
-		inter_request_delay.tv_sec  = 0;
-		inter_request_delay.tv_nsec = 0;
-		
-		int req;
-		for (req=0; req < NUMBER_OF_CLIENT_REQTS; req ++){
-			/* just do the requests belonging to the client */
-			if (client_requests[req].client_node_id != client_node_id)
-				continue;
-            
-            /* only do the request if:
-             *   - this request was explictly asked to be executed by the client program
-             *  OR
-             *   - the client thread was activated periodically
-             *     (in which case we execute all the requests belonging to the client node)
-             */
-            if ((client_requests[req].flag_exec_req == 0) && (client_nodes[client_requests[req].client_node_id].periodic_act == 0))
-                continue;
-            
-            /*
-            fprintf(stderr, "Modbus client thread (%%d): RUNNING Modbus request %%d  (periodic = %%d  flag_exec_req = %%d)\n", 
-                    client_node_id, req, client_nodes[client_requests[req].client_node_id].periodic_act, client_requests[req].flag_exec_req );
-            */
-			
-			/* Insert a delay between any two consecutive requests to the same client
-			 * Needed because some clients will ignore our requests if we send them out too fast.
-			 *
-			 * Note that since we don't want to insert a delay before the very first request we will send, the inter_request_delay variable
-			 * is first initialised to 0. It will be set to the correct delay after the first (and second, third, etc..) request has completed.
-			 */
-			clock_nanosleep(CLOCK_MONOTONIC, 0 /* relative sleep */, &inter_request_delay, NULL);
-            
-			int res_tmp = __execute_mb_request(req);
-			client_requests[req].tn_error_code = 0; // assume success
-			switch (res_tmp) {
-			  case PORT_FAILURE: {
-				if (res_tmp != client_nodes[client_node_id].prev_error)
-					fprintf(stderr, "Modbus plugin: Error connecting Modbus client %%s to remote server.\n", client_nodes[client_node_id].location);
-				client_nodes[client_node_id].prev_error = res_tmp;
-				client_requests[req].tn_error_code = 1; // error accessing IP network, or serial interface
-				break;
-			  }
-			  case INVALID_FRAME: {
-				if ((res_tmp != client_requests[req].prev_error) && (0 == client_nodes[client_node_id].prev_error))
-					fprintf(stderr, "Modbus plugin: Modbus client request configured at location %%s was unsuccesful. Server/slave returned an invalid/corrupted frame.\n", client_requests[req].location);
-				client_requests[req].prev_error = res_tmp;
-				client_requests[req].tn_error_code = 2; // reply received from server was an invalid frame
-				break;
-			  }
-			  case TIMEOUT: {
-				if ((res_tmp != client_requests[req].prev_error) && (0 == client_nodes[client_node_id].prev_error))
-					fprintf(stderr, "Modbus plugin: Modbus client request configured at location %%s timed out waiting for reply from server.\n", client_requests[req].location);
-				client_requests[req].prev_error = res_tmp;
-				client_requests[req].tn_error_code = 3; // server did not reply before timeout expired
-				break;
-			  }
-			  case MODBUS_ERROR: {
-				if (client_requests[req].prev_error != client_requests[req].mb_error_code) {
-					fprintf(stderr, "Modbus plugin: Modbus client request configured at location %%s was unsuccesful. Server/slave returned error code 0x%%2x", client_requests[req].location, client_requests[req].mb_error_code);
-					if (client_requests[req].mb_error_code <= MAX_MODBUS_ERROR_CODE ) {
-						fprintf(stderr, "(%%s)", modbus_error_messages[client_requests[req].mb_error_code]);
-						fprintf(stderr, ".\n");
-					}
-				}
-				client_requests[req].prev_error = client_requests[req].mb_error_code;
-				client_requests[req].tn_error_code = 4; // server returned a valid Modbus error frame
-				break;
-			  }
-			  default: {
-				if ((res_tmp >= 0) && (client_nodes[client_node_id].prev_error != 0)) {
-					fprintf(stderr, "Modbus plugin: Modbus client %%s has reconnected to server/slave.\n", client_nodes[client_node_id].location);
-				}
-				if ((res_tmp >= 0) && (client_requests[req]        .prev_error != 0)) {
-					fprintf(stderr, "Modbus plugin: Modbus client request configured at location %%s has succesfully resumed comunication.\n", client_requests[req].location);
-				}
-				client_nodes[client_node_id].prev_error = 0;
-				client_requests[req]        .prev_error = 0;
-				break;
-			  }
-			}
-
-			/* Set the flag_tn_error_code and flag_mb_error_code that are mapped onto
-             * located BYTE variables, so the user program
-             * knows how the communication is going.
-             */
-            client_requests[req].flag_mb_error_code = client_requests[req].mb_error_code;
-            client_requests[req].flag_tn_error_code = client_requests[req].tn_error_code;
-            
-            /* We have just finished executing a client transaction request.
-             * If the current cycle was activated by user request we reset the flag used to ask to run it
-             */
-            if (0 != client_requests[req].flag_exec_req) {
-                client_requests[req].flag_exec_req     = 0;
-                client_requests[req].flag_exec_started = 0;   
-            }
-            
-            /* We have just finished executing a client transaction request.
-             * Set the inter request delay before we send the next request. Value of delay is set by user in beremiz GUI
-             */
-            inter_request_delay.tv_sec  =  client_nodes[client_node_id].req_delay / 1000; /* ms to seconds */
-            inter_request_delay.tv_nsec = (client_nodes[client_node_id].req_delay %% 1000) * 1000 * 1000; /* ms to ns */
-            
-            //fprintf(stderr, "Modbus plugin: RUNNING<---> of Modbus request %%d  (periodic = %%d  flag_exec_req = %%d)\n", 
-            //        req, client_nodes[client_requests[req].client_node_id].periodic_act, client_requests[req].flag_exec_req );
-        }
+		__run_client_cycle(client_node_id);
 
         // Wait for signal (from timer or explicit request from user program) before starting the next cycle
         {
@@ -587,7 +719,7 @@ static void *__mb_client_timer_thread(void *_index) {
 
 int __cleanup_%(locstr)s ();
 int __init_%(locstr)s (int argc, char **argv){
-	int index;
+	int index, lane;
 
 	for (index=0; index < NUMBER_OF_CLIENT_NODES;index++) {
 		client_nodes[index].mb_nd = -1;
@@ -671,6 +803,12 @@ int __init_%(locstr)s (int argc, char **argv){
         if (pthread_mutex_init(&(client_nodes[index].mutex), NULL) < 0) {
 			fprintf(stderr, "Modbus plugin: Error creating mutex for modbus client node %%s\n", client_nodes[index].location);
 			goto error_exit;                
+        }
+        /* initialize the mutex variable shared by the lanes of the client node */
+        bzero(&(client_nodes[index].lanes_mutex), sizeof(pthread_mutex_t));
+        if (pthread_mutex_init(&(client_nodes[index].lanes_mutex), NULL) < 0) {
+			fprintf(stderr, "Modbus plugin: Error creating mutex for modbus client node %%s\n", client_nodes[index].location);
+			goto error_exit;                
         }
 		client_nodes[index].init_state = 2; // we have created the mutex
 		
@@ -680,7 +818,14 @@ int __init_%(locstr)s (int argc, char **argv){
 			fprintf(stderr, "Modbus plugin: Error creating condition variable for modbus client node %%s\n", client_nodes[index].location);
 			goto error_exit;                
         }
+        /* initialize the condition variable used to synchronize the lanes of the client node */
+        bzero(&(client_nodes[index].lanes_condv), sizeof(pthread_cond_t));
+        if (pthread_cond_init(&(client_nodes[index].lanes_condv), NULL) < 0) {
+			fprintf(stderr, "Modbus plugin: Error creating condition variable for modbus client node %%s\n", client_nodes[index].location);
+			goto error_exit;                
+        }
         client_nodes[index].execute_req = 0; //variable associated with condition variable
+        client_nodes[index].lanes_cycle = 0; //variable associated with lanes condition variable
 		client_nodes[index].init_state = 3; // we have created the condition variable
 		
 		/* launch a thread to handle this client node timer */
@@ -708,6 +853,32 @@ int __init_%(locstr)s (int argc, char **argv){
 			}
 		}
 		client_nodes[index].init_state = 5; // we have created the thread
+
+		/* establish a connection and launch a thread for each extra lane of this client node */
+		for (lane = 0; lane < client_nodes[index].lane_count - 1; lane++) {
+			client_lane_t *client_lane = &(client_nodes[index].lanes[lane]);
+
+			client_lane->client_node_id = index;
+			client_lane->prev_error     = 0;
+			client_lane->mb_nd = mb_master_connect (client_nodes[index].node_address);
+			if (client_lane->mb_nd < 0){
+				fprintf(stderr, "Modbus plugin: Error creating connection %%d of modbus client node %%s\n", lane + 2, client_nodes[index].location);
+				goto error_exit;
+			}
+			client_lane->init_state = 1; // we have created the node
+
+			{
+				int res = 0;
+				pthread_attr_t attr;
+				res |= pthread_attr_init(&attr);
+				res |= pthread_create(&(client_lane->thread_id), &attr, &__mb_client_lane_thread, (void *)client_lane);
+				if (res !=  0) {
+					fprintf(stderr, "Modbus plugin: Error starting thread for connection %%d of modbus client node %%s\n", lane + 2, client_nodes[index].location);
+					goto error_exit;
+				}
+			}
+			client_lane->init_state = 2; // we have created the thread
+		}
 	}
 
 	/* init each local server */
@@ -847,7 +1018,7 @@ void __retrieve_%(locstr)s (){
 
 
 int __cleanup_%(locstr)s (){
-	int index, close;
+	int index, lane, close;
 	int res = 0;
 
 	/* kill thread and close connections of each modbus client node */
@@ -862,6 +1033,32 @@ int __cleanup_%(locstr)s (){
 		}
 		res |= close;
 
+		/* kill thread and close connection of each extra lane of the client node */
+		for (lane = 0; lane < MAX_CLIENT_LANES - 1; lane++) {
+			client_lane_t *client_lane = &(client_nodes[index].lanes[lane]);
+
+			close = 0;
+			if (client_lane->init_state >= 2) {
+				// thread was launched, so we try to cancel it!
+				close  = pthread_cancel(client_lane->thread_id);
+				close |= pthread_join  (client_lane->thread_id, NULL);
+				if (close < 0)
+					fprintf(stderr, "Modbus plugin: Error closing thread for connection %%d of modbus client node %%s\n", lane + 2, client_nodes[index].location);
+			}
+			res |= close;
+
+			close = 0;
+			if (client_lane->init_state >= 1) {
+				// modbus client node was created, so we try to close it!
+				close = mb_master_close (client_lane->mb_nd);
+				if (close < 0)
+					fprintf(stderr, "Modbus plugin: Error closing connection %%d of modbus client node %%s\n", lane + 2, client_nodes[index].location);
+				client_lane->mb_nd = -1;
+			}
+			res |= close;
+			client_lane->init_state = 0;
+		}
+
 		close = 0;
 		if (client_nodes[index].init_state >= 4) {
 			// timer thread was launched, so we try to cancel it!
@@ -877,6 +1074,7 @@ int __cleanup_%(locstr)s (){
 		if (client_nodes[index].init_state >= 3) {
 			// condition variable was created, so we try to destroy it!
 			close  = pthread_cond_destroy(&(client_nodes[index].condv));
+			close |= pthread_cond_destroy(&(client_nodes[index].lanes_condv));
 			if (close < 0)
 				fprintf(stderr, "Modbus plugin: Error destroying condition variable for modbus client node %%s\n", client_nodes[index].location);
 		}
@@ -886,6 +1084,7 @@ int __cleanup_%(locstr)s (){
 		if (client_nodes[index].init_state >= 2) {
 			// mutex was created, so we try to destroy it!
 			close  = pthread_mutex_destroy(&(client_nodes[index].mutex));
+			close |= pthread_mutex_destroy(&(client_nodes[index].lanes_mutex));
 			if (close < 0)
 				fprintf(stderr, "Modbus plugin: Error destroying mutex for modbus client node %%s\n", client_nodes[index].location);
 		}
@@ -115,6 +115,16 @@ typedef struct{
 	} server_node_t;
 
 
+  // Used by the Modbus client node, to keep several requests in flight (Modbus/TCP only)
+#define MAX_CLIENT_LANES 16
+typedef struct{
+	    int		client_node_id;
+	    int		mb_nd;      // modbus library node (i.e. connection) used by this lane
+	    int		init_state; // store how far along the lane's initialization has progressed
+	    int		prev_error; // error code of the last printed error message (0 when no error)
+	    pthread_t   thread_id;  // thread executing the requests picked by this lane
+	} client_lane_t;
+
   // Used by the Modbus client node
 typedef struct{
 	    const char *location;
@@ -127,6 +137,7 @@ typedef struct{
 	    u64		comm_period;// period to use when periodically sending requests to remote server (in ms)
 	    u64		req_delay;  // delay between 2 consecutive requests sent to remote slaves/server (in ms)
 	    int		prev_error; // error code of the last printed error message (0 when no error) 
+	    int		lane_count; // number of requests kept in flight, each one on its own connection (0 or 1 => one at a time)
 	    pthread_t   thread_id;  // thread handling all communication for this client node
 	    pthread_t	timer_thread_id;  // thread handling periodical timer for this client node
 	    pthread_mutex_t mutex;  // mutex to be used with the following condition variable
@@ -149,6 +160,12 @@ typedef struct{
                                  * by other sources, such as when the user program requests that a specific 
                                  * client MB transation be executed (flag_exec_req in client_request_t)
                                  */
+        client_lane_t   lanes[MAX_CLIENT_LANES - 1]; // extra lanes (the client node's thread being the first one)
+        pthread_mutex_t lanes_mutex;  // protects the following variables, shared by all lanes of the client node
+        pthread_cond_t  lanes_condv;  // signals the start and the end of a communication cycle to the lanes
+        int       lanes_cycle;  // communication cycle counter
+        int       next_req;     // next request to be picked by a lane in current cycle
+        int       busy_lanes;   // number of extra lanes still executing requests of the current cycle
 	} client_node_t;
 
 
@@ -174,6 +191,13 @@ typedef struct{
 	    int		prev_error; // error code of the last printed error message (0 when no error) 
 	    struct timespec resp_timeout;
 	    u8		write_on_change; // boolean flag. If true => execute MB request when data to send changes
+	      /* Read requests to the same slave may be coalesced into a single frame (see GetClientRequestFrames()).
+	       * The frame is executed by its head request, with address and count covering the whole frame.
+	       * The other requests of the frame are skipped, and get their data from the head's coms_buffer.
+	       */
+	    int		frame_head;   // index of the request executing the frame (own index if not coalesced)
+	    int		frame_next;   // index of the next request of the frame (-1 if last one)
+	    u16		frame_offset; // offset of this request's data in the frame
 	      // buffer used to store located PLC variables
 	    u16		plcv_buffer[REQ_BUF_SIZE];
 	      // buffer used to store data coming from / going to server
@@ -162,54 +162,138 @@ def GetTCPClientNodePrinted(self, child):
     params: child - the correspondent subplugin in Beremiz
     """
     node_init_template = '''/*node %(locnodestr)s*/
-{"%(locnodestr)s", "%(config_name)s", "%(host)s", "%(port)s", {naf_tcp, {.tcp = {NULL, NULL, DEF_CLOSE_ON_SILENCE}}}, -1 /* mb_nd */, 0 /* init_state */, %(coms_period)s /* communication period (ms)*/, %(coms_delay)s /* inter request delay (ms)*/, 0 /* prev_error */}'''
+{"%(locnodestr)s", "%(config_name)s", "%(host)s", "%(port)s", {naf_tcp, {.tcp = {NULL, NULL, DEF_CLOSE_ON_SILENCE}}}, -1 /* mb_nd */, 0 /* init_state */, %(coms_period)s /* communication period (ms)*/, %(coms_delay)s /* inter request delay (ms)*/, 0 /* prev_error */, %(lane_count)s /* requests in flight */}'''
 
     location = ".".join(map(str, child.GetCurrentLocation()))
     config_name, host, port, coms_period, coms_delay = GetCTVals(child, range(5))
+    lane_count = GetCTVal(child, 6)
 
     node_dict = {"locnodestr": location,
                  "config_name": config_name,
                  "host": host,
                  "port": port,
                  "coms_period": coms_period,
-                 "coms_delay": coms_delay}
+                 "coms_delay": coms_delay,
+                 "lane_count": lane_count}
     return node_init_template % node_dict
 
 
-def GetClientRequestPrinted(self, child, nodeid):
+def GetClientRequestValues(child):
+    """
+    Numeric parameters of a client request node
+    params: child - the request subplugin
+    return: (slaveid, count, address, timeout) - as integers
+            None - if one of them is not a number
+    """
+    try:
+        return tuple([int(value) for value in GetCTVals(child, range(1, 5))])
+    except (ValueError, TypeError):
+        return None
+
+
+def GetClientRequestFrames(children, requestid, coalesce):
+    """
+    Coalesce read requests of a client node into frames.
+    Read requests with same function, slave ID and timeout whose address
+    ranges are adjacent or overlap are merged into one frame, as long as
+    the frame does not exceed the max count allowed for that function.
+    The frame is executed by the request with lowest start address (the
+    frame head), the other requests of the frame get their data from it.
+    params: children - the request subplugins of the client node
+            requestid - index in client_requests[] of the node's first request
+            coalesce - if False, each request is executed on its own
+    return: (frames, saved)
+            frames - list of (frame_head, frame_next, frame_offset, count)
+                     tuples, one for each request in children
+            saved - number of frames saved by coalescing
+    """
+    frames = {}
+    groups = {}
+    for reqid, child in enumerate(children, requestid):
+        values = GetClientRequestValues(child)
+        if values is None:
+            # error is reported by GetClientRequestPrinted()
+            frames[reqid] = (reqid, -1, 0, 0)
+            continue
+        slaveid, count, address, timeout = values
+        function = GetCTVal(child, 0)
+        frames[reqid] = (reqid, -1, 0, count)
+        function_desc = modbus_function_dict.get(function)
+        if coalesce and function_desc is not None and function_desc[1] == 'req_input':
+            groups.setdefault((function, slaveid, timeout), []).append(
+                (address, count, reqid))
+
+    saved = 0
+    for (function, _slaveid, _timeout), requests in groups.items():
+        maxcount = modbus_function_dict[function][2]
+        # list of (frame_start, frame_end, [(address, reqid), ...])
+        merged = []
+        for address, count, reqid in sorted(requests):
+            if merged:
+                frame_start, frame_end, members = merged[-1]
+                end = max(frame_end, address + count)
+                if address <= frame_end and end - frame_start <= maxcount:
+                    merged[-1] = (frame_start, end, members + [(address, reqid)])
+                    continue
+            merged.append((address, address + count, [(address, reqid)]))
+
+        for frame_start, frame_end, members in merged:
+            saved += len(members) - 1
+            head = members[0][1]
+            for index, (address, reqid) in enumerate(members):
+                frame_next = members[index + 1][1] if index + 1 < len(members) else -1
+                count = frame_end - frame_start if reqid == head else frames[reqid][3]
+                frames[reqid] = (head, frame_next, address - frame_start, count)
+
+    return [frames[reqid] for reqid in xrange(requestid, requestid + len(children))], saved
+
+
+def GetClientRequestPrinted(self, child, nodeid, frame):
     """
     Outputs a string to be used on C files
     params: child - the correspondent subplugin in Beremiz
             nodeid - on C code, each request has it's own parent node (sequential, 0..NUMBER_OF_NODES)
                      It's this parameter.
+            frame - (frame_head, frame_next, frame_offset, count) tuple, as
+                    returned by GetClientRequestFrames()
     return: None - if any definition error found
             The string that should be added on C code - if everything goes allright
     """
 
     req_init_template = '''/*request %(locreqstr)s*/
-{"%(locreqstr)s", %(nodeid)s, %(slaveid)s, %(iotype)s, %(func_nr)s, %(address)s , %(count)s,
+{"%(locreqstr)s", %(nodeid)s, %(slaveid)s, %(iotype)s, %(func_nr)s, %(address)s , %(frame_count)s,
 DEF_REQ_SEND_RETRIES, 0 /* mb_error_code */, 0 /* tn_error_code */, 0 /* prev_code */, {%(timeout_s)d, %(timeout_ns)d} /* timeout */, %(write_on_change)d /* write_on_change */, 
+%(frame_head)d /* frame_head */, %(frame_next)d /* frame_next */, %(frame_offset)d /* frame_offset */,
 {%(buffer)s}, {%(buffer)s}}'''
 
-    timeout = int(GetCTVal(child, 4))
+    locreqstr = "_".join(map(str, child.GetCurrentLocation()))
+    values = GetClientRequestValues(child)
+    if values is None:
+        self.GetCTRoot().logger.write_error(
+            "Modbus plugin: Invalid slaveID, Start Address, number of channels or timeout in client request node %s (Must be numbers)\nModbus plugin: Aborting C code generation for this node\n" % locreqstr)
+        return None
+    slaveid, count, address, timeout = values
     timeout_s = timeout // 1000
     timeout_ms = timeout - (timeout_s * 1000)
     timeout_ns = timeout_ms * 1000000
 
     request_dict = {
-        "locreqstr": "_".join(map(str, child.GetCurrentLocation())),
+        "locreqstr": locreqstr,
         "nodeid": str(nodeid),
-        "slaveid": GetCTVal(child, 1),
-        "address": GetCTVal(child, 3),
-        "count": GetCTVal(child, 2),
+        "slaveid": slaveid,
+        "address": address,
+        "count": count,
         "write_on_change": GetCTVal(child, 5),
         "timeout": timeout,
         "timeout_s": timeout_s,
         "timeout_ns": timeout_ns,
-        "buffer": ",".join(['0'] * int(GetCTVal(child, 2))),
         "func_nr": modbus_function_dict[GetCTVal(child, 0)][0],
         "iotype": modbus_function_dict[GetCTVal(child, 0)][1],
-        "maxcount": modbus_function_dict[GetCTVal(child, 0)][2]}
+        "maxcount": modbus_function_dict[GetCTVal(child, 0)][2],
+        "frame_head": frame[0],
+        "frame_next": frame[1],
+        "frame_offset": frame[2],
+        "frame_count": frame[3]}
 
     if int(request_dict["slaveid"]) not in xrange(256):
         self.GetCTRoot().logger.write_error(
@@ -232,6 +316,7 @@ DEF_REQ_SEND_RETRIES, 0 /* mb_error_code */, 0 /* tn_error_code */, 0 /* prev_co
             "Modbus plugin: (warning) MB client request node %(locreqstr)s has option 'write_on_change' enabled.\nModbus plugin: This option will be ignored by the Modbus read function.\n" % request_dict)
         # NOTE: this is only a warning (we don't wish to abort code generation) so following line must be left commented out!
         # return None
-    
 
+    # count is known to be valid only now
+    request_dict["buffer"] = ",".join(['0'] * count)
     return req_init_template % request_dict
@@ -171,6 +171,10 @@ class _RequestPlug(object):
                 "location": ".".join([str(i) for i in current_location]) + ".x",
                 "children": entries}
 
+    # Requests go through connection of parent client
+    def CTNExclusiveResources(self):
+        return []
+
     def CTNGenerate_C(self, buildpath, locations):
         """
         Generate C code
@@ -277,6 +281,10 @@ class _MemoryAreaPlug(object):
                 "location": ".".join([str(i) for i in current_location]) + ".x",
                 "children": entries}
 
+    # Memory areas are served by parent server
+    def CTNExclusiveResources(self):
+        return []
+
     def CTNGenerate_C(self, buildpath, locations):
         """
         Generate C code
@@ -327,12 +335,23 @@ class _ModbusTCPclientPlug(object):
                 </xsd:restriction>
             </xsd:simpleType>
           </xsd:attribute>
+          <xsd:attribute name="Coalesce_Requests" type="xsd:boolean" use="optional" default="false"/>
+          <xsd:attribute name="Requests_In_Flight" use="optional" default="1">
+            <xsd:simpleType>
+                <xsd:restriction base="xsd:integer">
+                    <xsd:minInclusive value="1"/>
+                    <xsd:maxInclusive value="16"/>
+                </xsd:restriction>
+            </xsd:simpleType>
+          </xsd:attribute>
         </xsd:complexType>
       </xsd:element>
     </xsd:schema>
     """
     # NOTE: Max value of 2147483647 (i32_max) for Invocation_Rate_in_ms and Request_Delay_in_ms
     # corresponds to aprox 25 days.
+    # NOTE: Each of the Requests_In_Flight uses its own connection to the remote server,
+    # and requests are picked in order by the first free connection.
     CTNChildrenTypes = [("ModbusRequest", _RequestPlug, "Request")]
     # TODO: Replace with CTNType !!!
     PlugType = "ModbusTCPclient"
@@ -358,12 +377,17 @@ class _ModbusTCPclientPlug(object):
     # Return the number of (modbus library) nodes this specific TCP client will need
     #   return type: (tcp nodes, rtu nodes, ascii nodes)
     def GetNodeCount(self):
-        return (1, 0, 0)
+        # one (modbus library) node for each connection used to keep requests in flight
+        return (int(self.ModbusTCPclient.getRequests_In_Flight()), 0, 0)
 
     def GetConfigName(self):
         """ Return the node's Configuration_Name """
         return self.ModbusTCPclient.getConfiguration_Name()
 
+    # Connections to remote servers can be opened twice
+    def CTNExclusiveResources(self):
+        return []
+
     def CTNGenerate_C(self, buildpath, locations):
         """
         Generate C code
@@ -453,6 +477,10 @@ class _ModbusTCPserverPlug(object):
         """ Return the node's Configuration_Name """
         return self.ModbusServerNode.getConfiguration_Name()
 
+    # Port is exclusive whatever the interface, as "#ANY#" binds them all
+    def CTNExclusiveResources(self):
+        return ["tcp:" + self.ModbusServerNode.getLocal_Port_Number()]
+
     def GetVariableLocationTree(self):
         current_location = self.GetCurrentLocation()
         name             = self.BaseParams.getName()
@@ -581,6 +609,7 @@ class _ModbusRTUclientPlug(object):
                 </xsd:restriction>
             </xsd:simpleType>
           </xsd:attribute>
+          <xsd:attribute name="Coalesce_Requests" type="xsd:boolean" use="optional" default="false"/>
         </xsd:complexType>
       </xsd:element>
     </xsd:schema>
@@ -630,6 +659,9 @@ class _ModbusRTUclientPlug(object):
         """ Return the node's Configuration_Name """
         return self.ModbusRTUclient.getConfiguration_Name()
 
+    def CTNExclusiveResources(self):
+        return ["serial:" + self.ModbusRTUclient.getSerial_Port()]
+
     def CTNGenerate_C(self, buildpath, locations):
         """
         Generate C code
@@ -721,6 +753,9 @@ class _ModbusRTUslavePlug(object):
         """ Return the node's Configuration_Name """
         return self.ModbusRTUslave.getConfiguration_Name()
 
+    def CTNExclusiveResources(self):
+        return ["serial:" + self.ModbusRTUslave.getSerial_Port()]
+
     def GetVariableLocationTree(self):
         current_location = self.GetCurrentLocation()
         name             = self.BaseParams.getName()
@@ -873,6 +908,10 @@ class RootClass(object):
             Node_Configuration_Names.extend([(child.GetCurrentLocation(), child.GetConfigName())])
         return Node_Configuration_Names
 
+    # Only children (clients and servers) use resources
+    def CTNExclusiveResources(self):
+        return []
+
     def CTNGenerate_C(self, buildpath, locations):
         # print "#############"
         # print self.__class__
@@ -966,6 +1005,7 @@ class RootClass(object):
         nodeid = 0
         client_nodeid = 0
         client_requestid = 0
+        client_frames_saved = 0
         server_id = 0
 
         server_node_list = []
@@ -1093,9 +1133,13 @@ class RootClass(object):
                 if new_node is None:
                     return [], "", False
                 client_node_list.append(new_node)
-                for subchild in child.IECSortedChildren():
+                # merge adjacent read requests into frames, if Coalesce_Requests is set
+                frames, saved = GetClientRequestFrames(
+                    child.IECSortedChildren(), client_requestid, GetCTVal(child, 5))
+                client_frames_saved += saved
+                for subchild, frame in zip(child.IECSortedChildren(), frames):
                     new_req = GetClientRequestPrinted(
-                        self, subchild, client_nodeid)
+                        self, subchild, client_nodeid, frame)
                     if new_req is None:
                         return [], "", False
                     client_request_list.append(new_req)
@@ -1154,9 +1198,13 @@ class RootClass(object):
                 if new_node is None:
                     return [], "", False
                 client_node_list.append(new_node)
-                for subchild in child.IECSortedChildren():
+                # merge adjacent read requests into frames, if Coalesce_Requests is set
+                frames, saved = GetClientRequestFrames(
+                    child.IECSortedChildren(), client_requestid, GetCTVal(child, 7))
+                client_frames_saved += saved
+                for subchild, frame in zip(child.IECSortedChildren(), frames):
                     new_req = GetClientRequestPrinted(
-                        self, subchild, client_nodeid)
+                        self, subchild, client_nodeid, frame)
                     if new_req is None:
                         return [], "", False
                     client_request_list.append(new_req)
@@ -1211,6 +1259,10 @@ class RootClass(object):
                 client_nodeid += 1
             nodeid += 1
 
+        if client_frames_saved > 0:
+            self.GetCTRoot().logger.write(
+                "Modbus plugin: coalescing client read requests saves %d frames per communication cycle\n" % client_frames_saved)
+
         loc_dict["loc_vars"] = "\n".join(loc_vars)
         loc_dict["server_nodes_params"] = ",\n\n".join(server_node_list)
         loc_dict["client_nodes_params"] = ",\n\n".join(client_node_list)
@@ -6,7 +6,7 @@ import os
 
 from editors.ConfTreeNodeEditor import ConfTreeNodeEditor
 from PLCControler import LOCATION_CONFNODE, LOCATION_VAR_INPUT, LOCATION_VAR_OUTPUT
-from .opcua_client_maker import OPCUAClientPanel, OPCUAClientModel, UA_IEC_types, authParams
+from .opcua_client_maker import OPCUAClientPanel, OPCUAClientModel, UA_IEC_types, authParams, lstcolnames
 
 import util.paths as paths
 
@@ -134,6 +134,10 @@ class OPCUAClient(object):
         self.modeldata.SaveCSV(self.GetFileName())
         return True
 
+    def CTNExclusiveResources(self):
+        # client connections to server can be opened twice
+        return []
+
     def CTNGenerate_C(self, buildpath, locations):
         current_location = self.GetCurrentLocation()
         locstr = "_".join(map(str, current_location))
@@ -161,18 +165,40 @@ class OPCUAClient(object):
         for direction, data in self.modeldata.iteritems():
             iec_direction_prefix = {"input": "__I", "output": "__Q"}[direction]
             for row in data:
-                dname, ua_nsidx, ua_nodeid_type, _ua_node_id, ua_type, iec_number = row
+                dname, ua_nsidx, ua_nodeid_type, _ua_node_id, ua_type, iec_number = row[:len(lstcolnames)]
                 iec_type, C_type, iec_size_prefix, ua_type_enum, ua_type = UA_IEC_types[ua_type]
                 c_loc_name = iec_direction_prefix + iec_size_prefix + locstr + "_" + str(iec_number)
+                location = ".".join([str(i) for i in current_location]) + "." + str(iec_number)
                 entries.append({
                     "name": dname,
                     "type": {"input": LOCATION_VAR_INPUT, "output": LOCATION_VAR_OUTPUT}[direction],
                     "size": {"X":1, "B":8, "W":16, "D":32, "L":64}[iec_size_prefix],
                     "IEC_type": iec_type,
                     "var_name": c_loc_name,
-                    "location": iec_size_prefix + ".".join([str(i) for i in current_location]) + "." + str(iec_number),
+                    "location": iec_size_prefix + location,
                     "description": "",
                     "children": []})
+                if direction == "input":
+                    # NOTE: If input has location %IW1.2.3, then
+                    #       quality flag is %IX1.2.3.1 and age is %ID1.2.3.2
+                    entries.append({
+                        "name": dname + " quality",
+                        "type": LOCATION_VAR_INPUT,
+                        "size": 1,
+                        "IEC_type": "BOOL",
+                        "var_name": "__IX" + locstr + "_" + str(iec_number) + "_1",
+                        "location": "X" + location + ".1",
+                        "description": "TRUE if last read of " + dname + " succeeded",
+                        "children": []})
+                    entries.append({
+                        "name": dname + " age",
+                        "type": LOCATION_VAR_INPUT,
+                        "size": 32,
+                        "IEC_type": "UDINT",
+                        "var_name": "__ID" + locstr + "_" + str(iec_number) + "_2",
+                        "location": "D" + location + ".2",
+                        "description": "Time since last good value of " + dname + " (ms)",
+                        "children": []})
         return {"name": name,
                 "type": LOCATION_CONFNODE,
                 "location": ".".join([str(i) for i in current_location]) + ".x",
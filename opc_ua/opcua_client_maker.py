@@ -36,8 +36,20 @@ lstcolnames  = [  "Name", "NSIdx", "IdType", "Id", "Type", "IEC"]
 lstcolwidths = [     100,      50,      100,  100,    100,    50]
 lstcoltypess = [     str,     int,      str,  str,    str,   int]
 
+# Inputs can also be mapped through OPC-UA subscription. Sampling interval
+# is in ms, 0 meaning input is polled. Deadband is absolute, 0 meaning none.
+subcolnames    = ["Sampling", "Queue", "Deadband"]
+subcolwidths   = [        70,      50,         70]
+subcoltypess   = [     float,     int,      float]
+subcoldefaults = [       0.0,       1,        0.0]
+
 directions = ["input", "output"]
 
+colnames    = {"input": lstcolnames + subcolnames, "output": lstcolnames}
+colwidths   = {"input": lstcolwidths + subcolwidths, "output": lstcolwidths}
+coltypess   = {"input": lstcoltypess + subcoltypess, "output": lstcoltypess}
+coldefaults = {"input": subcoldefaults, "output": []}
+
 authParams = {
     "x509":[
         ("Certificate", "certificate.der"),
@@ -62,7 +74,7 @@ class OPCUASubListModel(dv.DataViewIndexListModel):
 
     # This method is called when the user edits a data item in the view.
     def SetValueByRow(self, value, row, col):
-        expectedtype = lstcoltypess[col]
+        expectedtype = self.data.coltypess[col]
 
         try:
             v = expectedtype(value)
@@ -79,7 +91,7 @@ class OPCUASubListModel(dv.DataViewIndexListModel):
 
     # Report how many columns this model provides data for.
     def GetColumnCount(self):
-        return len(lstcolnames)
+        return len(self.data.colnames)
 
     # Report the number of rows in the model
     def GetCount(self):
@@ -146,7 +158,7 @@ class OPCUASubListPanel(wx.Panel):
 
         self.dvc.AssociateModel(self.model)
 
-        for idx,(colname,width) in enumerate(zip(lstcolnames,lstcolwidths)):
+        for idx,(colname,width) in enumerate(zip(colnames[direction],colwidths[direction])):
             self.dvc.AppendTextColumn(colname,  idx, width=width, mode=dv.DATAVIEW_CELL_EDITABLE)
 
         DropTarget = NodeDropTarget(self)
@@ -447,13 +459,23 @@ class OPCUAClientPanel(wx.SplitterWindow):
         
 
 class OPCUAClientList(list):
-    def __init__(self, log, change_callback):
+    def __init__(self, log, change_callback, direction):
         super(OPCUAClientList, self).__init__(self)
         self.log = log
         self.change_callback = change_callback
+        self.colnames = colnames[direction]
+        self.coltypess = coltypess[direction]
+        self.coldefaults = coldefaults[direction]
+
+    def Complete(self, value):
+        """ Fill missing optional columns with default values """
+        missing = len(self.colnames) - len(value)
+        if missing > 0:
+            value = list(value) + self.coldefaults[len(self.coldefaults) - missing:]
+        return value
 
     def append(self, value):
-        v = dict(zip(lstcolnames, value))
+        v = dict(zip(self.colnames, self.Complete(value)))
 
         if type(v["IEC"]) != int:
             if len(self) == 0:
@@ -469,7 +491,7 @@ class OPCUAClientList(list):
             return False
 
         try:
-            for t,n in zip(lstcoltypess, lstcolnames):
+            for t,n in zip(self.coltypess, self.colnames):
                 v[n] = t(v[n]) 
         except ValueError: 
             self.log("Variable {} (Id={}) has invalid type\n".format(v["Name"],v["Id"]))
@@ -479,7 +501,7 @@ class OPCUAClientList(list):
             self.log("Variable {} (Id={}) already in list\n".format(v["Name"],v["Id"]))
             return False
 
-        list.append(self, [v[n] for n in lstcolnames])
+        list.append(self, [v[n] for n in self.colnames])
 
         self.change_callback()
 
@@ -493,7 +515,7 @@ class OPCUAClientModel(dict):
     def __init__(self, log, change_callback = lambda : None):
         super(OPCUAClientModel, self).__init__()
         for direction in directions:
-            self[direction] = OPCUAClientList(log, change_callback)
+            self[direction] = OPCUAClientList(log, change_callback, direction)
 
     def LoadCSV(self,path):
         with open(path, 'rb') as csvfile:
@@ -504,7 +526,7 @@ class OPCUAClientModel(dict):
             for row in reader:
                 direction = row[0]
                 # avoids calling change callback whe loading CSV
-                list.append(self[direction],row[1:])
+                list.append(self[direction], self[direction].Complete(row[1:]))
 
     def SaveCSV(self,path):
         with open(path, 'wb') as csvfile:
@@ -517,8 +539,14 @@ class OPCUAClientModel(dict):
     def GenerateC(self, path, locstr, config):
         template = """/* code generated by beremiz OPC-UA extension */
 
+#include <pthread.h>
+#include <semaphore.h>
+#include <sched.h>
+#include <stdint.h>
+
 #include <open62541/client_config_default.h>
 #include <open62541/client_highlevel.h>
+#include <open62541/client_subscriptions.h>
 #include <open62541/plugin/log_stdout.h>
 #include <open62541/plugin/securitypolicy.h>
 #include <open62541/plugin/securitypolicy_default.h>
@@ -569,23 +597,128 @@ loadFile(const char *const path) {{
 
 static UA_Client *client;
 static UA_ClientConfig *cc;
+static char *uri = "{uri}";
+
+/* Client is owned by exchange thread once PLC is initialized, so that
+   PLC cycle never waits for OPC-UA server. Values are handed over
+   through double buffers, each protected by a lock that PLC thread only
+   tries to take : if exchange thread is busy swapping buffers, PLC keeps
+   previous values for that cycle */
+
+#define RECONNECT_PERIOD_S 1
+
+static pthread_t exchange_thread;
+static sem_t exchange_wakeup;
+static int exchange_stop;
+static int exchange_started = 0;
+static int connected;
+
+/* index of input buffer PLC reads, the other one being written by exchange thread */
+static long input_front = 0;
+static long input_lock = 0;
+/* index of output buffer PLC writes, the other one being read by exchange thread */
+static long output_front = 0;
+static long output_lock = 0;
+static int output_pending = 0;
 
 #define DECL_VAR(ua_type, C_type, c_loc_name)                                                       \\
-static UA_Variant c_loc_name##_variant;                                                             \\
 static C_type c_loc_name##_buf = 0;                                                                 \\
-C_type *c_loc_name = &c_loc_name##_buf;
+C_type *c_loc_name = &c_loc_name##_buf;                                                             \\
+static C_type c_loc_name##_exchange[2];
+
+/* Input also come with quality flag and age of last good value in ms.
+   Third slot keeps last value notified by subscription, if any */
+#define NOTIFIED_SLOT 2
+
+#define DECL_INPUT_VAR(ua_type, C_type, c_loc_name, quality_loc_name, age_loc_name)                \\
+static C_type c_loc_name##_buf = 0;                                                                 \\
+C_type *c_loc_name = &c_loc_name##_buf;                                                             \\
+static C_type c_loc_name##_exchange[3];                                                             \\
+static uint8_t c_loc_name##_quality_buf = 0;                                                        \\
+uint8_t *quality_loc_name = &c_loc_name##_quality_buf;                                              \\
+static uint32_t c_loc_name##_age_buf = 0;                                                           \\
+uint32_t *age_loc_name = &c_loc_name##_age_buf;                                                     \\
+static uint8_t c_loc_name##_good[3];                                                                \\
+static UA_DateTime c_loc_name##_stamp[3];
 
 {decl}
 
+/* Values are exchanged with one service request per direction, split
+   according to server's operation limits. Requests are built once at
+   init, from tables below. Subscribed inputs come last in inputs table,
+   and are updated by data change notifications instead of being read */
+
+typedef struct {{
+    const UA_DataType *type;
+    void *exchange;         /* see double buffers and notified slot above */
+    size_t size;
+    uint8_t *good;
+    UA_DateTime *stamp;
+}} input_t;
+
+typedef struct {{
+    void *exchange;
+    size_t size;
+}} output_t;
+
+#define INPUT(ua_type_enum, c_loc_name)                                                            \\
+    {{&UA_TYPES[ua_type_enum], c_loc_name##_exchange, sizeof(c_loc_name##_buf),                    \\
+     c_loc_name##_good, c_loc_name##_stamp}},
+
+#define OUTPUT(c_loc_name)                                                                         \\
+    {{c_loc_name##_exchange, sizeof(c_loc_name##_buf)}},
+
+#define POLLED_COUNT {polled_count}
+#define SUBSCRIBED_COUNT {subscribed_count}
+#define INPUT_COUNT (POLLED_COUNT + SUBSCRIBED_COUNT)
+#define OUTPUT_COUNT {output_count}
+
+/* fastest sampling interval of subscribed inputs, in ms */
+#define PUBLISHING_INTERVAL {publishing_interval}
+
+/* last entries only keep arrays from being empty */
+static input_t inputs[] = {{{inputs}{subscribed_inputs}
+    {{NULL}}
+}};
+static output_t outputs[] = {{{outputs}
+    {{NULL}}
+}};
+static UA_ReadValueId read_ids[POLLED_COUNT + 1];
+static UA_WriteValue write_values[OUTPUT_COUNT + 1];
+static UA_MonitoredItemCreateRequest monitored_items[SUBSCRIBED_COUNT + 1];
+static UA_DataChangeFilter monitored_filters[SUBSCRIBED_COUNT + 1];
+
+/* subscription is created again on each new session */
+static int subscribed;
+
+/* 0 means no limit */
+static UA_UInt32 max_nodes_per_read = 0;
+static UA_UInt32 max_nodes_per_write = 0;
+static UA_UInt32 max_monitored_items_per_call = 0;
+
+static void __stop_exchange_{locstr}(void)
+{{
+    if(exchange_started){{
+        exchange_stop = 1;
+        sem_post(&exchange_wakeup);
+        pthread_join(exchange_thread, NULL);
+        sem_destroy(&exchange_wakeup);
+        exchange_started = 0;
+    }}
+}}
+
 void __cleanup_{locstr}(void)
 {{
+    __stop_exchange_{locstr}();
     UA_Client_disconnect(client);
     UA_Client_delete(client);
 }}
 
 #define INIT_NoAuth()                                                                              \\
     LogInfo("OPC-UA Init no auth");                                                                \\
-    UA_ClientConfig_setDefault(cc);                                                                \\
+    UA_ClientConfig_setDefault(cc);
+
+#define CONNECT_NoAuth()                                                                           \\
     retval = UA_Client_connect(client, uri);
 
 /* Note : Single policy is enforced here, by default open62541 client supports all policies */
@@ -626,60 +759,382 @@ void __cleanup_{locstr}(void)
         ++cc->securityPoliciesSize;                                                                \\
     }} while(0);                                                                                   \\
                                                                                                    \\
-    retval = UA_Client_connect(client, uri);                                                       \\
-                                                                                                   \\
+    /* security policy keeps its own copy */                                                       \\
     UA_ByteString_clear(&certificate);                                                             \\
     UA_ByteString_clear(&privateKey);
 
+#define CONNECT_x509()                                                                             \\
+    retval = UA_Client_connect(client, uri);
+
 #define INIT_UserPassword(User, Password)                                                          \\
     LogInfo("OPC-UA Init UserPassword %s,%s", User, Password);                                     \\
-    UA_ClientConfig_setDefault(cc);                                                                \\
+    UA_ClientConfig_setDefault(cc);
+
+#define CONNECT_UserPassword(User, Password)                                                       \\
     retval = UA_Client_connectUsername(client, uri, User, Password);
 
-#define INIT_READ_VARIANT(ua_type, c_loc_name)                                                     \\
-    UA_Variant_init(&c_loc_name##_variant);
+#define INIT_READ_ID(index, ua_nodeid_type, ua_nsidx, ua_node_id)                                 \\
+    UA_ReadValueId_init(&read_ids[index]);                                                         \\
+    read_ids[index].nodeId = ua_nodeid_type(ua_nsidx, ua_node_id);                                 \\
+    read_ids[index].attributeId = UA_ATTRIBUTEID_VALUE;
+
+#define INIT_WRITE_VALUE(index, ua_type_enum, ua_nodeid_type, ua_nsidx, ua_node_id)                \\
+    UA_WriteValue_init(&write_values[index]);                                                      \\
+    write_values[index].nodeId = ua_nodeid_type(ua_nsidx, ua_node_id);                             \\
+    write_values[index].attributeId = UA_ATTRIBUTEID_VALUE;                                        \\
+    write_values[index].value.hasValue = true;                                                     \\
+    UA_Variant_setScalar(&write_values[index].value.value, outputs[index].exchange,                \\
+                         &UA_TYPES[ua_type_enum]);
+
+#define INIT_MONITORED_ITEM(index, ua_nodeid_type, ua_nsidx, ua_node_id, sampling, queue, deadband) \\
+    monitored_items[index] = UA_MonitoredItemCreateRequest_default(                                \\
+        ua_nodeid_type(ua_nsidx, ua_node_id));                                                     \\
+    monitored_items[index].requestedParameters.samplingInterval = sampling;                        \\
+    monitored_items[index].requestedParameters.queueSize = queue;                                  \\
+    monitored_items[index].requestedParameters.discardOldest = true;                               \\
+    if(deadband > 0){{                                                                             \\
+        UA_DataChangeFilter_init(&monitored_filters[index]);                                       \\
+        monitored_filters[index].trigger = UA_DATACHANGETRIGGER_STATUSVALUE;                       \\
+        monitored_filters[index].deadbandType = UA_DEADBANDTYPE_ABSOLUTE;                          \\
+        monitored_filters[index].deadbandValue = deadband;                                         \\
+        monitored_items[index].requestedParameters.filter.encoding = UA_EXTENSIONOBJECT_DECODED;   \\
+        monitored_items[index].requestedParameters.filter.content.decoded.type =                   \\
+            &UA_TYPES[UA_TYPES_DATACHANGEFILTER];                                                  \\
+        monitored_items[index].requestedParameters.filter.content.decoded.data =                   \\
+            &monitored_filters[index];                                                             \\
+    }}
 
-#define INIT_WRITE_VARIANT(ua_type, ua_type_enum, c_loc_name)                                      \\
-    UA_Variant_setScalar(&c_loc_name##_variant, (ua_type*)c_loc_name, &UA_TYPES[ua_type_enum]);
+static UA_UInt32 __read_operation_limit(UA_UInt32 id)
+{{
+    UA_Variant value;
+    UA_UInt32 limit = 0;
+
+    UA_Variant_init(&value);
+    if(UA_Client_readValueAttribute(client, UA_NODEID_NUMERIC(0, id), &value) == UA_STATUSCODE_GOOD &&
+       UA_Variant_hasScalarType(&value, &UA_TYPES[UA_TYPES_UINT32]))
+        limit = *(UA_UInt32*)value.data;
+    UA_Variant_clear(&value);
+    return limit;
+}}
 
-int __init_{locstr}(int argc,char **argv)
+static UA_StatusCode __connect_{locstr}(void)
 {{
     UA_StatusCode retval;
+{connect}
+    if(retval == UA_STATUSCODE_GOOD){{
+        max_nodes_per_read = __read_operation_limit(
+            UA_NS0ID_SERVER_SERVERCAPABILITIES_OPERATIONLIMITS_MAXNODESPERREAD);
+        max_nodes_per_write = __read_operation_limit(
+            UA_NS0ID_SERVER_SERVERCAPABILITIES_OPERATIONLIMITS_MAXNODESPERWRITE);
+        max_monitored_items_per_call = __read_operation_limit(
+            UA_NS0ID_SERVER_SERVERCAPABILITIES_OPERATIONLIMITS_MAXMONITOREDITEMSPERCALL);
+        subscribed = 0;
+    }}
+    return retval;
+}}
+
+/* status codes meaning client has to reconnect */
+static int __connection_lost(UA_StatusCode retval)
+{{
+    return retval == UA_STATUSCODE_BADCONNECTIONCLOSED ||
+           retval == UA_STATUSCODE_BADSECURECHANNELCLOSED ||
+           retval == UA_STATUSCODE_BADSESSIONIDINVALID ||
+           retval == UA_STATUSCODE_BADSESSIONCLOSED ||
+           retval == UA_STATUSCODE_BADCOMMUNICATIONERROR ||
+           retval == UA_STATUSCODE_BADSERVERNOTCONNECTED ||
+           retval == UA_STATUSCODE_BADNOTCONNECTED;
+}}
+
+static void __copy_input(input_t *in, long to, long from)
+{{
+    memcpy((char*)in->exchange + to * in->size, (char*)in->exchange + from * in->size, in->size);
+    in->good[to] = in->good[from];
+    in->stamp[to] = in->stamp[from];
+}}
+
+/* decode read result or notification into given slot, keeping previous value if bad */
+static void __decode_input(input_t *in, long slot, UA_DataValue *dv, UA_DateTime now)
+{{
+    if(dv && dv->hasValue && (!dv->hasStatus || dv->status == UA_STATUSCODE_GOOD) &&
+       UA_Variant_hasScalarType(&dv->value, in->type)){{
+        memcpy((char*)in->exchange + slot * in->size, dv->value.data, in->size);
+        in->good[slot] = 1;
+        in->stamp[slot] = now;
+    }} else {{
+        in->good[slot] = 0;
+    }}
+}}
+
+static void __read_inputs(long back)
+{{
+    UA_ReadRequest request;
+    UA_ReadResponse response;
+    UA_DateTime now = UA_DateTime_nowMonotonic();
+    size_t offset, count, i;
+
+    for(offset = 0; offset < POLLED_COUNT; offset += count){{
+        count = POLLED_COUNT - offset;
+        if(max_nodes_per_read && count > max_nodes_per_read)
+            count = max_nodes_per_read;
+
+        for(i = 0; i < count; i++)
+            __copy_input(&inputs[offset + i], back, !back);
+
+        if(!connected){{
+            for(i = 0; i < count; i++)
+                __decode_input(&inputs[offset + i], back, NULL, 0);
+            continue;
+        }}
+
+        /* request only borrows read ids, so it must not be cleared */
+        UA_ReadRequest_init(&request);
+        request.nodesToRead = &read_ids[offset];
+        request.nodesToReadSize = count;
+        request.timestampsToReturn = UA_TIMESTAMPSTORETURN_NEITHER;
+        response = UA_Client_Service_read(client, request);
+        now = UA_DateTime_nowMonotonic();
+
+        if(response.responseHeader.serviceResult != UA_STATUSCODE_GOOD ||
+           response.resultsSize != count){{
+            if(__connection_lost(response.responseHeader.serviceResult))
+                connected = 0;
+            for(i = 0; i < count; i++)
+                __decode_input(&inputs[offset + i], back, NULL, 0);
+        }} else {{
+            for(i = 0; i < count; i++)
+                __decode_input(&inputs[offset + i], back, &response.results[i], now);
+        }}
+        UA_ReadResponse_clear(&response);
+    }}
+
+    /* Subscribed inputs : take last notified values. Unchanged values are
+       not notified, so value is as recent as subscription is alive */
+    for(i = POLLED_COUNT; i < INPUT_COUNT; i++){{
+        __copy_input(&inputs[i], back, NOTIFIED_SLOT);
+        if(!connected || !subscribed)
+            inputs[i].good[back] = 0;
+        else if(inputs[i].good[back])
+            inputs[i].stamp[back] = now;
+    }}
+}}
+
+static void __data_changed(UA_Client *c, UA_UInt32 subId, void *subContext,
+                           UA_UInt32 monId, void *monContext, UA_DataValue *value)
+{{
+    __decode_input((input_t*)monContext, NOTIFIED_SLOT, value, UA_DateTime_nowMonotonic());
+}}
+
+static void __subscribe(void)
+{{
+    UA_CreateSubscriptionRequest request;
+    UA_CreateSubscriptionResponse response;
+    UA_CreateMonitoredItemsRequest items_request;
+    UA_CreateMonitoredItemsResponse items_response;
+    void *contexts[SUBSCRIBED_COUNT + 1];
+    UA_Client_DataChangeNotificationCallback callbacks[SUBSCRIBED_COUNT + 1];
+    size_t offset, count, i;
+
+    /* tried once per session, inputs stay bad if it fails */
+    subscribed = 1;
+    for(i = POLLED_COUNT; i < INPUT_COUNT; i++)
+        inputs[i].good[NOTIFIED_SLOT] = 0;
+
+    request = UA_CreateSubscriptionRequest_default();
+    request.requestedPublishingInterval = PUBLISHING_INTERVAL;
+    response = UA_Client_Subscriptions_create(client, request, NULL, NULL, NULL);
+    if(response.responseHeader.serviceResult != UA_STATUSCODE_GOOD){{
+        LogError("OPC-UA subscription failed %s",
+                 UA_StatusCode_name(response.responseHeader.serviceResult));
+        if(__connection_lost(response.responseHeader.serviceResult))
+            connected = 0;
+        UA_CreateSubscriptionResponse_clear(&response);
+        return;
+    }}
+
+    for(offset = 0; offset < SUBSCRIBED_COUNT && connected; offset += count){{
+        count = SUBSCRIBED_COUNT - offset;
+        if(max_monitored_items_per_call && count > max_monitored_items_per_call)
+            count = max_monitored_items_per_call;
+
+        for(i = 0; i < count; i++){{
+            contexts[i] = &inputs[POLLED_COUNT + offset + i];
+            callbacks[i] = __data_changed;
+        }}
+
+        /* request only borrows monitored items, so it must not be cleared */
+        UA_CreateMonitoredItemsRequest_init(&items_request);
+        items_request.subscriptionId = response.subscriptionId;
+        items_request.timestampsToReturn = UA_TIMESTAMPSTORETURN_NEITHER;
+        items_request.itemsToCreate = &monitored_items[offset];
+        items_request.itemsToCreateSize = count;
+        items_response = UA_Client_MonitoredItems_createDataChanges(
+            client, items_request, contexts, callbacks, NULL);
+
+        if(items_response.responseHeader.serviceResult != UA_STATUSCODE_GOOD){{
+            LogError("OPC-UA monitored items creation failed %s",
+                     UA_StatusCode_name(items_response.responseHeader.serviceResult));
+            if(__connection_lost(items_response.responseHeader.serviceResult))
+                connected = 0;
+        }} else {{
+            for(i = 0; i < items_response.resultsSize; i++)
+                if(items_response.results[i].statusCode != UA_STATUSCODE_GOOD)
+                    LogWarning("OPC-UA monitored item %d creation failed %s",
+                               (int)(offset + i),
+                               UA_StatusCode_name(items_response.results[i].statusCode));
+        }}
+        UA_CreateMonitoredItemsResponse_clear(&items_response);
+    }}
+    UA_CreateSubscriptionResponse_clear(&response);
+}}
+
+static void __write_outputs(long back)
+{{
+    UA_WriteRequest request;
+    UA_WriteResponse response;
+    size_t offset, count, i;
+
+    for(i = 0; i < OUTPUT_COUNT; i++)
+        write_values[i].value.value.data = (char*)outputs[i].exchange + back * outputs[i].size;
+
+    for(offset = 0; offset < OUTPUT_COUNT && connected; offset += count){{
+        count = OUTPUT_COUNT - offset;
+        if(max_nodes_per_write && count > max_nodes_per_write)
+            count = max_nodes_per_write;
+
+        /* request only borrows write values, so it must not be cleared */
+        UA_WriteRequest_init(&request);
+        request.nodesToWrite = &write_values[offset];
+        request.nodesToWriteSize = count;
+        response = UA_Client_Service_write(client, request);
+
+        if(__connection_lost(response.responseHeader.serviceResult))
+            connected = 0;
+        UA_WriteResponse_clear(&response);
+    }}
+}}
+
+static void __exchange_{locstr}(void)
+{{
+    UA_StatusCode retval;
+    long back;
+
+    /* Subscription : get data change notifications */
+    if(SUBSCRIBED_COUNT && connected){{
+        if(!subscribed)
+            __subscribe();
+        retval = UA_Client_run_iterate(client, 0);
+        if(__connection_lost(retval))
+            connected = 0;
+    }}
+
+    /* Inputs : fill back buffer, then swap */
+    back = !input_front;
+    __read_inputs(back);
+    while(AtomicCompareExchange(&input_lock, 0, 1)) sched_yield();
+    input_front = back;
+    AtomicCompareExchange(&input_lock, 1, 0);
+
+    /* Outputs : swap if PLC wrote new values, then write back buffer */
+    while(AtomicCompareExchange(&output_lock, 0, 1)) sched_yield();
+    if(output_pending){{
+        output_front = !output_front;
+        output_pending = 0;
+        back = !output_front;
+    }} else {{
+        back = -1;
+    }}
+    AtomicCompareExchange(&output_lock, 1, 0);
+    if(back >= 0)
+        __write_outputs(back);
+}}
+
+static void *__exchange_thread_{locstr}(void *arg)
+{{
+    UA_DateTime last_connect = 0;
+    UA_StatusCode retval;
+
+    while(!exchange_stop){{
+        /* wait for PLC cycle, and skip cycles missed while exchanging */
+        if(sem_wait(&exchange_wakeup)) continue;
+        while(sem_trywait(&exchange_wakeup) == 0);
+        if(exchange_stop) break;
+
+        if(!connected &&
+           UA_DateTime_nowMonotonic() - last_connect > RECONNECT_PERIOD_S * UA_DATETIME_SEC){{
+            last_connect = UA_DateTime_nowMonotonic();
+            UA_Client_disconnect(client);
+            retval = __connect_{locstr}();
+            if(retval == UA_STATUSCODE_GOOD){{
+                LogInfo("OPC-UA reconnected");
+                connected = 1;
+            }}
+        }}
+
+        /* while disconnected, inputs are still handed over as bad */
+        __exchange_{locstr}();
+    }}
+    return NULL;
+}}
+
+int __init_{locstr}(int argc,char **argv)
+{{
+    UA_StatusCode retval = UA_STATUSCODE_GOOD;
     client = UA_Client_new();
     cc = UA_Client_getConfig(client);
-    char *uri = "{uri}";
 {init}
 
+    if(retval == UA_STATUSCODE_GOOD)
+        retval = __connect_{locstr}();
+
     if(retval != UA_STATUSCODE_GOOD) {{
         LogError("OPC-UA Init Failed %d", retval);
         UA_Client_delete(client);
         return EXIT_FAILURE;
     }}
+    connected = 1;
+
+    exchange_stop = 0;
+    sem_init(&exchange_wakeup, 0, 0);
+    if(pthread_create(&exchange_thread, NULL, __exchange_thread_{locstr}, NULL)) {{
+        LogError("OPC-UA could not start exchange thread");
+        sem_destroy(&exchange_wakeup);
+        UA_Client_disconnect(client);
+        UA_Client_delete(client);
+        return EXIT_FAILURE;
+    }}
+    exchange_started = 1;
     return 0;
 }}
 
-#define READ_VALUE(ua_type, ua_type_enum, c_loc_name, ua_nodeid_type, ua_nsidx, ua_node_id)        \\
-    retval = UA_Client_readValueAttribute(                                                         \\
-        client, ua_nodeid_type(ua_nsidx, ua_node_id), &c_loc_name##_variant);                      \\
-    if(retval == UA_STATUSCODE_GOOD && UA_Variant_isScalar(&c_loc_name##_variant) &&               \\
-       c_loc_name##_variant.type == &UA_TYPES[ua_type_enum]) {{                                    \\
-            c_loc_name##_buf = *(ua_type*)c_loc_name##_variant.data;                               \\
-            UA_Variant_clear(&c_loc_name##_variant);  /* Unalloc requiered on each read ! */       \\
-    }}
+#define RETRIEVE_VALUE(c_loc_name)                                                                 \\
+    c_loc_name##_buf = c_loc_name##_exchange[input_front];                                         \\
+    c_loc_name##_quality_buf = c_loc_name##_good[input_front];                                     \\
+    age = c_loc_name##_stamp[input_front] ?                                                        \\
+        (now - c_loc_name##_stamp[input_front]) / UA_DATETIME_MSEC : UINT32_MAX;                   \\
+    c_loc_name##_age_buf = age > UINT32_MAX ? UINT32_MAX : age;
 
 void __retrieve_{locstr}(void)
 {{
-    UA_StatusCode retval;
-{retrieve}
+    UA_DateTime now = UA_DateTime_nowMonotonic();
+    UA_DateTime age;
+    if(AtomicCompareExchange(&input_lock, 0, 1) == 0){{
+{fetch}
+        AtomicCompareExchange(&input_lock, 1, 0);
+    }}
 }}
 
-#define WRITE_VALUE(ua_type, c_loc_name, ua_nodeid_type, ua_nsidx, ua_node_id)                     \\
-    UA_Client_writeValueAttribute(                                                                 \\
-        client, ua_nodeid_type(ua_nsidx, ua_node_id), &c_loc_name##_variant);
+#define PUBLISH_VALUE(c_loc_name)                                                                  \\
+    c_loc_name##_exchange[output_front] = c_loc_name##_buf;
 
 void __publish_{locstr}(void)
 {{
-{publish}
+    if(AtomicCompareExchange(&output_lock, 0, 1) == 0){{
+{store}
+        output_pending = 1;
+        AtomicCompareExchange(&output_lock, 1, 0);
+    }}
+    /* exchange thread runs once per cycle at most */
+    sem_post(&exchange_wakeup);
 }}
 
 """
@@ -687,11 +1142,15 @@ void __publish_{locstr}(void)
         formatdict = dict(
             locstr   = locstr,
             uri      = config["URI"],
-            decl     = "",
-            cleanup  = "",
-            init     = "",
-            retrieve = "",
-            publish  = "" 
+            decl       = "",
+            cleanup    = "",
+            init       = "",
+            connect    = "",
+            inputs     = "",
+            subscribed_inputs = "",
+            outputs    = "",
+            fetch      = "",
+            store      = ""
         )
 
         AuthType = config["AuthType"]
@@ -699,37 +1158,69 @@ void __publish_{locstr}(void)
             config["UpperCaseMode"] = config["Mode"].upper()
             formatdict["init"] += """
     INIT_x509({Policy}, {UpperCaseMode}, "{PrivateKey}", "{Certificate}")""".format(**config)
+            formatdict["connect"] += """
+    CONNECT_x509()"""
         elif AuthType == "UserPassword":
             formatdict["init"] += """
     INIT_UserPassword("{User}", "{Password}")""".format(**config)
+            formatdict["connect"] += """
+    CONNECT_UserPassword("{User}", "{Password}")""".format(**config)
         else:
             formatdict["init"] += """
     INIT_NoAuth()"""
+            formatdict["connect"] += """
+    CONNECT_NoAuth()"""
 
+        polled_count = subscribed_count = 0
+        sampling_intervals = []
         for direction, data in self.iteritems():
             iec_direction_prefix = {"input": "__I", "output": "__Q"}[direction]
-            for row in data:
-                name, ua_nsidx, ua_nodeid_type, _ua_node_id, ua_type, iec_number = row
+            for index, row in enumerate(data):
+                name, ua_nsidx, ua_nodeid_type, _ua_node_id, ua_type, iec_number = row[:len(lstcolnames)]
                 iec_type, C_type, iec_size_prefix, ua_type_enum, ua_type = UA_IEC_types[ua_type]
                 c_loc_name = iec_direction_prefix + iec_size_prefix + locstr + "_" + str(iec_number)
+                quality_loc_name = "__IX" + locstr + "_" + str(iec_number) + "_1"
+                age_loc_name = "__ID" + locstr + "_" + str(iec_number) + "_2"
                 ua_nodeid_type, id_formating = UA_NODE_ID_types[ua_nodeid_type]
                 ua_node_id = id_formating.format(_ua_node_id)
 
-                formatdict["decl"] += """
-DECL_VAR({ua_type}, {C_type}, {c_loc_name})""".format(**locals())
-
                 if direction == "input":
-                    formatdict["init"] += """
-    INIT_READ_VARIANT({ua_type}, {c_loc_name})""".format(**locals())
-                    formatdict["retrieve"] += """
-    READ_VALUE({ua_type}, {ua_type_enum}, {c_loc_name}, {ua_nodeid_type}, {ua_nsidx}, {ua_node_id})""".format(**locals())
+                    formatdict["decl"] += """
+DECL_INPUT_VAR({ua_type}, {C_type}, {c_loc_name}, {quality_loc_name}, {age_loc_name})""".format(**locals())
+                    sampling, queue, deadband = row[len(lstcolnames):]
+                    sampling, queue, deadband = float(sampling), int(queue), float(deadband)
+                    if sampling > 0:
+                        index = subscribed_count
+                        subscribed_count += 1
+                        sampling_intervals.append(sampling)
+                        formatdict["subscribed_inputs"] += """
+    INPUT({ua_type_enum}, {c_loc_name})""".format(**locals())
+                        formatdict["init"] += """
+    INIT_MONITORED_ITEM({index}, {ua_nodeid_type}, {ua_nsidx}, {ua_node_id}, {sampling}, {queue}, {deadband})""".format(**locals())
+                    else:
+                        index = polled_count
+                        polled_count += 1
+                        formatdict["inputs"] += """
+    INPUT({ua_type_enum}, {c_loc_name})""".format(**locals())
+                        formatdict["init"] += """
+    INIT_READ_ID({index}, {ua_nodeid_type}, {ua_nsidx}, {ua_node_id})""".format(**locals())
+                    formatdict["fetch"] += """
+        RETRIEVE_VALUE({c_loc_name})""".format(**locals())
 
                 if direction == "output":
+                    formatdict["decl"] += """
+DECL_VAR({ua_type}, {C_type}, {c_loc_name})""".format(**locals())
+                    formatdict["outputs"] += """
+    OUTPUT({c_loc_name})""".format(**locals())
                     formatdict["init"] += """
-    INIT_WRITE_VARIANT({ua_type}, {ua_type_enum}, {c_loc_name})""".format(**locals())
-                    formatdict["publish"] += """
-    WRITE_VALUE({ua_type}, {c_loc_name}, {ua_nodeid_type}, {ua_nsidx}, {ua_node_id})""".format(**locals())
-
+    INIT_WRITE_VALUE({index}, {ua_type_enum}, {ua_nodeid_type}, {ua_nsidx}, {ua_node_id})""".format(**locals())
+                    formatdict["store"] += """
+        PUBLISH_VALUE({c_loc_name})""".format(**locals())
+
+        formatdict["polled_count"] = polled_count
+        formatdict["subscribed_count"] = subscribed_count
+        formatdict["output_count"] = len(self["output"])
+        formatdict["publishing_interval"] = min(sampling_intervals) if sampling_intervals else 0
         Ccode = template.format(**formatdict)
         
         return Ccode
@@ -115,6 +115,10 @@ class PythonFileCTNMixin(CodeFile):
         """
         return var.getonchange()
 
+    def CTNExclusiveResources(self):
+        # python code of running PLC is stopped before new one starts
+        return []
+
     def CTNGenerate_C(self, buildpath, locations):
         # location string for that CTN
         location_str = "_".join(map(str, self.GetCurrentLocation()))
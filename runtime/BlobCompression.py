@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz runtime.
+#
+# See COPYING.Runtime file for copyrights details.
+
+"""
+Compression of blob chunks transfered between IDE and runtime.
+
+Each chunk is compressed on its own, so that chunks can still be written
+in any order. Chunks are decompressed straight to blob file, in small
+pieces, so that memory use stays bounded on small targets.
+"""
+
+from __future__ import absolute_import
+import zlib
+from io import BytesIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# size of decompressed pieces written to blob file
+PieceSize = 64 * 1024
+
+
+def _ZlibCompress(data):
+    return zlib.compress(data, 6)
+
+
+def _ZlibDecompress(data, write):
+    d = zlib.decompressobj()
+    while True:
+        piece = d.decompress(data, PieceSize)
+        if piece:
+            write(piece)
+        data = d.unconsumed_tail
+        if not data and len(piece) < PieceSize:
+            break
+    piece = d.flush()
+    if piece:
+        write(piece)
+
+
+class _WriteCallback(object):
+    def __init__(self, write):
+        self.write = write
+
+
+def _ZstdCompress(data):
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _ZstdDecompress(data, write):
+    zstandard.ZstdDecompressor().copy_stream(
+        BytesIO(data), _WriteCallback(write), write_size=PieceSize)
+
+
+# name : (compress, decompress)
+Codecs = {"zlib": (_ZlibCompress, _ZlibDecompress)}
+if zstandard is not None:
+    Codecs["zstd"] = (_ZstdCompress, _ZstdDecompress)
+
+# preferred first
+CodecsPreference = ["zstd", "zlib"]
+
+
+def GetCodecs():
+    return [name for name in CodecsPreference if name in Codecs]
+
+
+def Compress(name, data):
+    return Codecs[name][0](data)
+
+
+def Decompress(name, data, write):
+    """
+    Decompress data, giving decompressed pieces to write
+    """
+    Codecs[name][1](data, write)
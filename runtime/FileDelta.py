@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz runtime.
+#
+# See COPYING.Runtime file for copyrights details.
+
+"""
+rsync like differences between a file on IDE side and a file already
+installed on runtime side, to transfer only changed parts of files.
+
+Runtime gives signatures of each block of its file : adler32 checksum,
+that can be computed at each position of IDE file by rolling it one byte
+at a time, and MD5 digest to confirm matches.
+"""
+
+from __future__ import absolute_import
+import zlib
+import hashlib
+import struct
+from six.moves import xrange
+
+# adler32, MD5 digest
+BlockSignature = struct.Struct("!I16s")
+
+ADLER_MOD = 65521
+
+
+def Adler32(data):
+    return zlib.adler32(data) & 0xffffffff
+
+
+def FileDigest(path):
+    """
+    Return MD5 hex digest of file content
+    """
+    s = hashlib.new('md5')
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(1 << 16)
+            if not data:
+                break
+            s.update(data)
+    return s.hexdigest()
+
+
+def GetBlockSignatures(path, blocksize):
+    """
+    Return packed signatures of all complete blocks of a file
+    """
+    signatures = []
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(blocksize)
+            if len(block) < blocksize:
+                break
+            signatures.append(BlockSignature.pack(
+                Adler32(block), hashlib.new('md5', block).digest()))
+    return b"".join(signatures)
+
+
+def FindBlocks(data, signatures, blocksize, maxroll=None):
+    """
+    Find in data blocks of runtime file, given their signatures
+    @param maxroll: count of bytes checksum is rolled over without
+    finding a block, after which only next blocks are checked, until one
+    is found. This bounds time spent on data that doesn't match, as
+    rolling is slow, at the cost of missing blocks moved by less than a
+    block. None to always roll.
+    @return: list of (offset in data, offset in runtime file) of blocks
+    """
+    blocks = {}
+    for i in xrange(len(signatures) // BlockSignature.size):
+        weak, strong = BlockSignature.unpack_from(
+            signatures, i * BlockSignature.size)
+        blocks.setdefault(weak, []).append((strong, i * blocksize))
+
+    matches = []
+    view = bytearray(data)
+    end = len(data) - blocksize
+    pos = 0
+    weak = None
+    rolled = 0
+    while pos <= end:
+        if weak is None:
+            weak = Adler32(data[pos:pos + blocksize])
+            a = weak & 0xffff
+            b = weak >> 16
+        candidates = blocks.get(weak)
+        if candidates is not None:
+            strong = hashlib.new('md5', data[pos:pos + blocksize]).digest()
+            found = [offset for digest, offset in candidates if digest == strong]
+            if found:
+                matches.append((pos, found[0]))
+                pos += blocksize
+                weak = None
+                rolled = 0
+                continue
+        if pos == end:
+            break
+        if maxroll is not None and rolled >= maxroll:
+            pos = min(pos + blocksize, end)
+            weak = None
+            continue
+        rolled += 1
+        # roll checksum one byte forward
+        out = view[pos]
+        a = (a - out + view[pos + blocksize]) % ADLER_MOD
+        b = (b - blocksize * out + a - 1) % ADLER_MOD
+        weak = (b << 16) | a
+        pos += 1
+    return matches
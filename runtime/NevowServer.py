@@ -85,7 +85,9 @@ class MainPage(athena.LiveElement):
                 tags.div(id='content')[
                     tags.div(render=tags.directive('PLCElement'))]
             ],
-            tags.a(href='settings')['Settings']])
+            tags.a(href='settings')['Settings'],
+            " ",
+            tags.a(href='cyclestats')['Cycle statistics']])
 
     def __init__(self, *a, **kw):
         athena.LiveElement.__init__(self, *a, **kw)
@@ -332,6 +334,81 @@ class SettingsPage(rend.Page):
         return super(SettingsPage, self).locateChild(ctx, segments)
 
 
+def _FormatDuration(ns):
+    if ns >= 1000000:
+        return "%.3f ms" % (ns / 1e6)
+    if ns >= 1000:
+        return "%.1f us" % (ns / 1e3)
+    return "%d ns" % ns
+
+
+def _FormatBucket(i, count):
+    """
+    Label of histogram bucket i, out of count. Bucket i holds durations
+    from 2^i to 2^(i+1)-1 ns, last one also holds longer durations
+    """
+    if i == count - 1:
+        return u"\u2265 " + _FormatDuration(1 << i)
+    return _FormatDuration(1 << i if i else 0) + " - " + \
+        _FormatDuration((2 << i) - 1)
+
+
+class CycleStatsPage(rend.Page):
+    """
+    PLC cycle statistics, as given by PLCObject.GetCycleStats
+    """
+    addSlash = True
+
+    child_webinterface_css = File(paths.AbsNeighbourFile(__file__, 'webinterface.css'), 'text/css')
+
+    def cyclestats(self, context, data):
+        stats = GetPLCObjectSingleton().GetCycleStats()
+        if stats is None:
+            return tags.p[_("No cycle statistics : PLC isn't loaded, "
+                            "or its target doesn't provide them")]
+        res = [tags.table[
+            [tags.tr[tags.td[label], tags.td[str(value)]] for label, value in [
+                (_("Period"), _FormatDuration(stats["period_ns"])),
+                (_("Cycles"), stats["cycles"]),
+                (_("Overruns"), stats["overruns"]),
+                (_("Skipped cycles"), stats["skipped_cycles"]),
+                (_("Late wake-ups"), stats["late_wakeups"])]]]]
+        for name, title in [("execution", _("Execution time")),
+                            ("latency", _("Wake-up latency"))]:
+            timestats = stats[name]
+            histogram = timestats["histogram"]
+            biggest = max(histogram) or 1
+            res += [
+                tags.h2[title],
+                tags.p[" ".join([
+                    _("min"), _FormatDuration(timestats["min_ns"]),
+                    _("mean"), _FormatDuration(timestats["mean_ns"]),
+                    _("max"), _FormatDuration(timestats["max_ns"])])],
+                tags.table[
+                    [tags.tr[
+                        tags.td[_FormatBucket(i, len(histogram))],
+                        tags.td[str(count)],
+                        tags.td[tags.div(
+                            style="background:#369;height:1em;width:%d%%" %
+                            (count * 100 // biggest))]]
+                     for i, count in enumerate(histogram) if count]]]
+        return res
+
+    docFactory = loaders.stan([tags.html[
+        tags.head[
+            tags.title[_("PLC Cycle Statistics")],
+            tags.meta(**{"http-equiv": "refresh", "content": "5"}),
+            tags.link(rel='stylesheet',
+                      type='text/css',
+                      href=url.here.child("webinterface_css"))
+        ],
+        tags.body[
+            tags.a(href='/')['Back'],
+            tags.h1["PLC cycle statistics:"],
+            cyclestats
+        ]]])
+
+
 class WebInterface(athena.LivePage):
 
     docFactory = loaders.stan([tags.raw(xhtml_header),
@@ -354,6 +431,9 @@ class WebInterface(athena.LivePage):
     def child_settings(self, context):
         return SettingsPage()
 
+    def child_cyclestats(self, context):
+        return CycleStatsPage()
+
     def __init__(self, plcState=False, *a, **kw):
         super(WebInterface, self).__init__(*a, **kw)
         self.jsModules.mapping[u'WebInterface'] = paths.AbsNeighbourFile(
@@ -31,13 +31,19 @@ import traceback
 import shutil
 from time import time
 import hashlib
-from tempfile import mkstemp
+import struct
+from tempfile import mkstemp, mkdtemp
 from functools import wraps, partial
 from six.moves import xrange
 from past.builtins import execfile
 import _ctypes
 
-from runtime.typemapping import TypeTranslator
+from runtime.typemapping import TypeTranslator, TRACE_FRAME_KEY, SubsetDebugBuffer
+from runtime.TraceRecorder import \
+    TraceRecorder, ExtractTraceRecord, ReadTraceRecordIndex, \
+    TraceRecordMaxSize
+from runtime.FileDelta import FileDigest, GetBlockSignatures
+from runtime import BlobCompression
 from runtime.loglevels import LogLevelsDefault, LogLevelsCount
 from runtime.Stunnel import getPSKID
 from runtime import PlcStatus
@@ -64,11 +70,131 @@ lib_ext = {
 }.get(sys.platform, "")
 
 
+# Header of each trace frame given by GetDebugData : tick, size, flags
+TraceFrameHeader = struct.Struct("III")
+
+# msgidx, size, tick, tv_sec, tv_nsec, as packed by PLC's GetLogMessages
+LogMessageHeader = struct.Struct("IIIII")
+
+# biggest chunk accepted by WriteBlobChunk
+MaxBlobChunkSize = 16 * 1024 * 1024
+
+
+class DebugStats(ctypes.Structure):
+    """
+    Must be changed according to changes in plc_debug.c
+    """
+    _fields_ = [(name, ctypes.c_uint32) for name in [
+        "trace_buffer_size", "trace_buffer_hwm", "trace_buffer_overflows",
+        "trace_list_size", "trace_list_hwm", "trace_list_overflows",
+        "trace_ring_size", "trace_ring_hwm", "trace_ring_overflows",
+        "force_buffer_size", "force_buffer_hwm", "force_buffer_overflows",
+        "force_list_size", "force_list_hwm", "force_list_overflows",
+        "retain_size", "retain_saves", "retain_full_saves",
+        "retain_last_save_size", "retain_saved_size_hwm"]]
+
+
+# Must be changed according to changes in targets/Linux/plc_Linux_main.c
+CycleStatsHistogramSize = 32
+
+
+class CycleTimeStats(ctypes.Structure):
+    _fields_ = [("min_ns", ctypes.c_uint64),
+                ("max_ns", ctypes.c_uint64),
+                ("total_ns", ctypes.c_uint64),
+                ("histogram", ctypes.c_uint32 * CycleStatsHistogramSize)]
+
+
+class CycleStats(ctypes.Structure):
+    """
+    Must be changed according to changes in plc_Linux_main.c
+    """
+    _fields_ = [("period_ns", ctypes.c_uint64),
+                ("cycles", ctypes.c_uint64),
+                ("overruns", ctypes.c_uint64),
+                ("skipped_cycles", ctypes.c_uint64),
+                ("late_wakeups", ctypes.c_uint64),
+                ("execution", CycleTimeStats),
+                ("latency", CycleTimeStats)]
+
+
 def PLCprint(message):
     sys.stdout.write("PLCobject : "+message+"\n")
     sys.stdout.flush()
 
 
+def GetHotReloadCalls(lib):
+    """
+    Declare calls needed to hot reload PLC
+    @return: dict of name : function, None if PLC library hasn't them
+    """
+    try:
+        calls = dict([(name, getattr(lib, name)) for name in [
+            "initPLC", "runPLC", "haltPLC", "cleanupPLC", "GetRetainVariable"]])
+    except AttributeError:
+        return None
+    calls["initPLC"].restype = ctypes.c_int
+    calls["initPLC"].argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_char_p)]
+    calls["runPLC"].restype = ctypes.c_int
+    calls["haltPLC"].restype = None
+    calls["cleanupPLC"].restype = None
+    calls["GetRetainVariable"].restype = ctypes.c_int
+    calls["GetRetainVariable"].argtypes = [
+        ctypes.c_uint, ctypes.POINTER(ctypes.c_char_p),
+        ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_uint)]
+    return calls
+
+
+def GetRetainVariables(GetRetainVariable):
+    """
+    @return: dict of "IEC path:type" : (address, size) of retained variables
+    """
+    variables = {}
+    name = ctypes.c_char_p()
+    value_p = ctypes.c_void_p()
+    size = ctypes.c_uint()
+    i = 0
+    while GetRetainVariable(i, ctypes.byref(name), ctypes.byref(value_p), ctypes.byref(size)):
+        variables[name.value] = (value_p.value, size.value)
+        i += 1
+    return variables
+
+
+def GetExclusiveResources(lib):
+    """
+    @return: set of resources no other PLC can use while PLC library runs,
+    None if PLC library doesn't list them
+    """
+    try:
+        first = ctypes.c_char_p.in_dll(lib, "ExclusiveResources")
+    except ValueError:
+        return None
+    resources = ctypes.cast(ctypes.addressof(first), ctypes.POINTER(ctypes.c_char_p))
+    result = set()
+    i = 0
+    while resources[i] is not None:
+        result.add(resources[i])
+        i += 1
+    return result
+
+
+class PythonThreadContext(object):
+    """
+    Python extensions of a PLC, and commands given to the thread running
+    them, so that python extensions of a new PLC can be initialized while
+    those of running PLC are still there
+    """
+    def __init__(self, runtime_vars, iterator):
+        self.runtime_vars = runtime_vars
+        self.iterator = iterator
+        self.CondLock = Lock()
+        self.CmdCond = Condition(self.CondLock)
+        self.AckCond = Condition(self.CondLock)
+        self.Cmd = None
+        self.Ack = None
+        self.thread = None
+
+
 def RunInMain(func):
     @wraps(func)
     def func_wrapper(*args, **kwargs):
@@ -76,7 +202,22 @@ def RunInMain(func):
     return func_wrapper
 
 
+def RunShared(func):
+    """
+    For read-only calls : run in caller's thread instead of main thread,
+    concurrently with other read-only calls, but not with main thread jobs
+    """
+    @wraps(func)
+    def func_wrapper(*args, **kwargs):
+        return MainWorker.call_shared(func, *args, **kwargs)
+    return func_wrapper
+
+
 class PLCObject(object):
+    # count of trace frames kept for GetTraceVariables while traces
+    # are taken by other consumers
+    MaxKeptTraces = 1000
+
     def __init__(self, WorkingDir, argv, statuschange, evaluator, pyruntimevars):
         self.workingdir = WorkingDir  # must exits already
         self.tmpdir = os.path.join(WorkingDir, 'tmp')
@@ -95,10 +236,27 @@ class PLCObject(object):
         self._InitPLCStubCalls()
         self._loading_error = None
         self.python_runtime_vars = None
+        self.PythonThreadContext = None
+        self.PlcStopping = None
         self.TraceThread = None
         self.TraceLock = Lock()
         self.Traces = []
+        # set when new traces are available
+        self.TraceEvent = Event()
+        self.TraceFramesDropped = 0
+        self.TracedVariables = []
+        # (idx, iectype, force) given to SetTraceVariablesList
+        self.TraceVariablesList = []
+        # DebugToken : [(idx, iectype)] traced for other consumers
+        self.ExtraTraceVariables = {}
+        # traces taken by other consumers, kept for GetTraceVariables
+        self.KeptTraces = []
+        self.TraceRecorder = None
+        # held while recording file is read, so that it isn't overwritten
+        self.TraceRecordFileLock = Lock()
         self.DebugToken = 0
+        # path : (size, mtime, MD5 hex digest) of installed files
+        self.files_digests = {}
 
         self._init_blobs()
 
@@ -150,25 +308,57 @@ class PLCObject(object):
         elif self._loading_error is not None and level == 0:
             return 1
 
-    @RunInMain
+    @RunShared
     def GetLogMessage(self, level, msgid):
         tick = ctypes.c_uint32()
         tv_sec = ctypes.c_uint32()
         tv_nsec = ctypes.c_uint32()
         if self._GetLogMessage is not None:
-            maxsz = len(self._log_read_buffer)-1
+            # buffer per call, as concurrent calls are allowed
+            log_read_buffer = ctypes.create_string_buffer(self._log_read_buffer_size)
+            maxsz = len(log_read_buffer)-1
             sz = self._GetLogMessage(level, msgid,
-                                     self._log_read_buffer, maxsz,
+                                     log_read_buffer, maxsz,
                                      ctypes.byref(tick),
                                      ctypes.byref(tv_sec),
                                      ctypes.byref(tv_nsec))
             if sz and sz <= maxsz:
-                self._log_read_buffer[sz] = '\x00'
-                return self._log_read_buffer.value, tick.value, tv_sec.value, tv_nsec.value
+                log_read_buffer[sz] = '\x00'
+                return log_read_buffer.value, tick.value, tv_sec.value, tv_nsec.value
         elif self._loading_error is not None and level == 0:
             return self._loading_error, 0, 0, 0
         return None
 
+    @RunShared
+    def GetLogMessages(self, level, from_id, max_count, max_bytes=None):
+        """
+        Return list of (msgidx, message, tick, tv_sec, tv_nsec),
+        for messages from_id and older, newest first.
+        List stops at first message already overwritten in PLC log buffer,
+        or when max_count messages or max_bytes are reached.
+        """
+        if self._GetLogMessages is not None:
+            if max_bytes is None:
+                max_bytes = self._log_read_buffer_size
+            log_read_buffer = ctypes.create_string_buffer(max_bytes)
+            sz = self._GetLogMessages(level, from_id, max_count,
+                                      log_read_buffer, max_bytes)
+            data = log_read_buffer.raw
+            messages = []
+            offset = 0
+            while offset < sz:
+                msgidx, msgsize, tick, tv_sec, tv_nsec = \
+                    LogMessageHeader.unpack_from(data, offset)
+                offset += LogMessageHeader.size
+                # same as GetLogMessage, message ends at first null char
+                msg = data[offset:offset + msgsize].split('\x00', 1)[0]
+                messages.append((msgidx, msg, tick, tv_sec, tv_nsec))
+                offset += msgsize
+            return messages
+        elif self._loading_error is not None and level == 0:
+            return [(0, self._loading_error, 0, 0, 0)]
+        return None
+
     def _GetMD5FileName(self):
         return os.path.join(self.workingdir, "lasttransferedPLC.md5")
 
@@ -203,20 +393,22 @@ class PLCObject(object):
                 self._PythonIterator.argtypes = [ctypes.c_char_p, ctypes.POINTER(ctypes.c_void_p)]
 
                 self._stopPLC = self._stopPLC_real
+                self.PlcStopping = None
             else:
                 # If python confnode is not enabled, we reuse _PythonIterator
                 # as a call that block pythonthread until StopPLC
-                self.PlcStopping = Event()
+                PlcStopping = Event()
+                self.PlcStopping = PlcStopping
 
                 def PythonIterator(res, blkid):
-                    self.PlcStopping.clear()
-                    self.PlcStopping.wait()
+                    PlcStopping.clear()
+                    PlcStopping.wait()
                     return None
                 self._PythonIterator = PythonIterator
 
                 def __StopPLC():
                     self._stopPLC_real()
-                    self.PlcStopping.set()
+                    PlcStopping.set()
                 self._stopPLC = __StopPLC
 
             self._ResetDebugVariables = self.PLClibraryHandle.ResetDebugVariables
@@ -226,12 +418,36 @@ class PLCObject(object):
             self._RegisterDebugVariable.restype = ctypes.c_int
             self._RegisterDebugVariable.argtypes = [ctypes.c_int, ctypes.c_void_p]
 
-            self._FreeDebugData = self.PLClibraryHandle.FreeDebugData
-            self._FreeDebugData.restype = None
-
             self._GetDebugData = self.PLClibraryHandle.GetDebugData
             self._GetDebugData.restype = ctypes.c_int
-            self._GetDebugData.argtypes = [ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.c_void_p)]
+            self._GetDebugData.argtypes = [ctypes.c_void_p, ctypes.c_uint32, ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.c_uint32)]
+
+            self._GetDebugDataMaxSize = self.PLClibraryHandle.GetDebugDataMaxSize
+            self._GetDebugDataMaxSize.restype = ctypes.c_uint32
+
+            self._RequestDebugKeyFrame = self.PLClibraryHandle.RequestDebugKeyFrame
+            self._RequestDebugKeyFrame.restype = None
+
+            self._GetDebugFramesCount = self.PLClibraryHandle.GetDebugFramesCount
+            self._GetDebugFramesCount.restype = None
+            self._GetDebugFramesCount.argtypes = [ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.c_uint32)]
+
+            self._GetDebugStats = self.PLClibraryHandle.GetDebugStats
+            self._GetDebugStats.restype = None
+            self._GetDebugStats.argtypes = [ctypes.POINTER(DebugStats)]
+
+            # PLC built before delta encoded frames only has full frames
+            try:
+                self._TraceDelta = bool(ctypes.c_int.in_dll(
+                    self.PLClibraryHandle, "DebugTraceDelta").value)
+            except ValueError:
+                self._TraceDelta = False
+
+            # only provided by some targets
+            self._GetCycleStats = getattr(self.PLClibraryHandle, "GetCycleStats", None)
+            if self._GetCycleStats is not None:
+                self._GetCycleStats.restype = None
+                self._GetCycleStats.argtypes = [ctypes.POINTER(CycleStats)]
 
             self._suspendDebug = self.PLClibraryHandle.suspendDebug
             self._suspendDebug.restype = ctypes.c_int
@@ -251,11 +467,15 @@ class PLCObject(object):
             self._LogMessage.restype = ctypes.c_int
             self._LogMessage.argtypes = [ctypes.c_uint8, ctypes.c_char_p, ctypes.c_uint32]
 
-            self._log_read_buffer = ctypes.create_string_buffer(1 << 14)  # 16K
+            self._log_read_buffer_size = 1 << 14  # 16K
             self._GetLogMessage = self.PLClibraryHandle.GetLogMessage
             self._GetLogMessage.restype = ctypes.c_uint32
             self._GetLogMessage.argtypes = [ctypes.c_uint8, ctypes.c_uint32, ctypes.c_char_p, ctypes.c_uint32, ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.c_uint32), ctypes.POINTER(ctypes.c_uint32)]
 
+            self._GetLogMessages = self.PLClibraryHandle.GetLogMessages
+            self._GetLogMessages.restype = ctypes.c_uint32
+            self._GetLogMessages.argtypes = [ctypes.c_uint8, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_char_p, ctypes.c_uint32]
+
             self._loading_error = None
 
         except Exception:
@@ -296,14 +516,20 @@ class PLCObject(object):
         self._ResetDebugVariables = lambda: None
         self._RegisterDebugVariable = lambda x, y: 0
         self._IterDebugData = lambda x, y: None
-        self._FreeDebugData = lambda: None
-        self._GetDebugData = lambda: -1
+        self._GetDebugData = lambda w, x, y, z: -1
+        self._GetDebugDataMaxSize = lambda: 0
+        self._RequestDebugKeyFrame = lambda: None
+        self._GetDebugFramesCount = lambda x, y: None
+        self._GetDebugStats = None
+        self._TraceDelta = None
+        self._GetCycleStats = None
         self._suspendDebug = lambda x: -1
         self._resumeDebug = lambda: None
         self._PythonIterator = lambda: ""
         self._GetLogCount = None
         self._LogMessage = None
         self._GetLogMessage = None
+        self._GetLogMessages = None
         self._PLClibraryHandle = None
         self.PLClibraryHandle = None
 
@@ -326,12 +552,15 @@ class PLCObject(object):
 
         return False
 
-    def PythonRuntimeCall(self, methodname, use_evaluator=True, reverse_order=False):
+    def PythonRuntimeCall(self, methodname, use_evaluator=True, reverse_order=False,
+                          runtime_vars=None):
         """
         Calls init, start, stop or cleanup method provided by
         runtime python files, loaded when new PLC uploaded
         """
-        methods = self.python_runtime_vars.get("_runtime_%s" % methodname, [])
+        if runtime_vars is None:
+            runtime_vars = self.python_runtime_vars
+        methods = runtime_vars.get("_runtime_%s" % methodname, [])
         if reverse_order:
             methods = reversed(methods)
         for method in methods:
@@ -345,35 +574,35 @@ class PLCObject(object):
     # used internaly
     def PythonRuntimeInit(self):
         MethodNames = ["init", "start", "stop", "cleanup"]
-        self.python_runtime_vars = globals().copy()
-        self.python_runtime_vars.update(self.pyruntimevars)
-        parent = self
+        runtime_vars = globals().copy()
+        runtime_vars.update(self.pyruntimevars)
+        self.python_runtime_vars = runtime_vars
 
         class PLCSafeGlobals(object):
             def __getattr__(self, name):
                 try:
-                    t = parent.python_runtime_vars["_"+name+"_ctype"]
+                    t = runtime_vars["_"+name+"_ctype"]
                 except KeyError:
                     raise KeyError("Try to get unknown shared global variable : %s" % name)
                 v = t()
-                parent.python_runtime_vars["_PySafeGetPLCGlob_"+name](ctypes.byref(v))
-                return parent.python_runtime_vars["_"+name+"_unpack"](v)
+                runtime_vars["_PySafeGetPLCGlob_"+name](ctypes.byref(v))
+                return runtime_vars["_"+name+"_unpack"](v)
 
             def __setattr__(self, name, value):
                 try:
-                    t = parent.python_runtime_vars["_"+name+"_ctype"]
+                    t = runtime_vars["_"+name+"_ctype"]
                 except KeyError:
                     raise KeyError("Try to set unknown shared global variable : %s" % name)
-                v = parent.python_runtime_vars["_"+name+"_pack"](t, value)
-                parent.python_runtime_vars["_PySafeSetPLCGlob_"+name](ctypes.byref(v))
+                v = runtime_vars["_"+name+"_pack"](t, value)
+                runtime_vars["_PySafeSetPLCGlob_"+name](ctypes.byref(v))
 
         class OnChangeStateClass(object):
             def __getattr__(self, name):
-                u = parent.python_runtime_vars["_"+name+"_unpack"]
+                u = runtime_vars["_"+name+"_unpack"]
                 return type("changedesc",(),dict(
-                    count = parent.python_runtime_vars["_PyOnChangeCount_"+name].value,
-                    first = u(parent.python_runtime_vars["_PyOnChangeFirst_"+name]),
-                    last = u(parent.python_runtime_vars["_PyOnChangeLast_"+name])))
+                    count = runtime_vars["_PyOnChangeCount_"+name].value,
+                    first = u(runtime_vars["_PyOnChangeFirst_"+name]),
+                    last = u(runtime_vars["_PyOnChangeLast_"+name])))
 
 
         self.python_runtime_vars.update({
@@ -404,92 +633,102 @@ class PLCObject(object):
 
         self.PythonRuntimeCall("init", use_evaluator=False)
 
-        self.PythonThreadCondLock = Lock()
-        self.PythonThreadCmdCond = Condition(self.PythonThreadCondLock)
-        self.PythonThreadAckCond = Condition(self.PythonThreadCondLock)
-        self.PythonThreadCmd = None
-        self.PythonThreadAck = None
-        self.PythonThread = Thread(target=self.PythonThreadProc, name="PLCPythonThread")
-        self.PythonThread.start()
+        context = PythonThreadContext(runtime_vars, self._PythonIterator)
+        context.thread = Thread(target=self.PythonThreadProc, args=(context,),
+                                name="PLCPythonThread")
+        self.PythonThreadContext = context
+        context.thread.start()
 
     # used internaly
     def PythonRuntimeCleanup(self):
-        if self.python_runtime_vars is not None:
-            self.PythonThreadCommand("Finish")
-            self.PythonThread.join()
-            self.PythonRuntimeCall("cleanup", use_evaluator=False, reverse_order=True)
-
+        context = self.PythonThreadContext
+        self.PythonThreadContext = None
         self.python_runtime_vars = None
+        if context is not None:
+            self._PythonThreadCleanup(context)
 
-    def PythonThreadLoop(self):
+    def _PythonThreadCleanup(self, context):
+        """
+        End python thread of given python extensions, and clean them up
+        """
+        self.PythonThreadCommand("Finish", context)
+        context.thread.join()
+        self.PythonRuntimeCall("cleanup", use_evaluator=False, reverse_order=True,
+                               runtime_vars=context.runtime_vars)
+
+    def PythonThreadLoop(self, context):
         res, cmd, blkid = "None", "None", ctypes.c_void_p()
         compile_cache = {}
+        runtime_vars = context.runtime_vars
         while True:
-            cmd = self._PythonIterator(res, blkid)
+            cmd = context.iterator(res, blkid)
             FBID = blkid.value
             if cmd is None:
                 break
             try:
-                self.python_runtime_vars["FBID"] = FBID
+                runtime_vars["FBID"] = FBID
                 ccmd, AST = compile_cache.get(FBID, (None, None))
                 if ccmd is None or ccmd != cmd:
                     AST = compile(cmd, '<plc>', 'eval')
                     compile_cache[FBID] = (cmd, AST)
-                result, exp = self.evaluator(eval, AST, self.python_runtime_vars)
+                result, exp = self.evaluator(eval, AST, runtime_vars)
                 if exp is not None:
                     res = "#EXCEPTION : "+str(exp[1])
                     self.LogMessage(1, ('PyEval@0x%x(Code="%s") Exception "%s"') % (
                         FBID, cmd, '\n'.join(traceback.format_exception(*exp))))
                 else:
                     res = str(result)
-                self.python_runtime_vars["FBID"] = None
+                runtime_vars["FBID"] = None
             except Exception as e:
                 res = "#EXCEPTION : "+str(e)
                 self.LogMessage(1, ('PyEval@0x%x(Code="%s") Exception "%s"') % (FBID, cmd, str(e)))
 
-    def PythonThreadProc(self):
+    def PythonThreadProc(self, context):
         while True:
-            self.PythonThreadCondLock.acquire()
-            cmd = self.PythonThreadCmd
+            context.CondLock.acquire()
+            cmd = context.Cmd
             while cmd is None:
-                self.PythonThreadCmdCond.wait()
-                cmd = self.PythonThreadCmd
-            self.PythonThreadCmd = None
-            self.PythonThreadCondLock.release()
+                context.CmdCond.wait()
+                cmd = context.Cmd
+            context.Cmd = None
+            context.CondLock.release()
 
             if cmd == "PreStart":
                 self.PreStartPLC()
                 # Ack once PreStart done, must be finished before StartPLC
-                self.PythonThreadAcknowledge(cmd)
+                self.PythonThreadAcknowledge(context, cmd)
             elif cmd == "Start":
                 # Ack Immediately, for responsiveness
-                self.PythonThreadAcknowledge(cmd)
-                self.PythonRuntimeCall("start")
+                self.PythonThreadAcknowledge(context, cmd)
+                self.PythonRuntimeCall("start", runtime_vars=context.runtime_vars)
                 self.LogMessage("Python extensions started")
                 self._PostStartPLC()
-                self.PythonThreadLoop()
-                self.PythonRuntimeCall("stop", reverse_order=True)
+                self.PythonThreadLoop(context)
+                self.PythonRuntimeCall("stop", reverse_order=True,
+                                       runtime_vars=context.runtime_vars)
             elif cmd == "Finish":
-                self.PythonThreadAcknowledge(cmd)
+                self.PythonThreadAcknowledge(context, cmd)
                 break
 
-    def PythonThreadAcknowledge(self, ack):
-        self.PythonThreadCondLock.acquire()
-        self.PythonThreadAck = ack
-        self.PythonThreadAckCond.notify()
-        self.PythonThreadCondLock.release()
-
-    def PythonThreadCommand(self, cmd):
-        self.PythonThreadCondLock.acquire()
-        self.PythonThreadCmd = cmd
-        self.PythonThreadCmdCond.notify()
+    def PythonThreadAcknowledge(self, context, ack):
+        context.CondLock.acquire()
+        context.Ack = ack
+        context.AckCond.notify()
+        context.CondLock.release()
+
+    def PythonThreadCommand(self, cmd, context=None):
+        if context is None:
+            context = self.PythonThreadContext
+        context.CondLock.acquire()
+        context.Cmd = cmd
+        context.CmdCond.notify()
         ack = None
         while ack != cmd:
-            self.PythonThreadAckCond.wait()
-            ack = self.PythonThreadAck
-            self.PythonThreadAck = None
+            context.AckCond.wait()
+            ack = context.Ack
+            context.Ack = None
 
-        self.PythonThreadCondLock.release()
+        context.CondLock.release()
 
     def _fail(self, msg):
         self.LogMessage(0, msg)
@@ -559,7 +798,7 @@ class PLCObject(object):
         except EOFError:
             return (PlcStatus.Disconnected, None)
 
-    @RunInMain
+    @RunShared
     def _GetPLCstatus(self):
         return self.PLCStatus, map(self.GetLogCount, xrange(LogLevelsCount))
 
@@ -567,6 +806,22 @@ class PLCObject(object):
     def GetPLCID(self):
         return getPSKID(partial(self.LogMessage, 0))
 
+    @RunInMain
+    def CanHotReloadPLC(self):
+        """
+        Tell if running PLC can be replaced by NewPLC without stopping it
+        """
+        return self.PLCStatus == PlcStatus.Started and \
+            GetHotReloadCalls(self.PLClibraryHandle) is not None
+
+    def GetRemoteCalls(self):
+        """
+        Names of calls IDE can make, so that it doesn't try calls
+        missing in a runtime, as that would break connection
+        """
+        return [name for name in dir(self)
+                if not name.startswith("_") and callable(getattr(self, name))]
+
     def _init_blobs(self):
         self.blobs = {}
         if os.path.exists(self.tmpdir):
@@ -583,16 +838,81 @@ class PLCObject(object):
         return newBlobID
 
     @RunInMain
-    def AppendChunkToBlob(self, data, blobID):
+    def AppendChunkToBlob(self, data, blobID, compression=None):
         blob = self.blobs.pop(blobID, None)
 
         if blob is None:
             return None
 
         fd, _path, md5sum = blob
-        md5sum.update(data)
+        if compression is None:
+            md5sum.update(data)
+            os.write(fd, data)
+        else:
+            def write(piece):
+                md5sum.update(piece)
+                os.write(fd, piece)
+            BlobCompression.Decompress(compression, data, write)
+        newBlobID = md5sum.digest()
+        self.blobs[newBlobID] = blob
+        return newBlobID
+
+    def GetBlobCompressions(self):
+        """
+        Compressions that can be given to AppendChunkToBlob
+        and WriteBlobChunk, preferred first
+        """
+        return BlobCompression.GetCodecs()
+
+    def NegotiateBlobChunkSize(self, size):
+        """
+        Agree on size of chunks given to WriteBlobChunk
+        @return: requested size, limited to what runtime accepts
+        """
+        return max(1, min(size, MaxBlobChunkSize))
+
+    @RunInMain
+    def WriteBlobChunk(self, blobID, offset, data, compression=None):
+        """
+        Write part of a blob at given offset, so that chunks can be sent
+        concurrently. Blob ID doesn't change until SealBlob is called.
+        @return: size of written data, None if blob doesn't exist
+        """
+        blob = self.blobs.get(blobID, None)
+
+        if blob is None or len(data) > MaxBlobChunkSize:
+            return None
+
+        fd, _path, _md5sum = blob
+        os.lseek(fd, offset, os.SEEK_SET)
+        if compression is None:
+            return os.write(fd, data)
+        written = []
+
+        def write(piece):
+            written.append(os.write(fd, piece))
+        BlobCompression.Decompress(compression, data, write)
+        return sum(written)
+
+    @RunInMain
+    def SealBlob(self, blobID):
+        """
+        End blob written with WriteBlobChunk, and check its content
+        @return: MD5 digest of seed and content, that becomes blob ID
+        """
+        blob = self.blobs.pop(blobID, None)
+
+        if blob is None:
+            return None
+
+        _fd, path, md5sum = blob
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(1 << 16)
+                if not data:
+                    break
+                md5sum.update(data)
         newBlobID = md5sum.digest()
-        os.write(fd, data)
         self.blobs[newBlobID] = blob
         return newBlobID
 
@@ -602,6 +922,139 @@ class PLCObject(object):
             os.close(fd)
         self._init_blobs()
 
+    @RunInMain
+    def GetBlobChunk(self, blobID, offset, size):
+        """
+        Read part of a blob, to download it.
+        Blob is released once read past its end.
+        """
+        blob = self.blobs.get(blobID, None)
+
+        if blob is None:
+            return None
+
+        _fd, path, _md5sum = blob
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read(size)
+        if not data:
+            self._ReleaseBlob(self.blobs.pop(blobID))
+        return data
+
+    def _ReleaseBlob(self, blob):
+        fd, path, _md5sum = blob
+        os.close(fd)
+        os.remove(path)
+
+    def _GetInstalledFiles(self):
+        """
+        Return dict of name : path of current PLC and its extra files
+        @param name: extra file name, None for PLC library
+        """
+        files = {}
+        if self.CurrentPLCFilename is not None:
+            files[None] = self._GetLibFileName()
+        try:
+            with open(self._extra_files_log_path(), "rt") as f:
+                for fname in f.readlines():
+                    fname = fname.strip()
+                    if fname:
+                        files[fname] = os.path.join(self.workingdir, fname)
+        except IOError:
+            pass
+        return dict([(name, path) for name, path in files.items()
+                     if os.path.isfile(path)])
+
+    def _GetFileDigest(self, path):
+        st = os.stat(path)
+        cached = self.files_digests.get(path)
+        if cached is not None and cached[:2] == (st.st_size, st.st_mtime):
+            return cached[2]
+        digest = FileDigest(path)
+        self.files_digests[path] = (st.st_size, st.st_mtime, digest)
+        return digest
+
+    def _GetInstalledFilesByDigest(self):
+        return dict([(self._GetFileDigest(path), path)
+                     for path in self._GetInstalledFiles().values()])
+
+    @RunInMain
+    def BlobsFromDigests(self, files):
+        """
+        Create blobs from installed files having same content as files
+        to transfer, so that those don't need to be sent again
+        @param files: list of (content MD5 hex digest, seed)
+        @return: list of blob IDs, None for content not found
+        """
+        installed = self._GetInstalledFilesByDigest()
+        blobIDs = []
+        for digest, seed in files:
+            path = installed.get(digest)
+            if path is None:
+                blobIDs.append(None)
+                continue
+            fd, blobpath = mkstemp(dir=self.tmpdir)
+            os.close(fd)
+            os.remove(blobpath)
+            try:
+                # file will be moved back in place, share content,
+                # and prevent writing to blob
+                os.link(path, blobpath)
+                flags = os.O_RDONLY
+            except (AttributeError, OSError):
+                shutil.copyfile(path, blobpath)
+                flags = os.O_RDWR
+            md5sum = hashlib.new('md5')
+            md5sum.update(seed)
+            with open(blobpath, "rb") as f:
+                while True:
+                    data = f.read(1 << 16)
+                    if not data:
+                        break
+                    md5sum.update(data)
+            blob = (os.open(blobpath, flags | getattr(os, "O_BINARY", 0)),
+                    blobpath, md5sum)
+            newBlobID = md5sum.digest()
+            self.blobs[newBlobID] = blob
+            blobIDs.append(newBlobID)
+        return blobIDs
+
+    @RunInMain
+    def GetFileSignatures(self, name, blocksize):
+        """
+        Signatures of blocks of an installed file, to send only
+        differences with that file
+        @param name: extra file name, None for PLC library
+        @return: (content MD5 hex digest, packed signatures) or None
+        """
+        path = self._GetInstalledFiles().get(name)
+        if path is None:
+            return None
+        return self._GetFileDigest(path), GetBlockSignatures(path, blocksize)
+
+    @RunInMain
+    def AppendBlocksToBlob(self, digest, ranges, blobID):
+        """
+        Append parts of an installed file to a blob
+        @param digest: content MD5 hex digest of installed file
+        @param ranges: list of (offset, size) in installed file
+        """
+        path = self._GetInstalledFilesByDigest().get(digest)
+        if path is None or blobID not in self.blobs:
+            return None
+
+        blob = self.blobs.pop(blobID)
+        fd, _path, md5sum = blob
+        with open(path, "rb") as f:
+            for offset, size in ranges:
+                f.seek(offset)
+                data = f.read(size)
+                md5sum.update(data)
+                os.write(fd, data)
+        newBlobID = md5sum.digest()
+        self.blobs[newBlobID] = blob
+        return newBlobID
+
     def BlobAsFile(self, blobID, newpath):
         blob = self.blobs.pop(blobID, None)
 
@@ -653,13 +1106,269 @@ class PLCObject(object):
 
         # TODO: PLCObject restart
 
+    def _BackupPLCFiles(self):
+        """
+        Move files of current PLC, but PLC library, to a backup directory,
+        to restore them if new PLC can't be hot reloaded
+        @return: backup directory, and list of moved files names
+        """
+        backupdir = mkdtemp(dir=self.tmpdir)
+        extra_files_log = self._extra_files_log_path()
+        try:
+            with open(extra_files_log, "rt") as f:
+                fnames = [fname.strip() for fname in f.readlines() if fname.strip()]
+        except IOError:
+            fnames = []
+        fnames.extend([os.path.basename(extra_files_log),
+                       os.path.basename(self._GetMD5FileName())])
+        moved = []
+        for fname in fnames:
+            path = os.path.join(self.workingdir, fname)
+            if os.path.exists(path):
+                shutil.move(path, os.path.join(backupdir, fname))
+                moved.append(fname)
+        return backupdir, moved
+
+    def _RestorePLCFiles(self, backupdir, moved, installed):
+        for fname in installed:
+            path = os.path.join(self.workingdir, fname)
+            if os.path.exists(path):
+                os.remove(path)
+        for fname in moved:
+            shutil.move(os.path.join(backupdir, fname),
+                        os.path.join(self.workingdir, fname))
+        shutil.rmtree(backupdir, True)
+
+    def _RemovePLCBackup(self, backupdir, OldFileName):
+        """
+        Forget files of previous PLC, once new one replaced it
+        """
+        shutil.rmtree(backupdir, True)
+        try:
+            os.remove(os.path.join(self.workingdir, OldFileName))
+        except OSError:
+            pass
+
+    def _InstallPLCFiles(self, md5sum, plc_object, extrafiles, installed):
+        """
+        Create files of new PLC from blobs
+        @param installed: list filled with names of created files
+        """
+        NewFileName = md5sum + lib_ext
+        self.BlobAsFile(plc_object, os.path.join(self.workingdir, NewFileName))
+        installed.append(NewFileName)
+
+        extra_files_log = self._extra_files_log_path()
+        installed.append(os.path.basename(extra_files_log))
+        with open(extra_files_log, "w") as log:
+            for fname, blobID in extrafiles:
+                fpath = os.path.join(self.workingdir, fname)
+                self.BlobAsFile(blobID, fpath)
+                installed.append(fname)
+                log.write(fname+'\n')
+
+        installed.append(os.path.basename(self._GetMD5FileName()))
+        with open(self._GetMD5FileName(), "w") as f:
+            f.write(md5sum)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _HotReloadPLC(self, md5sum, plc_object, extrafiles, oldcalls):
+        """
+        Replace running PLC with as little downtime as possible :
+        new PLC library and its python extensions are loaded and initialized
+        next to running ones. Running PLC is then halted at end of its
+        current cycle, new PLC gets values of retained variables having same
+        name and type, and is started. Previous PLC and its python extensions
+        are cleaned up afterwards, and new python extensions are started as
+        StartPLC would.
+        Running PLC is left as is if new one can't be initialized, and
+        resumed if new one can't be started. Running PLC is stopped
+        before new one is started if they can't run at the same time,
+        because both use the same exclusive resources.
+        """
+        OldFileName = self.CurrentPLCFilename
+        NewFileName = md5sum + lib_ext
+        if NewFileName == OldFileName:
+            self.LogMessage("Same PLC is already running")
+            return True
+
+        self.LogMessage("HotReloadPLC (%s)" % md5sum)
+
+        backupdir, moved = self._BackupPLCFiles()
+        installed = []
+        newhandle = None
+        try:
+            self._InstallPLCFiles(md5sum, plc_object, extrafiles, installed)
+            newhandle = dlopen(os.path.join(self.workingdir, NewFileName))
+            newlib = ctypes.CDLL(NewFileName, handle=newhandle)
+            newcalls = GetHotReloadCalls(newlib)
+            # needed by retain, to check retain file belongs to that PLC
+            plc_id = ctypes.c_char_p.in_dll(newlib, "PLC_ID")
+            plc_id.value = md5sum
+            oldresources = GetExclusiveResources(self.PLClibraryHandle)
+            newresources = GetExclusiveResources(newlib)
+        except Exception:
+            PLCprint(traceback.format_exc())
+            if newhandle is not None:
+                dlclose(newhandle)
+            self._RestorePLCFiles(backupdir, moved, installed)
+            return False
+
+        reason = None
+        if newcalls is None:
+            reason = _("new PLC lacks hot reload calls")
+        elif oldresources is None:
+            reason = _("running PLC doesn't list resources it uses")
+        elif newresources is None:
+            reason = _("new PLC doesn't list resources it uses")
+        elif oldresources & newresources:
+            reason = _("both PLCs use {resources}").format(
+                resources=", ".join(sorted(oldresources & newresources)))
+        if reason is not None:
+            self.LogMessage(1, _("PLC can't be hot reloaded, {reason}. "
+                                 "PLC is stopped and started instead.").format(reason=reason))
+            dlclose(newhandle)
+            self.StopPLC()
+            self.UnLoadPLC()
+            self._RemovePLCBackup(backupdir, OldFileName)
+            self.CurrentPLCFilename = NewFileName
+            self.StartPLC()
+            return self.PLCStatus == PlcStatus.Started
+
+        c_argv = ctypes.c_char_p * len(self.argv)
+        res = newcalls["initPLC"](len(self.argv), c_argv(*self.argv))
+        if res != 0:
+            newcalls["cleanupPLC"]()
+            dlclose(newhandle)
+            self._RestorePLCFiles(backupdir, moved, installed)
+            self.LogMessage(0, _("Problem hot reloading PLC : error %d, "
+                                 "previous PLC kept running") % res)
+            return False
+
+        # leave trace thread before PLC library changes
+        self.PLCStatus = PlcStatus.Stopped
+        if self.TraceThread is not None:
+            self.TraceThread.join()
+            self.TraceThread = None
+
+        # new PLC's python extensions are initialized while running PLC
+        # goes on, so that they don't add to downtime
+        oldhandle = self._PLClibraryHandle
+        oldpython = self.python_runtime_vars, self.PythonThreadContext
+        oldstopping = self.PlcStopping
+        saved = self.__dict__.copy()
+        self.CurrentPLCFilename = NewFileName
+        # new library is already loaded, this only declares calls
+        ready = self._LoadPLC()
+        # running PLC's calls, given back if new PLC can't replace it
+        oldlibcalls = dict((name, saved.get(name)) for name, value in self.__dict__.items()
+                           if value is not saved.get(name))
+        if ready:
+            try:
+                self.PythonRuntimeInit()
+            except Exception:
+                PLCprint(traceback.format_exc())
+                ready = False
+            else:
+                self.PythonThreadCommand("PreStart")
+        if not ready:
+            newcalls["cleanupPLC"]()
+            self._RevertHotReload(oldhandle, oldlibcalls, oldpython)
+            dlclose(newhandle)
+            self._RestorePLCFiles(backupdir, moved, installed)
+            self.PLCStatus = PlcStatus.Started
+            self.LogMessage(0, _("Problem hot reloading PLC : new PLC can't be loaded, "
+                                 "previous PLC kept running"))
+            return False
+
+        start = time()
+        oldcalls["haltPLC"]()
+        halted = time()
+        oldvars = GetRetainVariables(oldcalls["GetRetainVariable"])
+        newvars = GetRetainVariables(newcalls["GetRetainVariable"])
+        migrated = 0
+        for name, (value_p, size) in newvars.iteritems():
+            old = oldvars.get(name)
+            if old is not None and old[1] == size:
+                ctypes.memmove(value_p, old[0], size)
+                migrated += 1
+        res = newcalls["runPLC"]()
+        # PLC only stops between halt of previous PLC and start of new one
+        downtime = time() - halted
+
+        if res != 0:
+            self.PythonRuntimeCleanup()
+            newcalls["cleanupPLC"]()
+            self._RevertHotReload(oldhandle, oldlibcalls, oldpython)
+            dlclose(newhandle)
+            self._RestorePLCFiles(backupdir, moved, installed)
+            if oldcalls["runPLC"]() == 0:
+                self.PLCStatus = PlcStatus.Started
+                self.LogMessage(0, _("Problem hot reloading PLC : error %d, "
+                                     "previous PLC resumed") % res)
+                return False
+            self.LogMessage(0, _("Problem hot reloading PLC : error %d, "
+                                 "restarting previous PLC") % res)
+            oldcalls["cleanupPLC"]()
+            if oldstopping is not None:
+                oldstopping.set()
+            self.UnLoadPLC()
+            self.StatusChange()
+            self.StartPLC()
+            return False
+
+        self.PLCStatus = PlcStatus.Started
+        # previous PLC and its python extensions are released once new PLC
+        # runs, out of downtime. Previous library is only closed then, since
+        # it owns signal handlers until new PLC thread runs.
+        oldcalls["cleanupPLC"]()
+        if oldstopping is not None:
+            # python iterator of PLC without python extension
+            oldstopping.set()
+        if oldpython[1] is not None:
+            self._PythonThreadCleanup(oldpython[1])
+        dlclose(newhandle)
+        dlclose(oldhandle)
+        self._RemovePLCBackup(backupdir, OldFileName)
+
+        try:
+            ticktime = ctypes.c_ulonglong.in_dll(self.PLClibraryHandle, "common_ticktime__").value
+        except ValueError:
+            ticktime = 0
+        self.LogMessage(
+            "PLC hot reloaded, {migrated} of {count} retained variables migrated, "
+            "PLC halted for {downtime:.1f} ms ({cycles} cycles), {halt:.1f} ms to end last cycle".format(
+                migrated=migrated, count=len(newvars), downtime=downtime * 1000,
+                cycles=int(downtime * 1e9 / ticktime) + 1 if ticktime else "?",
+                halt=(halted - start) * 1000))
+        self.StatusChange()
+        self.PythonThreadCommand("Start")
+        return True
+
+    def _RevertHotReload(self, oldhandle, oldlibcalls, oldpython):
+        """
+        Give running PLC's library calls and python extensions back,
+        once new PLC's ones are released
+        """
+        if self._PLClibraryHandle is not None and self._PLClibraryHandle != oldhandle:
+            dlclose(self._PLClibraryHandle)
+        self.__dict__.update(oldlibcalls)
+        self.python_runtime_vars, self.PythonThreadContext = oldpython
+
     @RunInMain
     def NewPLC(self, md5sum, plc_object, extrafiles):
+        restart = False
+        if self.PLCStatus == PlcStatus.Started:
+            hotreloadcalls = GetHotReloadCalls(self.PLClibraryHandle)
+            if hotreloadcalls is not None:
+                return self._HotReloadPLC(md5sum, plc_object, extrafiles, hotreloadcalls)
+            self.LogMessage(1, _("PLC can't be hot reloaded, running PLC lacks "
+                                 "hot reload calls. PLC is stopped and started instead."))
+            self.StopPLC()
+            restart = True
         if self.PLCStatus in [PlcStatus.Stopped, PlcStatus.Empty, PlcStatus.Broken]:
             NewFileName = md5sum + lib_ext
-            extra_files_log = self._extra_files_log_path()
-
-            new_PLC_filename = os.path.join(self.workingdir, NewFileName)
 
             self.UnLoadPLC()
 
@@ -668,21 +1377,9 @@ class PLCObject(object):
             self.LogMessage("NewPLC (%s)" % md5sum)
 
             try:
-                # Create new PLC file
-                self.BlobAsFile(plc_object, new_PLC_filename)
-
-                # Then write the files
-                log = open(extra_files_log, "w")
-                for fname, blobID in extrafiles:
-                    fpath = os.path.join(self.workingdir, fname)
-                    self.BlobAsFile(blobID, fpath)
-                    log.write(fname+'\n')
-
-                # Store new PLC filename based on md5 key
-                with open(self._GetMD5FileName(), "w") as f:
-                    f.write(md5sum)
-                    f.flush()
-                    os.fsync(f.fileno())
+                # Create new PLC file, extra files, and store
+                # new PLC filename based on md5 key
+                self._InstallPLCFiles(md5sum, plc_object, extrafiles, [])
 
                 # Store new PLC filename
                 self.CurrentPLCFilename = NewFileName
@@ -698,6 +1395,9 @@ class PLCObject(object):
             else:
                 self._fail(_("Problem installing new PLC : can't load PLC"))
 
+            if restart and self.PLCStatus == PlcStatus.Stopped:
+                self.StartPLC()
+                return self.PLCStatus == PlcStatus.Started
             return self.PLCStatus == PlcStatus.Stopped
         return False
 
@@ -716,6 +1416,45 @@ class PLCObject(object):
         these indexes to registred variables in PLC debugger
         """
         self.DebugToken += 1
+        self.TraceVariablesList = list(idxs)
+        return self._RegisterTraceVariables()
+
+    @RunInMain
+    def _SetExtraTraceVariables(self, extra):
+        """
+        Trace variables for other consumers than SetTraceVariablesList's
+        caller, such as trace streaming subscribers. Traced frames then
+        hold variables given to SetTraceVariablesList, followed by other
+        ones, see TracedVariables.
+        @param extra: dict of DebugToken : [(idx, iectype)]
+        @return: as SetTraceVariablesList, None if traced variables
+        didn't change. Previous ones are traced again on error.
+        """
+        previous = self.ExtraTraceVariables
+        self.ExtraTraceVariables = dict(extra)
+        idxs = self._TraceVariablesUnion()
+        if [(idx, iectype) for idx, iectype, _force in idxs] == self.TracedVariables:
+            return None
+        res = self._RegisterTraceVariables()
+        if res < 0:
+            self.ExtraTraceVariables = previous
+            self._RegisterTraceVariables()
+        return res
+
+    def _TraceVariablesUnion(self):
+        idxs = list(self.TraceVariablesList)
+        known = set([idx for idx, _iectype, _force in idxs])
+        for token in sorted(self.ExtraTraceVariables):
+            for idx, iectype in self.ExtraTraceVariables[token]:
+                if idx not in known:
+                    known.add(idx)
+                    idxs.append((idx, iectype, None))
+        return idxs
+
+    def _RegisterTraceVariables(self):
+        idxs = self._TraceVariablesUnion()
+        self.TraceFramesDropped = 0
+        self.TracedVariables = [(idx, iectype) for idx, iectype, _force in idxs]
         if idxs:
             # suspend but dont disable
             if self._suspendDebug(False) == 0:
@@ -733,6 +1472,11 @@ class PLCObject(object):
                         self._suspendDebug(True)
                         return -res
                 self._TracesSwap()
+                self.KeptTraces = []
+                self.TraceLock.acquire()
+                if self.TraceRecorder is not None:
+                    self.TraceRecorder.NewSession(self.TracedVariables)
+                self.TraceLock.release()
                 self._resumeDebug()
                 return self.DebugToken
         else:
@@ -748,34 +1492,232 @@ class PLCObject(object):
         Traces = self.Traces
         self.Traces = []
         self.TraceLock.release()
-        return Traces
+        return [(tick, data) for tick, data, _keyframe in Traces]
 
     @RunInMain
     def GetTraceVariables(self, DebugToken):
         if DebugToken is not None and DebugToken == self.DebugToken:
-            return self.PLCStatus, self._TracesSwap()
+            traces = self.KeptTraces + self._TracesSwap()
+            self.KeptTraces = []
+            count = len(self.TraceVariablesList)
+            if len(self.TracedVariables) > count:
+                # leave out variables traced for other consumers
+                indexes = [iectype for _idx, iectype in self.TracedVariables]
+                traces = [(tick, data) for tick, data in [
+                    (tick, SubsetDebugBuffer(data, indexes, range(count), self._TraceDelta))
+                    for tick, data in traces] if data is not None]
+            return self.PLCStatus, traces
         return PlcStatus.Broken, []
 
+    @RunInMain
+    def _GetAllTraces(self, keep):
+        """
+        Return PLC status, DebugToken, count of variables given to
+        SetTraceVariablesList, all traced variables and their traces,
+        for consumers sharing PLC traces
+        @param keep: also keep traces for next GetTraceVariables call
+        """
+        traces = self._TracesSwap()
+        if keep and self.TraceVariablesList:
+            self.KeptTraces.extend(traces)
+            excess = len(self.KeptTraces) - self.MaxKeptTraces
+            if excess > 0:
+                del self.KeptTraces[:excess]
+                self.TraceFramesDropped += excess
+        return self.PLCStatus, self.DebugToken, len(self.TraceVariablesList), \
+            self.TracedVariables, traces
+
+    @RunInMain
+    def RequestDebugKeyFrame(self, DebugToken):
+        """
+        Have next trace frame hold all traced variables,
+        when delta encoded frames were lost by IDE
+        """
+        if DebugToken is not None and \
+           (DebugToken == self.DebugToken or DebugToken in self.ExtraTraceVariables):
+            self._RequestDebugKeyFrame()
+            return True
+        return False
+
+    @RunInMain
+    def GetDebugFramesCount(self):
+        """
+        Return count of trace frames captured and dropped
+        since last call to SetTraceVariablesList
+        """
+        captured = ctypes.c_uint32()
+        dropped = ctypes.c_uint32()
+        self._GetDebugFramesCount(ctypes.byref(captured),
+                                  ctypes.byref(dropped))
+        return captured.value, dropped.value + self.TraceFramesDropped
+
+    @RunInMain
+    def GetDebugStats(self):
+        """
+        Return debugger buffers and lists sizes, high-water marks
+        and overflow counts since PLC started, and retain saves
+        count and size of retained data given to last save
+        """
+        if self._GetDebugStats is not None:
+            stats = DebugStats()
+            self._GetDebugStats(ctypes.byref(stats))
+            return {name: getattr(stats, name)
+                    for name, _ctype in DebugStats._fields_}
+        return None
+
+    @RunShared
+    def GetDebugTraceDelta(self):
+        """
+        Tell if trace frames of loaded PLC are delta encoded, as PLC may
+        have been built with other debugger settings than IDE's project.
+        None if no PLC is loaded.
+        """
+        return self._TraceDelta
+
+    @RunShared
+    def GetCycleStats(self):
+        """
+        Return PLC thread cycles count, overruns count, skipped cycles
+        count, late wake-ups count, and min, max, mean and log2 histogram
+        of execution time and wake-up latency in ns, since PLC started.
+        Histogram's item i counts durations from 2**i to 2**(i+1)-1 ns.
+        None if PLC isn't loaded or its target has no cycle statistics.
+        """
+        if self._GetCycleStats is None:
+            return None
+        stats = CycleStats()
+        self._GetCycleStats(ctypes.byref(stats))
+        res = {name: getattr(stats, name) for name in [
+            "period_ns", "cycles", "overruns", "skipped_cycles", "late_wakeups"]}
+        for name in ["execution", "latency"]:
+            timestats = getattr(stats, name)
+            res[name] = {
+                "min_ns": timestats.min_ns if stats.cycles else 0,
+                "max_ns": timestats.max_ns,
+                "mean_ns": timestats.total_ns // stats.cycles if stats.cycles else 0,
+                "histogram": list(timestats.histogram)}
+        return res
+
+    def _GetTraceRecordFileName(self):
+        return os.path.join(self.workingdir, "trace_record.dat")
+
+    @RunInMain
+    def StartTraceRecording(self, max_size=TraceRecordMaxSize):
+        """
+        Record traces of variables given to last SetTraceVariablesList
+        call to a file, until StopTraceRecording is called, PLC stops,
+        or recording reaches max_size bytes.
+        Recording doesn't depend on traces being polled.
+        """
+        if self.PLCStatus != PlcStatus.Started or not self.TracedVariables:
+            return False
+        path = self._GetTraceRecordFileName()
+        self.TraceRecordFileLock.acquire()
+        self.TraceLock.acquire()
+        try:
+            if self.TraceRecorder is None:
+                if os.path.exists(path):
+                    self.LogMessage(1, "Previous trace recording replaced")
+                recorder = TraceRecorder(
+                    path, lambda: self._RequestDebugKeyFrame(), max_size)
+                recorder.NewSession(self.TracedVariables)
+                self.TraceRecorder = recorder
+        except (IOError, OSError) as e:
+            self.LogMessage(0, "Trace recording failed : %s" % str(e))
+            return False
+        finally:
+            self.TraceLock.release()
+            self.TraceRecordFileLock.release()
+        self._TracesSwap()
+        self.LogMessage("Trace recording started")
+        return True
+
+    def _StopTraceRecording(self):
+        self.TraceLock.acquire()
+        recorder, self.TraceRecorder = self.TraceRecorder, None
+        self.TraceLock.release()
+        if recorder is None:
+            return None
+        try:
+            recorder.Close()
+        except (IOError, OSError) as e:
+            self.LogMessage(0, "Trace recording failed : %s" % str(e))
+        self.LogMessage(
+            "Trace recording stopped, %d frames in %d chunks, %d skipped" %
+            (recorder.frames_count, recorder.chunks_count,
+             recorder.frames_skipped))
+        return recorder.frames_count, recorder.chunks_count
+
+    @RunInMain
+    def StopTraceRecording(self):
+        """
+        Return (frames count, chunks count) recorded, or None if not recording
+        """
+        return self._StopTraceRecording()
+
+    @RunInMain
+    def _AddBlob(self, blob):
+        newBlobID = blob[2].digest()
+        if newBlobID in self.blobs:
+            # same content is already there
+            self._ReleaseBlob(blob)
+        else:
+            self.blobs[newBlobID] = blob
+        return newBlobID
+
+    def TraceRecordToBlob(self, start_tick=None, end_tick=None):
+        """
+        Make a blob with recorded chunks overlapping given ticks range,
+        to be downloaded with GetBlobChunk, that releases it once read.
+        Recording file is copied in caller's thread, while PLC runs and
+        recording goes on. Chunks recorded meanwhile are not included.
+        """
+        path = self._GetTraceRecordFileName()
+        self.TraceRecordFileLock.acquire()
+        try:
+            if not os.path.exists(path):
+                return None
+            # index only lists chunks already written
+            self.TraceLock.acquire()
+            try:
+                index = ReadTraceRecordIndex(path)
+            finally:
+                self.TraceLock.release()
+            blob = (mkstemp(dir=self.tmpdir) + (hashlib.new('md5'),))
+            fd, blobpath, md5sum = blob
+            ExtractTraceRecord(path, fd, start_tick, end_tick, index)
+        finally:
+            self.TraceRecordFileLock.release()
+        with open(blobpath, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                md5sum.update(chunk)
+        return self._AddBlob(blob)
+
     def TraceThreadProc(self):
         """
         Return a list of traces, corresponding to the list of required idx
         """
+        # previously collected traces may have been discarded,
+        # delta encoded frames must restart from a key frame
+        self._RequestDebugKeyFrame()
+        wait_keyframe = True
+        unpolled = False
         self._resumeDebug()  # Re-enable debugger
+        maxsize = self._GetDebugDataMaxSize()
+        buff = ctypes.create_string_buffer(maxsize)
+        frames_count = ctypes.c_uint32()
+        size = ctypes.c_uint32()
         while self.PLCStatus == PlcStatus.Started:
-            tick = ctypes.c_uint32()
-            size = ctypes.c_uint32()
-            buff = ctypes.c_void_p()
-            TraceBuffer = None
+            TraceData = None
 
             self.PLClibraryLock.acquire()
 
-            res = self._GetDebugData(ctypes.byref(tick),
-                                     ctypes.byref(size),
-                                     ctypes.byref(buff))
-            if res == 0:
-                if size.value:
-                    TraceBuffer = ctypes.string_at(buff.value, size.value)
-                self._FreeDebugData()
+            # get all frames ready in PLC's trace ring at once
+            res = self._GetDebugData(buff, maxsize,
+                                     ctypes.byref(frames_count),
+                                     ctypes.byref(size))
+            if res == 0 and size.value:
+                TraceData = ctypes.string_at(buff, size.value)
 
             self.PLClibraryLock.release()
 
@@ -783,23 +1725,76 @@ class PLCObject(object):
             if res != 0:
                 break
 
-            if TraceBuffer is not None:
+            if TraceData is not None:
+                record_error = None
                 self.TraceLock.acquire()
-                lT = len(self.Traces)
-                if lT != 0 and lT * len(self.Traces[0]) > 1024 * 1024:
-                    self.Traces.pop(0)
-                self.Traces.append((tick.value, TraceBuffer))
-                self.TraceLock.release()
-
-            # TraceProc stops here if Traces not polled for 3 seconds
+                try:
+                    offset = 0
+                    for _i in xrange(frames_count.value):
+                        tick, framesize, flags = TraceFrameHeader.unpack_from(TraceData, offset)
+                        offset += TraceFrameHeader.size
+                        lT = len(self.Traces)
+                        if lT != 0 and lT * len(self.Traces[0][1]) > 1024 * 1024:
+                            # frames following dropped one can't be decoded
+                            # if they only hold changes
+                            self.Traces.pop(0)
+                            self.TraceFramesDropped += 1
+                            while self.Traces and not self.Traces[0][2]:
+                                self.Traces.pop(0)
+                                self.TraceFramesDropped += 1
+                            if not self.Traces:
+                                self._RequestDebugKeyFrame()
+                                wait_keyframe = True
+                        keyframe = bool(flags & TRACE_FRAME_KEY)
+                        if self.TraceRecorder is not None and record_error is None:
+                            # recording file write errors must not leave
+                            # TraceLock held nor stop trace thread
+                            try:
+                                self.TraceRecorder.AddFrame(
+                                    tick, TraceData[offset:offset + framesize], keyframe)
+                            except (IOError, OSError) as e:
+                                record_error = e
+                        if keyframe or not wait_keyframe:
+                            wait_keyframe = False
+                            self.Traces.append((tick, TraceData[offset:offset + framesize], keyframe))
+                        else:
+                            self.TraceFramesDropped += 1
+                        offset += framesize
+                    record_full = self.TraceRecorder is not None and \
+                        self.TraceRecorder.full
+                finally:
+                    self.TraceLock.release()
+                self.TraceEvent.set()
+                if record_error is not None:
+                    self.LogMessage(0, "Trace recording failed : %s" % str(record_error))
+                    self._StopTraceRecording()
+                elif record_full:
+                    self.LogMessage(1, "Trace recording size limit reached")
+                    self._StopTraceRecording()
+
+            # TraceProc stops here if Traces not polled for 3 seconds,
+            # unless traces are being recorded
             traces_age = time() - self.LastSwapTrace
             if traces_age > 3:
-                self.TraceLock.acquire()
-                self.Traces = []
-                self.TraceLock.release()
-                self._suspendDebug(True)  # Disable debugger
-                break
+                if self.TraceRecorder is None:
+                    self.TraceLock.acquire()
+                    self.Traces = []
+                    self.TraceLock.release()
+                    self._suspendDebug(True)  # Disable debugger
+                    break
+                if not unpolled:
+                    # stale traces are discarded once, next ones are kept
+                    # from a new key frame, within Traces size limit
+                    unpolled = True
+                    self.TraceLock.acquire()
+                    self.Traces = []
+                    self.TraceLock.release()
+                    self._RequestDebugKeyFrame()
+                    wait_keyframe = True
+            else:
+                unpolled = False
 
+        self._StopTraceRecording()
         self.TraceThread = None
 
     def RemoteExec(self, script, *kwargs):
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz runtime.
+#
+# See COPYING.Runtime file for copyrights details.
+
+"""
+Trace recording file, written by runtime while PLC runs.
+
+File is append-only. After file header, it is made of records :
+ - "SESS" records give list of traced variables as JSON [[idx, iectype],...]
+ - "CHNK" records hold trace frames, starting with a key frame, so that
+   each chunk can be decoded with only the session record it belongs to.
+
+A separate index file holds, for each chunk : chunk offset, offset of
+session record the chunk belongs to, first and last tick in chunk.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import json
+import struct
+from time import time
+
+# magic, version, byte order of frames content ("l" or "b")
+FileHeader = struct.Struct("<8sHc")
+TraceRecordMagic = b"BRZTRACE"
+# version 2 : delta encoded frames have a sequence number
+TraceRecordVersion = 2
+
+# record type, payload size
+RecordHeader = struct.Struct("<4sI")
+
+# first tick, last tick, frames count
+ChunkHeader = struct.Struct("<III")
+
+# tick, size, flags, as given by PLC's GetDebugData
+FrameHeader = struct.Struct("<III")
+
+# chunk offset, session offset, first tick, last tick
+IndexEntry = struct.Struct("<QQII")
+
+# chunk is closed at next key frame once it reaches this size or age
+ChunkMaxSize = 256 * 1024
+ChunkMaxAge = 1.0
+
+# default limit of recording and index files size, so that recording
+# doesn't fill target's storage shared with PLC files and retain
+TraceRecordMaxSize = 64 * 1024 * 1024
+
+
+def IndexFileName(path):
+    return path + ".idx"
+
+
+def ReadTraceRecordIndex(path):
+    """
+    Return list of (chunk offset, session offset, first tick, last tick)
+    """
+    index = []
+    with open(IndexFileName(path), "rb") as f:
+        data = f.read()
+    # ignore partially written entry
+    for offset in range(0, len(data) - IndexEntry.size + 1, IndexEntry.size):
+        index.append(IndexEntry.unpack_from(data, offset))
+    return index
+
+
+def _ReadRecord(f, offset):
+    f.seek(offset)
+    header = f.read(RecordHeader.size)
+    _rtype, size = RecordHeader.unpack(header)
+    return header + f.read(size)
+
+
+class TraceRecorder(object):
+    """
+    Append trace frames to a recording file, chunk by chunk
+    """
+    def __init__(self, path, request_keyframe, max_size=TraceRecordMaxSize):
+        """
+        @param path: recording file path, overwritten
+        @param request_keyframe: callable asking PLC for a key frame
+        @param max_size: size limit of recording and index files, once
+        reached, frames are not recorded anymore and full is set
+        """
+        self.path = path
+        self.request_keyframe = request_keyframe
+        self.max_size = max_size
+        self.full = False
+        self.file = open(path, "wb")
+        self.index = open(IndexFileName(path), "wb")
+        self.file.write(FileHeader.pack(TraceRecordMagic, TraceRecordVersion,
+                                        sys.byteorder[0]))
+        self.session_offset = None
+        self.frames = []
+        self.frames_size = 0
+        self.chunk_start = None
+        self.keyframe_requested = False
+        self.frames_count = 0
+        self.chunks_count = 0
+        self.frames_skipped = 0
+
+    def _WriteRecord(self, rtype, payload):
+        offset = self.file.tell()
+        self.file.write(RecordHeader.pack(rtype, len(payload)))
+        self.file.write(payload)
+        return offset
+
+    def NewSession(self, traced):
+        """
+        Start a new debug session, with given traced variables
+        @param traced: list of (idx, iectype)
+        """
+        self.Flush()
+        self.session_offset = self._WriteRecord(
+            b"SESS", json.dumps([[idx, iectype] for idx, iectype in traced]))
+        self.file.flush()
+
+    def AddFrame(self, tick, data, keyframe):
+        if self.full:
+            return
+        if self.frames:
+            chunk_full = self.frames_size >= ChunkMaxSize or \
+                time() - self.chunk_start > ChunkMaxAge
+            if chunk_full:
+                if keyframe:
+                    self.Flush()
+                elif not self.keyframe_requested:
+                    # next chunk must start with a key frame
+                    self.request_keyframe()
+                    self.keyframe_requested = True
+        if not self.frames:
+            if not keyframe:
+                # chunk can't start with delta encoded frame
+                self.frames_skipped += 1
+                if not self.keyframe_requested:
+                    self.request_keyframe()
+                    self.keyframe_requested = True
+                return
+            self.chunk_start = time()
+            self.keyframe_requested = False
+        self.frames.append((tick, data, keyframe))
+        self.frames_size += FrameHeader.size + len(data)
+
+    def Flush(self):
+        """
+        Write pending frames as a chunk, and update index
+        """
+        if not self.frames or self.session_offset is None:
+            return
+        first_tick = self.frames[0][0]
+        last_tick = self.frames[-1][0]
+        payload = [ChunkHeader.pack(first_tick, last_tick, len(self.frames))]
+        for tick, data, keyframe in self.frames:
+            payload.append(FrameHeader.pack(tick, len(data), int(keyframe)))
+            payload.append(data)
+        payload = b"".join(payload)
+        size = self.file.tell() + RecordHeader.size + len(payload) + \
+            self.index.tell() + IndexEntry.size
+        if size > self.max_size:
+            self.full = True
+            self.frames_skipped += len(self.frames)
+            self.frames = []
+            self.frames_size = 0
+            return
+        try:
+            offset = self._WriteRecord(b"CHNK", payload)
+            self.file.flush()
+            self.index.write(IndexEntry.pack(
+                offset, self.session_offset, first_tick, last_tick))
+            self.index.flush()
+        except (IOError, OSError):
+            # don't try to write these frames again when closing
+            self.frames_skipped += len(self.frames)
+            self.frames = []
+            self.frames_size = 0
+            raise
+        self.frames_count += len(self.frames)
+        self.chunks_count += 1
+        self.frames = []
+        self.frames_size = 0
+
+    def Close(self):
+        try:
+            self.Flush()
+        finally:
+            try:
+                self.file.close()
+            finally:
+                self.index.close()
+
+
+def ExtractTraceRecord(path, fd, start_tick=None, end_tick=None, index=None):
+    """
+    Write to fd a recording file holding chunks of given recording
+    overlapping given ticks range, with their session records.
+    @param index: chunks index, as given by ReadTraceRecordIndex, read
+    from index file if None
+    @return: count of chunks extracted
+    """
+    count = 0
+    if index is None:
+        index = ReadTraceRecordIndex(path)
+    with open(path, "rb") as f:
+        os.write(fd, f.read(FileHeader.size))
+        last_session = None
+        for offset, session_offset, first_tick, last_tick in index:
+            if (start_tick is not None and last_tick < start_tick) or \
+               (end_tick is not None and first_tick > end_tick):
+                continue
+            if session_offset != last_session:
+                os.write(fd, _ReadRecord(f, session_offset))
+                last_session = session_offset
+            os.write(fd, _ReadRecord(f, offset))
+            count += 1
+    return count
@@ -28,11 +28,13 @@ import time
 import json
 import os
 import re
+from threading import Thread, Lock
 from six import text_type as text
 from autobahn.twisted import wamp
 from autobahn.twisted.websocket import WampWebSocketClientFactory, connectWS
 from autobahn.wamp import types, auth
 from autobahn.wamp.serializer import MsgPackSerializer
+from twisted.internet import reactor
 from twisted.internet.protocol import ReconnectingClientFactory
 from twisted.python.components import registerAdapter
 
@@ -40,6 +42,8 @@ from formless import annotate, webform
 import formless
 from nevow import tags, url, static
 from runtime import GetPLCObjectSingleton
+from runtime import PlcStatus
+from runtime.typemapping import SubsetDebugBuffer
 
 mandatoryConfigItems = ["ID", "active", "realm", "url"]
 
@@ -58,14 +62,32 @@ ExposedCalls = [
     ("GetPLCID", {}),
     ("SeedBlob", {}),
     ("AppendChunkToBlob", {}),
+    ("GetBlobCompressions", {}),
+    ("NegotiateBlobChunkSize", {}),
+    ("WriteBlobChunk", {}),
+    ("SealBlob", {}),
+    ("BlobsFromDigests", {}),
+    ("GetFileSignatures", {}),
+    ("AppendBlocksToBlob", {}),
     ("PurgeBlobs", {}),
     ("NewPLC", {}),
+    ("CanHotReloadPLC", {}),
     ("RepairPLC", {}),
     ("MatchMD5", {}),
     ("SetTraceVariablesList", {}),
     ("GetTraceVariables", {}),
+    ("RequestDebugKeyFrame", {}),
+    ("GetDebugFramesCount", {}),
+    ("GetDebugStats", {}),
+    ("GetDebugTraceDelta", {}),
+    ("GetCycleStats", {}),
+    ("StartTraceRecording", {}),
+    ("StopTraceRecording", {}),
+    ("TraceRecordToBlob", {}),
+    ("GetBlobChunk", {}),
     ("RemoteExec", {}),
     ("GetLogMessage", {}),
+    ("GetLogMessages", {}),
     ("ResetLogCount", {})
 ]
 
@@ -96,6 +118,249 @@ DoOnJoin = []
 lastKnownConfig = None
 
 
+class TraceSubscription(object):
+    """
+    Traces pushed to one subscriber
+    """
+
+    # count of traces kept for subscriber while it doesn't acknowledge
+    MaxPending = 1000
+
+    def __init__(self, DebugToken, window, variables, session):
+        self.DebugToken = DebugToken
+        self.Window = max(1, window)
+        # (idx, iectype) of traced variables, None for IDE's ones
+        self.Variables = variables
+        # WAMP session to publish to, None if unknown
+        self.Session = session
+        self.Seq = 0
+        self.Acked = 0
+        self.LastAck = time.time()
+        self.Pending = []
+        self.Status = PlcStatus.Started
+        self.NeedKeyFrame = variables is not None
+
+
+class TraceStreamer(object):
+    """
+    Publish traces as "<ID>.Traces" WAMP events as soon as PLC gives them,
+    instead of waiting for GetTraceVariables polling.
+    Event is [DebugToken, sequence number, PLC status, traces].
+    Subscriber acknowledges received events. Publishing waits as long as
+    too many events are not acknowledged, traces are then coalesced in
+    bigger batches.
+    Each WAMP session has its own subscription. IDE streams variables
+    given to SetTraceVariablesList, other subscribers give their own
+    variables, PLC then traces all of them and each subscriber gets
+    frames holding its own variables only.
+    """
+
+    # check PLC status at least that often when no traces come
+    Period = 0.5
+
+    # subscriber is considered gone if it doesn't acknowledge for that long
+    Timeout = 3
+
+    def __init__(self):
+        self.lock = Lock()
+        self.thread = None
+        # key : TraceSubscription, key being WAMP session or DebugToken
+        self.Subscriptions = {}
+        self.ExtraVariables = {}
+        self.TokenCount = 0
+
+    def Subscribe(self, DebugToken, window, variables=None, session=None):
+        """
+        Subscribe to traces of IDE's DebugToken, or to traces of given
+        variables as [(idx, iectype)], DebugToken being then ignored.
+        Return DebugToken of published events.
+        """
+        self.lock.acquire()
+        if variables is not None:
+            self.TokenCount += 1
+            DebugToken = u"stream%d" % self.TokenCount
+            variables = [(idx, iectype) for idx, iectype in variables]
+        key = session if session is not None else DebugToken
+        self.Subscriptions[key] = TraceSubscription(
+            DebugToken, window, variables, session)
+        if self.thread is None:
+            self.thread = Thread(target=self.StreamProc, name="TraceStreamer")
+            self.thread.start()
+        self.lock.release()
+        GetPLCObjectSingleton().TraceEvent.set()
+        return DebugToken
+
+    def Ack(self, DebugToken, seq):
+        """
+        Return False if subscription with that DebugToken isn't live
+        anymore, so that subscriber subscribes again or polls traces
+        """
+        self.lock.acquire()
+        live = False
+        if DebugToken is not None:
+            for sub in self.Subscriptions.values():
+                if sub.DebugToken == DebugToken:
+                    sub.Acked = max(sub.Acked, seq)
+                    sub.LastAck = time.time()
+                    live = True
+        self.lock.release()
+        # publish traces accumulated while waiting acknowledge
+        GetPLCObjectSingleton().TraceEvent.set()
+        return live
+
+    def Unsubscribe(self, DebugToken=None, session=None):
+        """
+        Drop subscriptions with given DebugToken or from given session,
+        or all subscriptions if none is given
+        """
+        self.lock.acquire()
+        for key, sub in list(self.Subscriptions.items()):
+            if (DebugToken is None or sub.DebugToken == DebugToken) and \
+               (session is None or sub.Session == session):
+                del self.Subscriptions[key]
+        self.lock.release()
+        GetPLCObjectSingleton().TraceEvent.set()
+
+    def Publish(self, sub, status, traces):
+        # called with lock held
+        sub.Seq += 1
+        event = [sub.DebugToken, sub.Seq, status, traces]
+        options = None
+        if sub.Session is not None:
+            options = types.PublishOptions(eligible=[sub.Session])
+        reactor.callFromThread(
+            PublishEventWithOwnID, "Traces", event, options)
+
+    def StreamProc(self):
+        PLCObject = GetPLCObjectSingleton()
+        while True:
+            PLCObject.TraceEvent.wait(self.Period)
+            PLCObject.TraceEvent.clear()
+
+            self.lock.acquire()
+            now = time.time()
+            for key, sub in list(self.Subscriptions.items()):
+                if now - sub.LastAck > self.Timeout:
+                    del self.Subscriptions[key]
+            subs = list(self.Subscriptions.values())
+            extra = dict([(sub.DebugToken, sub.Variables)
+                          for sub in subs if sub.Variables is not None])
+            keyframe = [sub for sub in subs if sub.NeedKeyFrame]
+            for sub in keyframe:
+                sub.NeedKeyFrame = False
+            if not subs:
+                self.thread = None
+            self.lock.release()
+
+            if extra != self.ExtraVariables:
+                res = PLCObject._SetExtraTraceVariables(extra)
+                if res is not None and res < 0:
+                    # drop new subscribers, some of their variables
+                    # can't be traced
+                    self.lock.acquire()
+                    for key, sub in list(self.Subscriptions.items()):
+                        if sub.Variables is not None and \
+                           sub.DebugToken not in self.ExtraVariables:
+                            self.Publish(sub, PlcStatus.Broken, [])
+                            del self.Subscriptions[key]
+                    self.lock.release()
+                    continue
+                self.ExtraVariables = extra
+            for sub in keyframe:
+                # frames given to new subscriber must start with a key frame
+                PLCObject.RequestDebugKeyFrame(sub.DebugToken)
+            if not subs:
+                return
+
+            if all([sub.Seq - sub.Acked >= sub.Window for sub in subs]):
+                # let traces accumulate in PLCObject
+                continue
+
+            # IDE may also poll traces, keep them for it if it doesn't stream
+            status, DebugToken, count, variables, traces = \
+                PLCObject._GetAllTraces(
+                    not any([sub.Variables is None for sub in subs]))
+            delta = PLCObject.GetDebugTraceDelta()
+            indexes = [iectype for _idx, iectype in variables]
+            traced = [idx for idx, _iectype in variables]
+
+            self.lock.acquire()
+            for key, sub in list(self.Subscriptions.items()):
+                if sub.Variables is None:
+                    if sub.DebugToken != DebugToken:
+                        # IDE did trace other variables since subscribing
+                        self.Publish(sub, PlcStatus.Broken, [])
+                        del self.Subscriptions[key]
+                        continue
+                    positions = list(range(count))
+                elif all([idx in traced for idx, _iectype in sub.Variables]):
+                    positions = [traced.index(idx)
+                                 for idx, _iectype in sub.Variables]
+                else:
+                    # not traced yet
+                    positions = None
+                if positions is not None and traces:
+                    if positions == list(range(len(variables))):
+                        sub.Pending.extend(traces)
+                    else:
+                        for tick, data in traces:
+                            data = SubsetDebugBuffer(
+                                data, indexes, positions, delta)
+                            if data is not None:
+                                sub.Pending.append((tick, data))
+                    excess = len(sub.Pending) - sub.MaxPending
+                    if excess > 0:
+                        # subscriber will ask for key frame if it misses
+                        # delta encoded frames
+                        del sub.Pending[:excess]
+                sub.Status = status
+                if sub.Seq - sub.Acked >= sub.Window:
+                    continue
+                if sub.Pending or status != PlcStatus.Started:
+                    self.Publish(sub, status, sub.Pending)
+                    sub.Pending = []
+                if status != PlcStatus.Started:
+                    del self.Subscriptions[key]
+            self.lock.release()
+
+
+_TraceStreamer = TraceStreamer()
+
+
+def _CallerSession(details):
+    if details is not None:
+        return getattr(details, "caller", None)
+    return None
+
+
+def SubscribeTraces(DebugToken, window, variables=None, details=None):
+    return _TraceStreamer.Subscribe(
+        DebugToken, window, variables, _CallerSession(details))
+
+
+def AckTraces(DebugToken, seq, details=None):
+    return _TraceStreamer.Ack(DebugToken, seq)
+
+
+def UnsubscribeTraces(DebugToken=None, details=None):
+    _TraceStreamer.Unsubscribe(DebugToken, _CallerSession(details))
+
+
+def GetRemoteCalls():
+    """ Only exposed calls can be made through WAMP """
+    return [name for name, _kwargs in ExposedCalls] + \
+        [name for name, _callee in SessionCalls]
+
+
+# calls that are not PLCObject's methods
+SessionCalls = [
+    ("SubscribeTraces", SubscribeTraces),
+    ("AckTraces", AckTraces),
+    ("UnsubscribeTraces", UnsubscribeTraces),
+    ("GetRemoteCalls", GetRemoteCalls),
+]
+
+
 def GetCallee(name):
     """ Get Callee or Subscriber corresponding to '.' spearated object path """
     names = name.split('.')
@@ -141,6 +406,10 @@ class WampSession(wamp.ApplicationSession):
 
             self.register(GetCallee(name), u'.'.join((ID, name)), registerOptions)
 
+        for name, callee in SessionCalls:
+            self.register(callee, u'.'.join((ID, name)),
+                          types.RegisterOptions(details_arg="details"))
+
         for name in SubscribedEvents:
             self.subscribe(GetCallee(name), text(name))
 
@@ -154,11 +423,15 @@ class WampSession(wamp.ApplicationSession):
         super(WampSession, self).onLeave(details)
         _WampSession = None
         _transportFactory = None
+        _TraceStreamer.Unsubscribe()
         print(_('WAMP session left'))
 
-    def publishWithOwnID(self, eventID, value):
+    def publishWithOwnID(self, eventID, value, options=None):
         ID = self.config.extra["ID"]
-        self.publish(text(ID+'.'+eventID), value)
+        if options is None:
+            self.publish(text(ID+'.'+eventID), value)
+        else:
+            self.publish(text(ID+'.'+eventID), value, options=options)
 
 
 class ReconnectingWampWebSocketClientFactory(WampWebSocketClientFactory, ReconnectingClientFactory):
@@ -373,9 +646,9 @@ def PublishEvent(eventID, value):
         _WampSession.publish(text(eventID), value)
 
 
-def PublishEventWithOwnID(eventID, value):
+def PublishEventWithOwnID(eventID, value, options=None):
     if getWampStatus() == "Attached":
-        _WampSession.publishWithOwnID(text(eventID), value)
+        _WampSession.publishWithOwnID(text(eventID), value, options)
 
 
 # WEB CONFIGURATION INTERFACE
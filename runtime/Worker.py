@@ -9,7 +9,8 @@
 
 from __future__ import absolute_import
 import sys
-from threading import Lock, Condition, Thread
+from collections import deque
+from threading import Lock, Condition, Thread, Event
 
 import six
 from six.moves import _thread
@@ -17,13 +18,14 @@ from six.moves import _thread
 
 class job(object):
     """
-    job to be executed by a worker
+    job to be executed by a worker, also future of job's result
     """
     def __init__(self, call, *args, **kwargs):
         self.job = (call, args, kwargs)
         self.result = None
         self.success = None
         self.exc_info = None
+        self.finished = Event()
 
     def do(self):
         """
@@ -37,20 +39,74 @@ class job(object):
             self.success = False
             self.exc_info = sys.exc_info()
 
+    def wait(self):
+        """
+        wait for job to be done, and deliver result.
+        if job execution raise exception, re-raise same exception
+        """
+        self.finished.wait()
+
+        if self.success is None:
+            raise EOFError("Worker job was interrupted")
+
+        if self.success:
+            return self.result
+        else:
+            six.reraise(*self.exc_info)
+
+
+class sharedlock(object):
+    """
+    lock held either by one exclusive owner or by many shared owners.
+    exclusive owner has precedence over new shared owners
+    """
+    def __init__(self):
+        self.mutex = Lock()
+        self.released = Condition(self.mutex)
+        self.shared = 0
+        self.waiting = 0
+
+    def acquire(self):
+        self.mutex.acquire()
+        self.waiting += 1
+        while self.shared:
+            self.released.wait()
+        self.waiting -= 1
+
+    def release(self):
+        self.released.notify_all()
+        self.mutex.release()
+
+    def acquire_shared(self):
+        self.mutex.acquire()
+        while self.waiting:
+            self.released.wait()
+        self.shared += 1
+        self.mutex.release()
+
+    def release_shared(self):
+        self.mutex.acquire()
+        self.shared -= 1
+        if not self.shared:
+            self.released.notify_all()
+        self.mutex.release()
+
 
 class worker(object):
     """
     serialize main thread load/unload of PLC shared objects
     """
-    def __init__(self):
-        # Only one job at a time
+    def __init__(self, queue_size=64):
+        # FIFO of jobs waiting for main thread
         self._finish = False
         self._threadID = None
         self.mutex = Lock()
         self.todo = Condition(self.mutex)
-        self.done = Condition(self.mutex)
         self.free = Condition(self.mutex)
-        self.job = None
+        self.jobs = deque()
+        self.queue_size = queue_size
+        # held while a job runs, shared by read-only calls
+        self.joblock = sharedlock()
         self.enabled = False
         self.stopper = None
         self.own_thread = None
@@ -65,6 +121,39 @@ class worker(object):
         exc_traceback = job.exc_info[2]
         six.reraise(exc_type, exc_value, exc_traceback)
 
+    def _do(self, _job):
+        """
+        execute job in worker thread, excluding read-only calls
+        """
+        self.joblock.acquire()
+        try:
+            _job.do()
+        finally:
+            self.joblock.release()
+        _job.finished.set()
+
+    def _next(self):
+        """
+        wait for next job in queue, None if worker finished.
+        mutex must be held
+        """
+        while not self.jobs and not self._finish:
+            self.todo.wait()
+        if self._finish:
+            return None
+        _job = self.jobs.popleft()
+        self.free.notify()
+        return _job
+
+    def _cancel(self):
+        """
+        wake up callers of jobs that will never be done.
+        mutex must be held
+        """
+        while self.jobs:
+            self.jobs.popleft().finished.set()
+        self.free.notify_all()
+
     def runloop(self, *args, **kwargs):
         """
         meant to be called by worker thread (blocking)
@@ -72,22 +161,21 @@ class worker(object):
         self._threadID = _thread.get_ident()
         self.mutex.acquire()
         self.enabled = True
+        self.mutex.release()
         if args or kwargs:
             _job = job(*args, **kwargs)
-            _job.do()
+            self._do(_job)
             # _job.success can't be None after do()
             if not _job.success:
                 self.reraise(_job)
 
-        while not self._finish:
-            self.todo.wait()
-            if self.job is not None:
-                self.job.do()
-                self.done.notify()
-            else:
+        while True:
+            self.mutex.acquire()
+            _job = self._next()
+            self.mutex.release()
+            if _job is None:
                 break
-
-        self.mutex.release()
+            self._do(_job)
 
     def interleave(self, waker, stopper, *args, **kwargs):
         """
@@ -104,7 +192,7 @@ class worker(object):
             if args or kwargs:
                 def first_job_todo():
                     _job = job(*args, **kwargs)
-                    _job.do()
+                    self._do(_job)
                     if not _job.success:
                         self.reraise(_job)
                     self.mutex.acquire()
@@ -113,18 +201,25 @@ class worker(object):
                 waker(first_job_todo)
                 self.feed.wait()
 
-            while not self._finish:
-                self.todo.wait()
-                def job_todo():
+            def jobs_todo():
+                # do all jobs queued so far
+                while True:
                     self.mutex.acquire()
-                    if self.job is not None:
-                        self.job.do()
+                    if self._finish or not self.jobs:
                         self.feed.notify()
-                        self.done.notify()
+                        self.mutex.release()
+                        break
+                    _job = self.jobs.popleft()
+                    self.free.notify()
                     self.mutex.release()
+                    self._do(_job)
+
+            while not self._finish:
+                while not self.jobs and not self._finish:
+                    self.todo.wait()
                 if self._finish:
                     break
-                waker(job_todo)
+                waker(jobs_todo)
                 self.feed.wait()
 
             self.mutex.release()
@@ -138,18 +233,18 @@ class worker(object):
         self.mutex.acquire()
         self._finish = True
         self.enabled = False
-        self.job = None
+        self._cancel()
         self.todo.notify()
-        self.done.notify()
+        self.feed.notify()
         self.mutex.release()
         self.own_thread.join()
 
-    def call(self, *args, **kwargs):
+    def submit(self, *args, **kwargs):
         """
-        creates a job, execute it in worker thread, and deliver result.
-        if job execution raise exception, re-raise same exception
+        creates a job, and queue it to be executed in worker thread.
+        returns job, whose wait() method delivers result.
         meant to be called by non-worker threads, but this is accepted.
-        blocking until job done
+        blocking only if queue is full
         """
 
         _job = job(*args, **kwargs)
@@ -157,30 +252,49 @@ class worker(object):
         if self._threadID == _thread.get_ident():
             # if caller is worker thread execute immediately
             _job.do()
+            _job.finished.set()
         else:
-            # otherwise notify and wait for completion
+            # otherwise queue job
             self.mutex.acquire()
+            while self.enabled and len(self.jobs) >= self.queue_size:
+                self.free.wait()
+
             if not self.enabled:
                 self.mutex.release()
                 raise EOFError("Worker is disabled")
 
-            while self.job is not None:
-                self.free.wait()
-
-            self.job = _job
+            self.jobs.append(_job)
             self.todo.notify()
-            self.done.wait()
-            self.job = None
-            self.free.notify()
             self.mutex.release()
 
-        if _job.success is None:
-            raise EOFError("Worker job was interrupted")
+        return _job
 
-        if _job.success:
-            return _job.result
-        else:
-            self.reraise(_job)
+    def call(self, *args, **kwargs):
+        """
+        creates a job, execute it in worker thread, and deliver result.
+        if job execution raise exception, re-raise same exception
+        meant to be called by non-worker threads, but this is accepted.
+        blocking until job done
+        """
+        return self.submit(*args, **kwargs).wait()
+
+    def call_shared(self, call, *args, **kwargs):
+        """
+        execute a read-only call in caller's thread, concurrently
+        with other read-only calls, but never while a job is running
+        """
+        if self._threadID == _thread.get_ident():
+            # worker thread is not running a job concurrently
+            return call(*args, **kwargs)
+
+        if not self.enabled:
+            raise EOFError("Worker is disabled")
+
+        self.joblock.acquire_shared()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            self.joblock.release_shared()
 
     def quit(self):
         """
@@ -190,9 +304,8 @@ class worker(object):
         self._finish = True
         self.mutex.acquire()
         self.enabled = False
-        self.job = None
+        self._cancel()
         self.todo.notify()
-        self.done.notify()
         self.mutex.release()
 
     def finish(self):
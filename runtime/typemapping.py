@@ -6,8 +6,11 @@
 
 from __future__ import absolute_import
 import ctypes
+import struct
 from ctypes import *
 from datetime import timedelta as td
+from time import time
+from six.moves import xrange
 
 ctypes.pythonapi.PyString_AsString.argtypes = (ctypes.c_void_p,)
 ctypes.pythonapi.PyString_AsString.restype = ctypes.POINTER(ctypes.c_char)
@@ -77,7 +80,152 @@ TypeTranslator = SameEndianessTypeTranslator
 DebugTypesSize = dict([(key, sizeof(t)) for key, (t, p, u) in SameEndianessTypeTranslator.iteritems() if t is not None])
 
 
+# struct module format of fixed size types, native byte order, no alignment
+_l = "q" if sizeof(c_long) == 8 else "i"
+DebugTypesStructFormat = {
+    "BOOL":       "?",
+    "STEP":       "B",
+    "TRANSITION": "B",
+    "ACTION":     "B",
+    "SINT":       "b",
+    "USINT":      "B",
+    "BYTE":       "B",
+    "INT":        "h",
+    "UINT":       "H",
+    "WORD":       "H",
+    "DINT":       "i",
+    "UDINT":      "I",
+    "DWORD":      "I",
+    "LINT":       "q",
+    "ULINT":      "Q",
+    "LWORD":      "Q",
+    "REAL":       "f",
+    "LREAL":      "d",
+    "TIME":       _l + _l,
+    "TOD":        _l + _l,
+    "DATE":       _l + _l,
+    "DT":         _l + _l,
+    }
+
+# types that take two struct fields : seconds, nanoseconds
+_TimeTypes = ["TIME", "TOD", "DATE", "DT"]
+
+
+def _TimeFromFields(s, ns):
+    return td(0, s, ns/1000.0)
+
+
+def _CompileFixedLayout(indexes):
+    """
+    Return a (Struct, values count, time_fields) tuple decoding given fixed size types
+    at once. time_fields is the set of values to be converted from
+    two fields into timedelta, or None if there is none.
+    """
+    layout = struct.Struct(
+        "=" + "".join([DebugTypesStructFormat[t] for t in indexes]))
+    time_fields = set([i for i, t in enumerate(indexes) if t in _TimeTypes])
+    return layout, len(indexes), (time_fields if time_fields else None)
+
+
+def _UnpackFixedLayout(compiled, buff, offset):
+    layout, count, time_fields = compiled
+    fields = layout.unpack_from(buff, offset)
+    if time_fields is None:
+        return list(fields)
+    res = []
+    field = 0
+    for i in xrange(count):
+        if i in time_fields:
+            res.append(_TimeFromFields(fields[field], fields[field + 1]))
+            field += 2
+        else:
+            res.append(fields[field])
+            field += 1
+    return res
+
+
+def CompileDebugBufferUnpacker(indexes):
+    """
+    Return a function decoding trace buffers holding given types.
+    Runs of fixed size types are decoded by a single precompiled struct,
+    STRINGs are decoded one by one in between.
+    """
+    if not indexes or \
+       any([t != "STRING" and t not in DebugTypesStructFormat
+            for t in indexes]):
+        return lambda buff: None
+
+    # split layout in fixed size runs, separated by STRINGs
+    segments = []
+    run = []
+    for iectype in list(indexes) + [None]:
+        if iectype == "STRING" or iectype is None:
+            if run:
+                segments.append(_CompileFixedLayout(run))
+                run = []
+            if iectype is not None:
+                segments.append(None)
+        else:
+            run.append(iectype)
+
+    if len(segments) == 1 and segments[0] is not None:
+        # only fixed size types, buffer size must be exact
+        compiled = segments[0]
+        size = compiled[0].size
+
+        def UnpackFixed(buff):
+            if len(buff) != size:
+                return None
+            return _UnpackFixedLayout(compiled, buff, 0)
+        return UnpackFixed
+
+    def UnpackSegments(buff):
+        res = []
+        buffoffset = 0
+        buffsize = len(buff)
+        for compiled in segments:
+            if compiled is None:
+                # strlen is stored in one byte, before string body
+                if buffoffset + 1 > buffsize:
+                    return None
+                end = buffoffset + 1 + ord(buff[buffoffset])
+                if end > buffsize:
+                    return None
+                res.append(buff[buffoffset + 1:end])
+                buffoffset = end
+            else:
+                end = buffoffset + compiled[0].size
+                if end > buffsize:
+                    return None
+                res.extend(_UnpackFixedLayout(compiled, buff, buffoffset))
+                buffoffset = end
+        if buffoffset == buffsize:
+            return res
+        return None
+    return UnpackSegments
+
+
+# Compiled trace buffer unpackers, per tuple of traced types
+_DebugBufferUnpackers = {}
+_DebugBufferUnpackersMax = 64
+
+
 def UnpackDebugBuffer(buff, indexes):
+    indexes = tuple(indexes)
+    unpacker = _DebugBufferUnpackers.get(indexes, None)
+    if unpacker is None:
+        if len(_DebugBufferUnpackers) >= _DebugBufferUnpackersMax:
+            _DebugBufferUnpackers.clear()
+        unpacker = CompileDebugBufferUnpacker(indexes)
+        _DebugBufferUnpackers[indexes] = unpacker
+    return unpacker(buff)
+
+
+def UnpackDebugBufferCtypes(buff, indexes):
+    """
+    Reference implementation of UnpackDebugBuffer, decoding variables
+    one by one with ctypes
+    """
     res = []
     buffoffset = 0
     buffsize = len(buff)
@@ -107,3 +255,197 @@ def UnpackDebugBuffer(buff, indexes):
     if buffoffset and buffoffset == buffsize:
         return res
     return None
+
+
+# Trace frame flags, must be changed according to changes in plc_debug.c
+TRACE_FRAME_KEY = 1
+TRACE_FRAME_INCOMPLETE = 2
+
+# Delta encoded trace frame sequence number, after flags byte
+TraceFrameSeq = struct.Struct("=I")
+
+
+# Precompiled struct and time conversion flag of each fixed size type,
+# to decode variables one by one
+_DebugTypesUnpackers = dict([
+    (iectype, (struct.Struct("=" + fmt), iectype in _TimeTypes))
+    for iectype, fmt in DebugTypesStructFormat.iteritems()])
+
+
+class DeltaDebugBufferUnpacker(object):
+    """
+    Incremental decoder for delta encoded trace frames.
+    Each frame starts with flags byte, sequence number and a bitmap of
+    variables given in frame. Last values are kept from frame to frame.
+    Set of variables given changes from frame to frame, they are
+    then decoded one by one with precompiled per type structs.
+    """
+
+    # key frame is asked again if not received after that many seconds
+    KeyFrameRequestPeriod = 1
+
+    def __init__(self, indexes, request_keyframe=None):
+        """
+        @param indexes: types of traced variables
+        @param request_keyframe: callable asking PLC for a key frame,
+        called when frames were lost
+        """
+        self.indexes = indexes
+        self.bitmapsize = (len(indexes) + 7) // 8
+        self.request_keyframe = request_keyframe
+        self.keyframe_requested = None
+        self.values = None
+        self.seq = None
+        if any([t != "STRING" and t not in _DebugTypesUnpackers
+                for t in indexes]):
+            self.unpackers = None
+        else:
+            # None stands for STRING
+            self.unpackers = [_DebugTypesUnpackers.get(t, None)
+                              for t in indexes]
+
+    def _UnpackChanged(self, buff, offset, bitmap):
+        """
+        Return list of (index, value) of variables given in frame,
+        or None if frame is inconsistent
+        """
+        res = []
+        buffsize = len(buff)
+        for i, unpacker in enumerate(self.unpackers):
+            if not bitmap[i >> 3] & (1 << (i & 7)):
+                continue
+            if unpacker is None:
+                # strlen is stored in one byte, before string body
+                if offset + 1 > buffsize:
+                    return None
+                end = offset + 1 + ord(buff[offset])
+                if end > buffsize:
+                    return None
+                value = buff[offset + 1:end]
+            else:
+                layout, is_time = unpacker
+                end = offset + layout.size
+                if end > buffsize:
+                    return None
+                fields = layout.unpack_from(buff, offset)
+                value = _TimeFromFields(*fields) if is_time else fields[0]
+            res.append((i, value))
+            offset = end
+        if offset != buffsize:
+            return None
+        return res
+
+    def _WaitKeyFrame(self):
+        self.values = None
+        if self.request_keyframe is None:
+            return
+        now = time()
+        if self.keyframe_requested is None or \
+           now - self.keyframe_requested > self.KeyFrameRequestPeriod:
+            self.keyframe_requested = now
+            self.request_keyframe()
+
+    def __call__(self, buff):
+        seqoffset = 1 + TraceFrameSeq.size
+        headersize = seqoffset + self.bitmapsize
+        if self.unpackers is None or len(buff) < headersize:
+            return None
+        flags = ord(buff[0])
+        (seq,) = TraceFrameSeq.unpack_from(buff, 1)
+        if flags & TRACE_FRAME_KEY:
+            self.values = [None] * len(self.indexes)
+            self.keyframe_requested = None
+        elif self.values is None or seq != (self.seq + 1) & 0xffffffff:
+            # changes can't be applied before first key frame,
+            # nor after lost frames
+            self.seq = seq
+            self._WaitKeyFrame()
+            return None
+        self.seq = seq
+        changed = self._UnpackChanged(
+            buff, headersize, bytearray(buff[seqoffset:headersize]))
+        if changed is None:
+            # frame is inconsistent, wait for next key frame
+            self._WaitKeyFrame()
+            return None
+        for i, value in changed:
+            self.values[i] = value
+        if flags & TRACE_FRAME_INCOMPLETE:
+            return None
+        return list(self.values)
+
+
+def _SplitDebugBuffer(buff, offset, indexes, bitmap=None):
+    """
+    Return list of variables data in trace frame, None for variables not
+    in frame, or None if frame is inconsistent or holds unknown types
+    @param bitmap: variables given in delta encoded frame, None if frame
+    holds all variables, it may then be truncated
+    """
+    res = []
+    buffsize = len(buff)
+    for i, iectype in enumerate(indexes):
+        if bitmap is not None and not bitmap[i >> 3] & (1 << (i & 7)):
+            res.append(None)
+            continue
+        if offset >= buffsize and bitmap is None:
+            # trace buffer did overflow
+            res.append(None)
+            continue
+        if iectype == "STRING":
+            if offset + 1 > buffsize:
+                return None
+            end = offset + 1 + ord(buff[offset])
+        elif iectype in DebugTypesSize:
+            end = offset + DebugTypesSize[iectype]
+        else:
+            return None
+        if end > buffsize:
+            if bitmap is not None:
+                return None
+            res.append(None)
+            offset = buffsize
+            continue
+        res.append(buff[offset:end])
+        offset = end
+    if offset != buffsize:
+        return None
+    return res
+
+
+def SubsetDebugBuffer(buff, indexes, positions, delta):
+    """
+    Make trace frame holding only some of traced variables, so that
+    several consumers tracing different variables can share PLC traces
+    @param indexes: types of variables in given frame
+    @param positions: positions in indexes of variables to keep, in order
+    @param delta: frames are delta encoded
+    @return: new frame data, or None if frame can't be decoded
+    """
+    if not delta:
+        values = _SplitDebugBuffer(buff, 0, indexes)
+        if values is None:
+            return None
+        res = []
+        for pos in positions:
+            if values[pos] is None:
+                # incomplete frame stays incomplete
+                break
+            res.append(values[pos])
+        return b"".join(res)
+
+    seqoffset = 1 + TraceFrameSeq.size
+    headersize = seqoffset + (len(indexes) + 7) // 8
+    if len(buff) < headersize:
+        return None
+    values = _SplitDebugBuffer(
+        buff, headersize, indexes, bytearray(buff[seqoffset:headersize]))
+    if values is None:
+        return None
+    bitmap = bytearray((len(positions) + 7) // 8)
+    res = []
+    for i, pos in enumerate(positions):
+        if values[pos] is not None:
+            bitmap[i >> 3] |= 1 << (i & 7)
+            res.append(values[pos])
+    return buff[:seqoffset] + bytes(bitmap) + b"".join(res)
@@ -527,6 +527,10 @@ class SVGHMI(object):
             enable_watchdog=enable_watchdog,
             url=url)
 
+    def CTNExclusiveResources(self):
+        # port is released asynchronously when python code of running PLC stops
+        return ["tcp:%s" % self.GetParamsAttributes("SVGHMI.Port")["value"]]
+
     def CTNGenerate_C(self, buildpath, locations):
         global hmi_tree_root
 
@@ -33,9 +33,12 @@ class Linux_target(toolchain_gcc):
 
     def getBuilderCFLAGS(self):
         additional_cflags = ["-fPIC"]
-        build_for_realtime = self.CTRInstance.GetTarget().getcontent().getRealTime()
+        target = self.CTRInstance.GetTarget().getcontent()
+        build_for_realtime = target.getRealTime()
         if build_for_realtime:
             additional_cflags.append("-DREALTIME_LINUX")
+        if target.getMmapRetain():
+            additional_cflags.append("-DRETAIN_MMAP")
         return toolchain_gcc.getBuilderCFLAGS(self) + additional_cflags
 
     def getBuilderLDFLAGS(self):
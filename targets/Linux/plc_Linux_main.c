@@ -4,6 +4,7 @@
 
 #include <stdio.h>
 #include <string.h>
+#include <stdint.h>
 #include <time.h>
 #include <signal.h>
 #include <stdlib.h>
@@ -98,6 +99,100 @@ int ForceSaveRetainReq(void) {
     return PLC_shutdown;
 }
 
+/* PLC thread cycle statistics, since PLC started.
+ * Histograms count durations in log2 buckets : bucket i holds
+ * durations from 2^i to 2^(i+1)-1 ns.
+ * Must be changed according to changes in runtime/PLCObject.py */
+#define CYCLE_STATS_HISTOGRAM_SIZE 32
+
+typedef struct cycle_time_stats_s {
+    uint64_t min_ns;
+    uint64_t max_ns;
+    uint64_t total_ns;
+    uint32_t histogram[CYCLE_STATS_HISTOGRAM_SIZE];
+} cycle_time_stats_t;
+
+typedef struct cycle_stats_s {
+    uint64_t period_ns;
+    uint64_t cycles;
+    /* cycles that lasted more than period, and cycles skipped because of them */
+    uint64_t overruns;
+    uint64_t skipped_cycles;
+    /* cycles started more than MAX_JITTER after their time */
+    uint64_t late_wakeups;
+    /* time spent in __run */
+    cycle_time_stats_t execution;
+    /* delay between cycle time and PLC thread wake-up */
+    cycle_time_stats_t latency;
+} cycle_stats_t;
+
+/* Only written by PLC thread. Sequence number is odd while stats are
+ * being updated, so that readers retry instead of blocking PLC thread */
+static cycle_stats_t cycle_stats;
+static volatile unsigned long cycle_stats_sequence = 0;
+
+static void ResetCycleStats(void)
+{
+    memset(&cycle_stats, 0, sizeof(cycle_stats));
+    cycle_stats.execution.min_ns = UINT64_MAX;
+    cycle_stats.latency.min_ns = UINT64_MAX;
+}
+
+static long long timespec_diff_ns(struct timespec *a, struct timespec *b)
+{
+    return ((long long)(a->tv_sec - b->tv_sec)) * 1000000000 + (a->tv_nsec - b->tv_nsec);
+}
+
+static void update_cycle_time_stats(cycle_time_stats_t *stats, long long ns)
+{
+    unsigned int bucket;
+
+    if(ns < 0)
+        ns = 0;
+    if((uint64_t)ns < stats->min_ns)
+        stats->min_ns = ns;
+    if((uint64_t)ns > stats->max_ns)
+        stats->max_ns = ns;
+    stats->total_ns += ns;
+    bucket = ns > 1 ? 63 - __builtin_clzll(ns) : 0;
+    if(bucket >= CYCLE_STATS_HISTOGRAM_SIZE)
+        bucket = CYCLE_STATS_HISTOGRAM_SIZE - 1;
+    stats->histogram[bucket]++;
+}
+
+static void UpdateCycleStats(long long latency_ns, long long execution_ns, int periods, int late)
+{
+    cycle_stats_sequence++;
+    __sync_synchronize();
+
+    cycle_stats.period_ns = period_ns;
+    cycle_stats.cycles++;
+    if(periods > 1){
+        cycle_stats.overruns++;
+        cycle_stats.skipped_cycles += periods - 1;
+    }
+    if(late)
+        cycle_stats.late_wakeups++;
+    update_cycle_time_stats(&cycle_stats.latency, latency_ns);
+    update_cycle_time_stats(&cycle_stats.execution, execution_ns);
+
+    __sync_synchronize();
+    cycle_stats_sequence++;
+}
+
+/* Copy cycle statistics, consistent with each other */
+void GetCycleStats(cycle_stats_t *stats)
+{
+    unsigned long sequence;
+
+    do{
+        sequence = cycle_stats_sequence;
+        __sync_synchronize();
+        memcpy(stats, &cycle_stats, sizeof(cycle_stats));
+        __sync_synchronize();
+    }while((sequence & 1) || sequence != cycle_stats_sequence);
+}
+
 #define MAX_JITTER period_ns/10
 #define MIN_IDLE_TIME_NS 1000000 /* 1ms */
 /* Macro to compare timespec, evaluate to True if a is past b */
@@ -112,10 +207,10 @@ void PLC_thread_proc(void *arg)
         int res;
         struct timespec plc_end_time;
         int periods = 0;
-#ifdef REALTIME_LINUX
         struct timespec deadline_time;
         struct timespec plc_start_time;
-#endif
+        struct timespec cycle_time;
+        int late;
 
 // BEREMIZ_TEST_CYCLES is defined in tests that need to emulate time:
 // - all BEREMIZ_TEST_CYCLES cycles are executed in a row with no pause
@@ -133,12 +228,14 @@ void PLC_thread_proc(void *arg)
         }
 #endif // BEREMIZ_TEST_CYCLES
 
-#ifdef REALTIME_LINUX
         // timer overrun detection
         clock_gettime(CLOCK_MONOTONIC, &plc_start_time);
+        cycle_time = next_cycle_time;
         deadline_time=next_cycle_time;
         inc_timespec(&deadline_time, MAX_JITTER);
-        if(timespec_gt(plc_start_time, deadline_time)){
+        late = timespec_gt(plc_start_time, deadline_time);
+#ifdef REALTIME_LINUX
+        if(late){
             _LogWarning("PLC thread woken up too late. PLC cyclic task interval is too small.\n");
         }
 #endif
@@ -190,21 +287,47 @@ void PLC_thread_proc(void *arg)
 
             _LogWarning("PLC execution time is longer than requested PLC cyclic task interval. %d cycles skipped\n", periods);
         }
+
+#ifndef BEREMIZ_TEST_CYCLES
+        UpdateCycleStats(timespec_diff_ns(&plc_start_time, &cycle_time),
+                         timespec_diff_ns(&plc_end_time, &plc_start_time),
+                         periods, late);
+#endif
     }
 
     pthread_exit(0);
 }
 
+/* PLC thread attributes, kept to start thread again after haltPLC */
+static pthread_attr_t *PLC_thread_attr = NULL;
+#ifdef REALTIME_LINUX
+static pthread_attr_t attr;
+#endif
+
+int initPLC(int argc,char **argv);
+int runPLC(void);
+
 #define maxval(a,b) ((a>b)?a:b)
 int startPLC(int argc,char **argv)
 {
-
     int ret;
+
+    if((ret = initPLC(argc,argv)) == 0 ){
+        ret = runPLC();
+    }
+    return ret;
+}
+
+/* Initialize PLC, without starting PLC thread.
+ * Used by runtime to initialize new PLC while previous one is halted */
+int initPLC(int argc,char **argv)
+{
+
 	pthread_attr_t *pattr = NULL;
 
 #ifdef REALTIME_LINUX
+    int ret;
 	struct sched_param param;
-	pthread_attr_t attr;
 
     /* Lock memory */
     ret = mlockall(MCL_CURRENT|MCL_FUTURE);
@@ -243,8 +366,12 @@ int startPLC(int argc,char **argv)
 	pattr = &attr;
 #endif
 
+    PLC_thread_attr = pattr;
+
     PLC_shutdown = 0;
 
+    ResetCycleStats();
+
     pthread_mutex_init(&debug_wait_mutex, NULL);
     pthread_mutex_init(&debug_mutex, NULL);
     pthread_mutex_init(&python_wait_mutex, NULL);
@@ -253,26 +380,33 @@ int startPLC(int argc,char **argv)
     pthread_mutex_lock(&debug_wait_mutex);
     pthread_mutex_lock(&python_wait_mutex);
 
-    if((ret = __init(argc,argv)) == 0 ){
-
-        /* Signal to wakeup PLC thread when period changes */
-        signal(SIGUSR1, PLCThreadSignalHandler);
-        /* Signal to end PLC thread */
-        signal(SIGUSR2, PLCThreadSignalHandler);
-        /* install signal handler for manual break */
-        signal(SIGINT, catch_signal);
-
-        ret = pthread_create(&PLC_thread, pattr, (void*) &PLC_thread_proc, NULL);
-		if (ret) {
-			_LogError("create pthread failed\n");
-			return ret;
-		}
-    }else{
+    return __init(argc,argv);
+}
+
+/* Start PLC thread, after initPLC, or haltPLC */
+int runPLC(void)
+{
+    int ret;
+
+    PLC_shutdown = 0;
+
+    /* Signal to wakeup PLC thread when period changes */
+    signal(SIGUSR1, PLCThreadSignalHandler);
+    /* Signal to end PLC thread */
+    signal(SIGUSR2, PLCThreadSignalHandler);
+    /* install signal handler for manual break */
+    signal(SIGINT, catch_signal);
+
+    ret = pthread_create(&PLC_thread, PLC_thread_attr, (void*) &PLC_thread_proc, NULL);
+    if (ret) {
+        _LogError("create pthread failed\n");
         return ret;
     }
     return 0;
 }
 
+void cleanupPLC(void);
+
 int TryEnterDebugSection(void)
 {
     if (pthread_mutex_trylock(&debug_mutex) == 0){
@@ -297,12 +431,27 @@ int stopPLC()
     /* Order PLCThread to exit */
     pthread_kill(PLC_thread, SIGUSR2);
     pthread_join(PLC_thread, NULL);
+    cleanupPLC();
+    return 0;
+}
+
+/* Stop PLC thread once current cycle is over, keeping PLC state,
+ * so that PLC can be resumed with runPLC, or cleaned up */
+void haltPLC(void)
+{
+    PLC_shutdown = 1;
+    /* interrupt sleep, thread leaves at end of cycle otherwise */
+    pthread_kill(PLC_thread, SIGUSR1);
+    pthread_join(PLC_thread, NULL);
+}
+
+void cleanupPLC(void)
+{
     __cleanup();
     pthread_mutex_destroy(&debug_wait_mutex);
     pthread_mutex_destroy(&debug_mutex);
     pthread_mutex_destroy(&python_wait_mutex);
     pthread_mutex_destroy(&python_mutex);
-    return 0;
 }
 
 extern unsigned long __tick;
@@ -321,10 +470,16 @@ int WaitDebugData(unsigned long *tick)
  * This is supposed to unlock debugger thread in WaitDebugData*/
 void InitiateDebugTransfer()
 {
+    int res;
     /* remember tick */
     __debug_tick = __tick;
-    /* signal debugger thread it can read data */
-    pthread_mutex_unlock(&debug_wait_mutex);
+    /* signal debugger thread it can read data.
+     * Frames can be published faster than debugger thread waits for
+     * them, mutex may then be already unlocked : only unlock it once
+     * locked, either by debugger thread or by this try */
+    res = pthread_mutex_trylock(&debug_wait_mutex);
+    if (res == 0 || res == EBUSY)
+        pthread_mutex_unlock(&debug_wait_mutex);
 }
 
 int suspendDebug(int disable)
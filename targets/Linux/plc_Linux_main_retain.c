@@ -17,24 +17,6 @@
 
 int GetRetainSize(void);
 
-/* Retain buffer.  */
-FILE *retain_buffer;
-const char rb_file[]      = "retain_buffer_file";
-const char rb_file_bckp[] = "retain_buffer_file.bak";
-
-
-/* Retain header struct.  */
-struct retain_info_t {
-	uint32_t retain_size;
-	uint32_t hash_size;
-	uint8_t* hash;
-	uint32_t header_offset;
-	uint32_t header_crc;
-};
-
-/* Init retain info structure.  */
-struct retain_info_t retain_info;
-
 /* CRC lookup table and initial state.  */
 static const uint32_t crc32_table[256] = {
 	0x00000000, 0x77073096, 0xEE0E612C, 0x990951BA, 0x076DC419, 0x706AF48F, 0xE963A535, 0x9E6495A3,
@@ -70,7 +52,6 @@ static const uint32_t crc32_table[256] = {
 	0xBDBDF21C, 0xCABAC28A, 0x53B39330, 0x24B4A3A6, 0xBAD03605, 0xCDD70693, 0x54DE5729, 0x23D967BF,
 	0xB3667A2E, 0xC4614AB8, 0x5D681B02, 0x2A6F2B94, 0xB40BBE37, 0xC30C8EA1, 0x5A05DF1B, 0x2D02EF8D,
 };
-uint32_t retain_crc;
 
 
 /* Calculate CRC32 for len bytes from pointer buf with init starting value.  */
@@ -83,6 +64,51 @@ uint32_t GenerateCRC32Sum(const void* buf, unsigned int len, uint32_t init)
 	return ~crc;
 }
 
+#ifndef FILE_RETAIN_SAVE_PERIOD_S
+#define FILE_RETAIN_SAVE_PERIOD_S 1.0
+#endif
+
+static double CalcDiffSeconds(IEC_TIME* t1, IEC_TIME *t2)
+{
+	IEC_TIME dt ={
+		t1->tv_sec  - t2->tv_sec,
+		t1->tv_nsec - t2->tv_nsec
+	};
+
+	if ((dt.tv_nsec < -1000000000) || ((dt.tv_sec > 0) && (dt.tv_nsec < 0))){
+		dt.tv_sec--;
+		dt.tv_nsec += 1000000000;
+	}
+	if ((dt.tv_nsec > +1000000000) || ((dt.tv_sec < 0) && (dt.tv_nsec > 0))){
+		dt.tv_sec++;
+		dt.tv_nsec -= 1000000000;
+	}
+	return dt.tv_sec + 1e-9*dt.tv_nsec;
+}
+
+/* Memory mapped retain backend is in plc_Linux_main_retain_mmap.c */
+#ifndef RETAIN_MMAP
+
+/* Retain buffer.  */
+FILE *retain_buffer;
+const char rb_file[]      = "retain_buffer_file";
+const char rb_file_bckp[] = "retain_buffer_file.bak";
+
+
+/* Retain header struct.  */
+struct retain_info_t {
+	uint32_t retain_size;
+	uint32_t hash_size;
+	uint8_t* hash;
+	uint32_t header_offset;
+	uint32_t header_crc;
+};
+
+/* Init retain info structure.  */
+struct retain_info_t retain_info;
+
+uint32_t retain_crc;
+
 /* Calc CRC32 for retain file byte by byte.  */
 int CheckFileCRC(FILE* file_buffer)
 {
@@ -209,29 +235,6 @@ int CheckRetainBuffer(void)
 	return 0;
 }
 
-#ifndef FILE_RETAIN_SAVE_PERIOD_S
-#define FILE_RETAIN_SAVE_PERIOD_S 1.0
-#endif
-
-static double CalcDiffSeconds(IEC_TIME* t1, IEC_TIME *t2)
-{
-	IEC_TIME dt ={
-		t1->tv_sec  - t2->tv_sec,
-		t1->tv_nsec - t2->tv_nsec
-	};
-
-	if ((dt.tv_nsec < -1000000000) || ((dt.tv_sec > 0) && (dt.tv_nsec < 0))){
-		dt.tv_sec--;
-		dt.tv_nsec += 1000000000;
-	}
-	if ((dt.tv_nsec > +1000000000) || ((dt.tv_sec < 0) && (dt.tv_nsec > 0))){
-		dt.tv_sec++;
-		dt.tv_nsec -= 1000000000;
-	}
-	return dt.tv_sec + 1e-9*dt.tv_nsec;
-}
-
-
 int RetainSaveNeeded(void)
 {
 	int ret = 0;
@@ -275,10 +278,12 @@ void ValidateRetainBuffer(void)
 	retain_buffer = NULL;
 }
 
-void InValidateRetainBuffer(void)
+/* Retain file is created again on each save, so that
+   all retained variables must be given to Retain.  */
+int InValidateRetainBufferMode(void)
 {
 	if (!RetainSaveNeeded())
-		return;
+		return RETAIN_SAVE_NONE;
 
 	/* Rename old retain file into *.bak if it exists.  */
 	rename(rb_file, rb_file_bckp);
@@ -290,7 +295,7 @@ void InValidateRetainBuffer(void)
 	retain_buffer = fopen(rb_file, "wb+");
 	if (!retain_buffer) {
 		fprintf(stderr, "Failed to create retain file : %s\n", rb_file);
-		return;
+		return RETAIN_SAVE_NONE;
 	}
 
 	/* Write header to the new file.  */
@@ -300,6 +305,13 @@ void InValidateRetainBuffer(void)
 		sizeof(retain_info.hash_size),   1, retain_buffer);
 	fwrite(retain_info.hash ,
 		sizeof(char), retain_info.hash_size, retain_buffer);
+
+	return RETAIN_SAVE_FULL;
+}
+
+void InValidateRetainBuffer(void)
+{
+	InValidateRetainBufferMode();
 }
 
 void Retain(unsigned int offset, unsigned int count, void *p)
@@ -322,4 +334,5 @@ void Remind(unsigned int offset, unsigned int count, void *p)
 	fseek(retain_buffer, retain_info.header_offset+offset, SEEK_SET);
 	ret = fread((void *)p, count, 1, retain_buffer);
 }
+#endif // !RETAIN_MMAP
 #endif // !HAVE_RETAIN
@@ -0,0 +1,399 @@
+/*
+  This file is part of Beremiz, a Integrated Development Environment for
+  programming IEC 61131-3 automates supporting plcopen standard and CanFestival.
+
+  See COPYING.runtime
+
+  Memory mapped retain backend, enabled with RETAIN_MMAP.
+
+  Retain file holds two slots, A and B, each made of a header with
+  a sequence number, retained data, and CRC32 of whole slot. Slot with
+  valid CRC and highest sequence number is the one reminded at startup.
+
+  PLC cycle only copies retained variables into a RAM snapshot buffer.
+  Snapshot is then written to the oldest slot and synced to disk by a
+  non real-time thread, so that retain I/O never blocks PLC thread.
+  A torn write can only damage slot being written, other one stays valid.
+
+  Only changed variables are given to Retain, except on first save.
+  Blocks of snapshot they belong to are marked dirty, and each slot keeps
+  track of blocks changed since it was written, so that only these are
+  copied to slot, and only pages holding them are written back to disk.
+*/
+
+#if !defined(HAVE_RETAIN) && defined(RETAIN_MMAP)
+#include <stdio.h>
+#include <stdint.h>
+#include <string.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <pthread.h>
+#include <semaphore.h>
+#include <sys/mman.h>
+#include "iec_types.h"
+
+#define RETAIN_SLOT_MAGIC 0x52455431 /* "RET1" */
+
+/* Granularity of dirty tracking, in bytes */
+#define RETAIN_BLOCK_SIZE 64
+
+const char rb_file[] = "retain_buffer_mmap";
+
+/* Header at beginning of each slot, followed by PLC hash,
+   retained data and CRC32 of header, hash and data.  */
+struct retain_slot_header_t {
+	uint32_t magic;
+	uint32_t sequence;
+	uint32_t retain_size;
+	uint32_t hash_size;
+};
+
+struct retain_info_t {
+	uint32_t retain_size;
+	uint32_t hash_size;
+	uint8_t* hash;
+	/* size of header, hash and data, CRC being stored after them */
+	uint32_t crc_offset;
+	/* slots size, rounded to page size */
+	size_t slot_size;
+	/* number of blocks of retained data */
+	uint32_t blocks_count;
+};
+
+struct retain_info_t retain_info;
+
+/* Mapped retain file, NULL if retain is disabled or file can't be mapped.  */
+static uint8_t *retain_map = NULL;
+/* Retained data collected by PLC thread, read by flush thread.  */
+static uint8_t *retain_snapshot = NULL;
+/* Slot holding latest valid data, and its sequence number.  */
+static int retain_slot = -1;
+static uint32_t retain_sequence = 0;
+
+/* Bitmaps of blocks : changed in snapshot since it was last given
+   to flush thread, and not up to date in each slot.  */
+static uint8_t *retain_dirty = NULL;
+static uint8_t *retain_stale[2] = {NULL, NULL};
+/* Set until a save of all variables is done.  */
+static int retain_full_needed = 1;
+
+/* Set while PLC thread collects retained data for current cycle.  */
+static int retain_collecting = 0;
+/* Set by PLC thread once snapshot is complete,
+   reset by flush thread once snapshot is synced to disk.  */
+static long retain_flush_pending = 0;
+static int retain_flush_quit = 0;
+static sem_t retain_flush_sem;
+static pthread_t retain_flush_thread;
+static int retain_flush_thread_started = 0;
+
+static uint8_t *GetSlot(int slot)
+{
+	return retain_map + slot * retain_info.slot_size;
+}
+
+/* Return sequence number of slot if its content is valid
+   for that PLC, or -1 otherwise.  */
+static int64_t CheckSlot(int slot)
+{
+	uint8_t *p = GetSlot(slot);
+	struct retain_slot_header_t header;
+	uint32_t crc;
+
+	memcpy(&header, p, sizeof(header));
+	if (header.magic != RETAIN_SLOT_MAGIC ||
+	    header.retain_size != retain_info.retain_size ||
+	    header.hash_size != retain_info.hash_size)
+		return -1;
+
+	/* CRC over whole slot at once, slot being already in memory.  */
+	memcpy(&crc, p + retain_info.crc_offset, sizeof(crc));
+	if (GenerateCRC32Sum(p, retain_info.crc_offset, 0) != crc)
+		return -1;
+
+	if (memcmp(p + sizeof(header), retain_info.hash, retain_info.hash_size))
+		return -1;
+
+	return header.sequence;
+}
+
+/* Write snapshot in slot not holding latest data, and sync it.  */
+static void StoreSnapshot(void)
+{
+	int slot = retain_slot == 0 ? 1 : 0;
+	uint8_t *p = GetSlot(slot);
+	uint8_t *data = p + sizeof(struct retain_slot_header_t) + retain_info.hash_size;
+	uint8_t *stale = retain_stale[slot];
+	struct retain_slot_header_t header = {
+		RETAIN_SLOT_MAGIC,
+		retain_sequence + 1,
+		retain_info.retain_size,
+		retain_info.hash_size
+	};
+	uint32_t crc;
+	uint32_t i;
+
+	/* changes in snapshot are missing in both slots */
+	for (i = 0; i < (retain_info.blocks_count + 7) / 8; i++) {
+		retain_stale[0][i] |= retain_dirty[i];
+		retain_stale[1][i] |= retain_dirty[i];
+		retain_dirty[i] = 0;
+	}
+
+	memcpy(p, &header, sizeof(header));
+	memcpy(p + sizeof(header), retain_info.hash, retain_info.hash_size);
+	for (i = 0; i < retain_info.blocks_count; i++) {
+		if (stale[i >> 3] & (1 << (i & 7))) {
+			uint32_t offset = i * RETAIN_BLOCK_SIZE;
+			uint32_t size = retain_info.retain_size - offset;
+			if (size > RETAIN_BLOCK_SIZE)
+				size = RETAIN_BLOCK_SIZE;
+			memcpy(data + offset, retain_snapshot + offset, size);
+		}
+	}
+	memset(stale, 0, (retain_info.blocks_count + 7) / 8);
+	crc = GenerateCRC32Sum(p, retain_info.crc_offset, 0);
+	memcpy(p + retain_info.crc_offset, &crc, sizeof(crc));
+
+	/* only pages written above are written back to disk */
+	if (msync(p, retain_info.slot_size, MS_SYNC)) {
+		fprintf(stderr, "Failed to sync retain file : %s\n", rb_file);
+		/* slot content is unknown */
+		memset(stale, 0xff, (retain_info.blocks_count + 7) / 8);
+		return;
+	}
+
+	retain_slot = slot;
+	retain_sequence++;
+}
+
+static void *RetainFlushThreadProc(void *arg)
+{
+	while (1) {
+		while (sem_wait(&retain_flush_sem) != 0);
+		if (retain_flush_quit)
+			break;
+		StoreSnapshot();
+		AtomicCompareExchange(&retain_flush_pending, 1, 0);
+	}
+	return NULL;
+}
+
+void InitRetain(void)
+{
+	int i;
+	size_t page_size = sysconf(_SC_PAGESIZE);
+
+	retain_info.retain_size = GetRetainSize();
+
+	/* Hash stored in retain file as array of char in hex digits
+	   (that's why we divide strlen in two).  */
+	retain_info.hash_size = PLC_ID ? strlen(PLC_ID)/2 : 0;
+	retain_info.hash = malloc(retain_info.hash_size);
+
+	/* Transform hash string into byte sequence.  */
+	for (i = 0; i < retain_info.hash_size; i++) {
+		int byte = 0;
+		sscanf((PLC_ID + i*2), "%02X", &byte);
+		retain_info.hash[i] = byte;
+	}
+
+	retain_info.crc_offset = sizeof(struct retain_slot_header_t) + \
+		retain_info.hash_size + \
+		retain_info.retain_size;
+
+	retain_info.slot_size = (retain_info.crc_offset + sizeof(uint32_t) + \
+		page_size - 1) / page_size * page_size;
+
+	retain_info.blocks_count = (retain_info.retain_size + \
+		RETAIN_BLOCK_SIZE - 1) / RETAIN_BLOCK_SIZE;
+
+	retain_map = NULL;
+	retain_slot = -1;
+	retain_sequence = 0;
+	retain_collecting = 0;
+	retain_flush_pending = 0;
+	retain_flush_quit = 0;
+	retain_flush_thread_started = 0;
+	retain_full_needed = 1;
+}
+
+void CleanupRetain(void)
+{
+	if (retain_flush_thread_started) {
+		retain_flush_quit = 1;
+		sem_post(&retain_flush_sem);
+		pthread_join(retain_flush_thread, NULL);
+		sem_destroy(&retain_flush_sem);
+		retain_flush_thread_started = 0;
+		/* store snapshot collected while flush thread was leaving */
+		if (retain_flush_pending) {
+			StoreSnapshot();
+			retain_flush_pending = 0;
+		}
+	}
+
+	if (retain_map) {
+		munmap(retain_map, 2 * retain_info.slot_size);
+		retain_map = NULL;
+	}
+	free(retain_snapshot);
+	retain_snapshot = NULL;
+	free(retain_dirty);
+	retain_dirty = NULL;
+	free(retain_stale[0]);
+	retain_stale[0] = NULL;
+	free(retain_stale[1]);
+	retain_stale[1] = NULL;
+	free(retain_info.hash);
+	retain_info.hash = NULL;
+}
+
+/* Map retain file, and load latest valid slot into snapshot buffer.  */
+int CheckRetainBuffer(void)
+{
+	int fd;
+	int slot;
+	int64_t sequence, best = -1;
+	size_t map_size = 2 * retain_info.slot_size;
+
+	if (!retain_info.retain_size)
+		return 1;
+
+	retain_snapshot = calloc(1, retain_info.retain_size);
+	retain_dirty = calloc(1, (retain_info.blocks_count + 7) / 8);
+	/* content of slots is unknown yet */
+	retain_stale[0] = malloc((retain_info.blocks_count + 7) / 8);
+	retain_stale[1] = malloc((retain_info.blocks_count + 7) / 8);
+	if (!retain_snapshot || !retain_dirty || !retain_stale[0] || !retain_stale[1])
+		return 0;
+	memset(retain_stale[0], 0xff, (retain_info.blocks_count + 7) / 8);
+	memset(retain_stale[1], 0xff, (retain_info.blocks_count + 7) / 8);
+
+	fd = open(rb_file, O_RDWR | O_CREAT, 0644);
+	if (fd == -1) {
+		fprintf(stderr, "Failed to open retain file : %s\n", rb_file);
+		return 0;
+	}
+	/* file only grows, since PLC being hot reloaded may still map it */
+	if (lseek(fd, 0, SEEK_END) < (off_t)map_size && ftruncate(fd, map_size)) {
+		fprintf(stderr, "Failed to resize retain file : %s\n", rb_file);
+		close(fd);
+		return 0;
+	}
+	retain_map = mmap(NULL, map_size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+	close(fd);
+	if (retain_map == MAP_FAILED) {
+		fprintf(stderr, "Failed to map retain file : %s\n", rb_file);
+		retain_map = NULL;
+		return 0;
+	}
+
+	for (slot = 0; slot < 2; slot++) {
+		sequence = CheckSlot(slot);
+		/* sequence numbers are compared modulo 2^32 */
+		if (sequence >= 0 && (best < 0 ||
+		    (int32_t)((uint32_t)sequence - (uint32_t)best) > 0)) {
+			best = sequence;
+			retain_slot = slot;
+		}
+	}
+
+	if (sem_init(&retain_flush_sem, 0, 0) == 0) {
+		if (pthread_create(&retain_flush_thread, NULL,
+		                   RetainFlushThreadProc, NULL) == 0)
+			retain_flush_thread_started = 1;
+		else
+			sem_destroy(&retain_flush_sem);
+	}
+	if (!retain_flush_thread_started)
+		fprintf(stderr, "Failed to start retain flush thread\n");
+
+	if (retain_slot < 0)
+		return 0;
+
+	retain_sequence = best;
+	memcpy(retain_snapshot,
+	       GetSlot(retain_slot) + sizeof(struct retain_slot_header_t) + retain_info.hash_size,
+	       retain_info.retain_size);
+	return 1;
+}
+
+static int RetainSaveNeeded(void)
+{
+	static IEC_TIME last_save;
+	IEC_TIME now;
+
+	PLC_GetTime(&now);
+
+	if ((CalcDiffSeconds(&now, &last_save) > FILE_RETAIN_SAVE_PERIOD_S) ||
+	    ForceSaveRetainReq()) {
+		last_save = now;
+		return 1;
+	}
+	return 0;
+}
+
+/* Snapshot keeps previous values, so that only changed
+   variables have to be given to Retain.  */
+int InValidateRetainBufferMode(void)
+{
+	retain_collecting = 0;
+
+	if (!retain_flush_thread_started || !retain_map)
+		return RETAIN_SAVE_NONE;
+
+	/* flush thread still busy with previous snapshot */
+	if (AtomicCompareExchange(&retain_flush_pending, 0, 0)) {
+		if (!ForceSaveRetainReq())
+			return RETAIN_SAVE_NONE;
+		/* PLC stops after this cycle, that must be saved anyway :
+		   wait for flush thread to release snapshot */
+		while (AtomicCompareExchange(&retain_flush_pending, 0, 0))
+			usleep(1000);
+	}
+
+	if (!RetainSaveNeeded())
+		return RETAIN_SAVE_NONE;
+
+	retain_collecting = 1;
+	if (retain_full_needed) {
+		retain_full_needed = 0;
+		return RETAIN_SAVE_FULL;
+	}
+	return RETAIN_SAVE_CHANGED;
+}
+
+void InValidateRetainBuffer(void)
+{
+	InValidateRetainBufferMode();
+}
+
+void Retain(unsigned int offset, unsigned int count, void *p)
+{
+	unsigned int block;
+
+	if (!retain_collecting || !count)
+		return;
+
+	memcpy(retain_snapshot + offset, p, count);
+	for (block = offset / RETAIN_BLOCK_SIZE;
+	     block <= (offset + count - 1) / RETAIN_BLOCK_SIZE; block++)
+		retain_dirty[block >> 3] |= 1 << (block & 7);
+}
+
+void ValidateRetainBuffer(void)
+{
+	if (!retain_collecting)
+		return;
+
+	retain_collecting = 0;
+	AtomicCompareExchange(&retain_flush_pending, 0, 1);
+	sem_post(&retain_flush_sem);
+}
+
+void Remind(unsigned int offset, unsigned int count, void *p)
+{
+	memcpy(p, retain_snapshot + offset, count);
+}
+#endif // !HAVE_RETAIN && RETAIN_MMAP
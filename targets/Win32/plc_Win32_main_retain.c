@@ -275,10 +275,12 @@ void ValidateRetainBuffer(void)
 	retain_buffer = NULL;
 }
 
-void InValidateRetainBuffer(void)
+/* Retain file is created again on each save, so that
+   all retained variables must be given to Retain.  */
+int InValidateRetainBufferMode(void)
 {
 	if (!RetainSaveNeeded())
-		return;
+		return RETAIN_SAVE_NONE;
 
 	/* Rename old retain file into *.bak if it exists.  */
 	rename(rb_file, rb_file_bckp);
@@ -290,7 +292,7 @@ void InValidateRetainBuffer(void)
 	retain_buffer = fopen(rb_file, "wb+");
 	if (!retain_buffer) {
 		fprintf(stderr, "Failed to create retain file : %s\n", rb_file);
-		return;
+		return RETAIN_SAVE_NONE;
 	}
 
 	/* Write header to the new file.  */
@@ -300,6 +302,13 @@ void InValidateRetainBuffer(void)
 		sizeof(retain_info.hash_size),   1, retain_buffer);
 	fwrite(retain_info.hash ,
 		sizeof(char), retain_info.hash_size, retain_buffer);
+
+	return RETAIN_SAVE_FULL;
+}
+
+void InValidateRetainBuffer(void)
+{
+	InValidateRetainBufferMode();
 }
 
 void Retain(unsigned int offset, unsigned int count, void *p)
@@ -455,6 +455,11 @@ void ValidateRetainBuffer(void)
 {
 }
 
+int InValidateRetainBufferMode(void)
+{
+	return RETAIN_SAVE_NONE;
+}
+
 void InValidateRetainBuffer(void)
 {
 }
@@ -32,6 +32,20 @@ int wait_RT_to_nRT_signal(void* handle);
 int unblock_RT_to_nRT_signal(void* handle);
 void nRT_reschedule(void);
 
+/* Retain backend, implemented by target code.
+ * InValidateRetainBuffer starts a save that is given all retained
+ * variables with Retain, then ended with ValidateRetainBuffer. */
+void InValidateRetainBuffer(void);
+void Retain(unsigned int offset, unsigned int count, void *p);
+void ValidateRetainBuffer(void);
+
+/* Returned by retain backend's InValidateRetainBufferMode : no save in that
+ * cycle, save of all retained variables, or of changed ones only */
+#define RETAIN_SAVE_NONE    0
+#define RETAIN_SAVE_FULL    1
+#define RETAIN_SAVE_CHANGED 2
+int InValidateRetainBufferMode(void);
+
 
 #ifdef REALTIME_LINUX
 
@@ -1,12 +1,13 @@
 /*
  * DEBUGGER code
  * 
- * On "publish", when buffer is free, debugger stores arbitrary variables 
- * content into, and mark this buffer as filled
+ * On "publish", when a frame of the trace ring is free, debugger stores
+ * arbitrary variables content into it, stamps it with current tick,
+ * and mark this frame as filled
  * 
  * 
- * Buffer content is read asynchronously, (from non real time part), 
- * and then buffer marked free again.
+ * Ring content is read asynchronously, (from non real time part), 
+ * and then frames are marked free again.
  *  
  * 
  * */
@@ -16,6 +17,7 @@ void __init_debug    (void){}
 void __cleanup_debug (void){}
 void __retrieve_debug(void){}
 void __publish_debug (void){}
+int GetRetainVariable(unsigned int i, char **name, void **value_p, unsigned int *size){return 0;}
 
 #else
 
@@ -24,40 +26,104 @@ void __publish_debug (void){}
 /*for memcpy*/
 #include <string.h>
 #include <stdio.h>
+/*for malloc*/
+#include <stdlib.h>
 
 typedef unsigned int dbgvardsc_index_t;
 typedef unsigned short trace_buf_offset_t;
 
-#define BUFFER_EMPTY 0
-#define BUFFER_FULL 1
-
 #ifndef TARGET_ONLINE_DEBUG_DISABLE
 
-#define TRACE_BUFFER_SIZE 4096
-#define TRACE_LIST_SIZE 1024
+/* Sizes are given by project's debugger settings */
+#define TRACE_BUFFER_SIZE %(trace_buffer_size)d
+#define TRACE_LIST_SIZE %(trace_list_size)d
+
+/* Number of frames in trace ring, must be a power of 2 */
+#define TRACE_RING_SIZE %(trace_ring_size)d
+#if (TRACE_RING_SIZE & (TRACE_RING_SIZE - 1)) != 0
+#error "TRACE_RING_SIZE must be a power of 2"
+#endif
+#define TRACE_RING_MASK (TRACE_RING_SIZE - 1)
+
+/* In delta trace mode, frame data starts with a flags byte, a uint32
+ * sequence number, and a bitmap of traced variables that changed since
+ * previous frame, followed by changed variables only. Sequence number
+ * lets consumer detect lost frames. Otherwise frame holds all traced
+ * variables. */
+#define TRACE_DELTA %(trace_delta)d
 
-/* Atomically accessed variable for buffer state */
-static long trace_buffer_state = BUFFER_EMPTY;
+/* Lets runtime tell IDE how to decode frames of this PLC */
+const int DebugTraceDelta = TRACE_DELTA;
+
+/* Frame flags */
+#define TRACE_FRAME_KEY        1 /* all variables are in frame */
+#define TRACE_FRAME_INCOMPLETE 2 /* trace buffer did overflow */
 
 typedef struct trace_item_s {
     dbgvardsc_index_t dbgvardsc_index;
 } trace_item_t;
 
 trace_item_t trace_list[TRACE_LIST_SIZE];
-char trace_buffer[TRACE_BUFFER_SIZE];
+
+/* Trace frame, as filled by PLC thread on publish */
+typedef struct trace_frame_s {
+    /* debug session the frame was collected for */
+    unsigned long session;
+    uint32_t tick;
+    uint32_t size;
+    uint32_t flags;
+    char buffer[TRACE_BUFFER_SIZE];
+} trace_frame_t;
+
+/* Header of each frame copied out by GetDebugData */
+typedef struct trace_frame_header_s {
+    uint32_t tick;
+    uint32_t size;
+    uint32_t flags;
+} trace_frame_header_t;
+
+/* Single producer (PLC thread) / single consumer (debug thread) ring.
+ * Cursors are free running, and only written by their owner :
+ *  - trace_ring_write_cursor by PLC thread, once frame is complete,
+ *  - trace_ring_read_cursor by debug thread, once frames are copied. */
+static trace_frame_t trace_ring[TRACE_RING_SIZE];
+static long trace_ring_write_cursor = 0;
+static long trace_ring_read_cursor = 0;
+
+/* Incremented each time trace list is reset,
+ * frames collected for a previous trace list are discarded */
+static unsigned long trace_session = 0;
+
+#if TRACE_DELTA
+/* Last traced values, as known by debug thread, at fixed offsets.
+ * Variables that don't fit are considered always changed */
+static char trace_shadow[TRACE_BUFFER_SIZE];
+static const char *trace_shadow_end = trace_shadow + TRACE_BUFFER_SIZE;
+#endif
+
+/* Set when next frame must hold all variables */
+static int trace_keyframe_request = 1;
+
+#if TRACE_DELTA
+/* Sequence number of next frame in debug session */
+static uint32_t trace_frame_seq = 0;
+#define TRACE_DELTA_HEADER_SIZE (1 + sizeof(uint32_t))
+#endif
+
+/* Per session frames count */
+static uint32_t trace_frames_captured = 0;
+static uint32_t trace_frames_dropped = 0;
 
 /* Trace's cursor*/
 static trace_item_t *trace_list_collect_cursor = trace_list;
 static trace_item_t *trace_list_addvar_cursor = trace_list;
 static const trace_item_t *trace_list_end = 
     &trace_list[TRACE_LIST_SIZE-1];
-static char *trace_buffer_cursor = trace_buffer;
-static const char *trace_buffer_end = trace_buffer + TRACE_BUFFER_SIZE;
 
 
 
-#define FORCE_BUFFER_SIZE 1024
-#define FORCE_LIST_SIZE 256
+#define FORCE_BUFFER_SIZE %(force_buffer_size)d
+#define FORCE_LIST_SIZE %(force_list_size)d
 
 typedef struct force_item_s {
     dbgvardsc_index_t dbgvardsc_index;
@@ -75,6 +141,37 @@ static const force_item_t *force_list_end =
 static char *force_buffer_cursor = force_buffer;
 static const char *force_buffer_end = force_buffer + FORCE_BUFFER_SIZE;
 
+/* Debugger statistics, since PLC started.
+ * Must be changed according to changes in runtime/PLCObject.py */
+typedef struct debug_stats_s {
+    uint32_t trace_buffer_size;
+    uint32_t trace_buffer_hwm;
+    uint32_t trace_buffer_overflows;
+    uint32_t trace_list_size;
+    uint32_t trace_list_hwm;
+    uint32_t trace_list_overflows;
+    uint32_t trace_ring_size;
+    uint32_t trace_ring_hwm;
+    uint32_t trace_ring_overflows;
+    uint32_t force_buffer_size;
+    uint32_t force_buffer_hwm;
+    uint32_t force_buffer_overflows;
+    uint32_t force_list_size;
+    uint32_t force_list_hwm;
+    uint32_t force_list_overflows;
+    uint32_t retain_size;
+    uint32_t retain_saves;
+    uint32_t retain_full_saves;
+    uint32_t retain_last_save_size;
+    uint32_t retain_saved_size_hwm;
+} debug_stats_t;
+
+static debug_stats_t debug_stats;
+
+#define __update_hwm(name, value) \
+    if((uint32_t)(value) > debug_stats.name##_hwm) \
+        debug_stats.name##_hwm = (value);
+
 
 #endif
 
@@ -103,6 +200,24 @@ static const dbgvardsc_index_t retain_list[] = {
 static unsigned int retain_list_collect_cursor = 0;
 static const unsigned int retain_list_size = sizeof(retain_list)/sizeof(dbgvardsc_index_t);
 
+/* Retained variables values as given to retain backend, so that only
+ * changed ones are given to backends that keep previous values.
+ * NULL if it couldn't be allocated, all variables are saved then */
+static char *retain_shadow = NULL;
+
+/* All retained variables are given to retain backend every
+ * RETAIN_CHECKPOINT_PERIOD saves anyway */
+#ifndef RETAIN_CHECKPOINT_PERIOD
+#define RETAIN_CHECKPOINT_PERIOD 60
+#endif
+static unsigned int retain_saves_since_checkpoint = 0;
+
+/* IEC path and type of retained variables, in retain list order,
+ * used by runtime to give them to next PLC on hot reload */
+static const char *const retain_names[] = {
+%(retain_names_array)s
+};
+
 typedef void(*__for_each_variable_do_fp)(dbgvardsc_t*);
 void __for_each_variable_do(__for_each_variable_do_fp fp)
 {
@@ -119,6 +234,7 @@ void __for_each_variable_do(__for_each_variable_do_fp fp)
 %(var_access_code)s
 
 void Remind(unsigned int offset, unsigned int count, void * p);
+unsigned int GetRetainSize(void);
 
 extern int CheckRetainBuffer(void);
 extern void InitRetain(void);
@@ -127,14 +243,26 @@ void __init_debug(void)
 {
     /* init local static vars */
 #ifndef TARGET_ONLINE_DEBUG_DISABLE
-    trace_buffer_cursor = trace_buffer;
     trace_list_addvar_cursor = trace_list;
     trace_list_collect_cursor = trace_list;
-    trace_buffer_state = BUFFER_EMPTY;
+    trace_ring_write_cursor = 0;
+    trace_ring_read_cursor = 0;
+    trace_keyframe_request = 1;
+    trace_frames_captured = 0;
+    trace_frames_dropped = 0;
+
+    memset(&debug_stats, 0, sizeof(debug_stats));
+    debug_stats.trace_buffer_size = TRACE_BUFFER_SIZE;
+    debug_stats.trace_list_size = TRACE_LIST_SIZE;
+    debug_stats.trace_ring_size = TRACE_RING_SIZE;
+    debug_stats.force_buffer_size = FORCE_BUFFER_SIZE;
+    debug_stats.force_list_size = FORCE_LIST_SIZE;
 
     force_buffer_cursor = force_buffer;
     force_list_addvar_cursor = force_list;
     force_list_apply_cursor = force_list;
+
+    debug_stats.retain_size = GetRetainSize();
 #endif
 
     InitRetain();
@@ -165,6 +293,27 @@ void __init_debug(void)
         char mstr[] = "RETAIN memory invalid - defaults used";
         LogMessage(LOG_WARNING, mstr, sizeof(mstr));
     }
+
+    /* values given to retain backend at first save will be compared
+     * to these ones. Hot reload may still change them after init. */
+    free(retain_shadow);
+    retain_shadow = malloc(GetRetainSize());
+    if(retain_shadow){
+        unsigned int retain_offset = 0;
+        retain_list_collect_cursor = 0;
+
+        while(retain_list_collect_cursor < retain_list_size){
+            void *value_p = NULL;
+            size_t size;
+
+            UnpackVar(&dbgvardsc[retain_list[retain_list_collect_cursor]],
+                      &value_p, NULL, &size);
+            memcpy(retain_shadow + retain_offset, value_p, size);
+            retain_offset += size;
+            retain_list_collect_cursor++;
+        }
+    }
+    retain_saves_since_checkpoint = 0;
 }
 
 extern void InitiateDebugTransfer(void);
@@ -175,11 +324,13 @@ extern unsigned long __tick;
 void __cleanup_debug(void)
 {
 #ifndef TARGET_ONLINE_DEBUG_DISABLE
-    trace_buffer_cursor = trace_buffer;
     InitiateDebugTransfer();
 #endif    
 
     CleanupRetain();
+
+    free(retain_shadow);
+    retain_shadow = NULL;
 }
 
 void __retrieve_debug(void)
@@ -188,6 +339,21 @@ void __retrieve_debug(void)
 
 void Retain(unsigned int offset, unsigned int count, void * p);
 
+/* Give name, address and size of retained variable at given index
+ * in retain list. Return 0 if index is out of range */
+int GetRetainVariable(unsigned int i, char **name, void **value_p, unsigned int *size)
+{
+    size_t var_size;
+
+    if(i >= retain_list_size)
+        return 0;
+
+    UnpackVar(&dbgvardsc[retain_list[i]], value_p, NULL, &var_size);
+    *name = (char*)retain_names[i];
+    *size = var_size;
+    return 1;
+}
+
 /* Return size of all retain variables */
 unsigned int GetRetainSize(void)
 {
@@ -219,7 +385,16 @@ extern long AtomicCompareExchange(long*, long, long);
 extern long long AtomicCompareExchange64(long long* , long long , long long);
 extern void LeaveDebugSection(void);
 extern void ValidateRetainBuffer(void);
-extern void InValidateRetainBuffer(void);
+/* weak, as backends implementing InValidateRetainBufferMode may not have it */
+extern void InValidateRetainBuffer(void) __attribute__((weak));
+
+/* Default for retain backends that only implement InValidateRetainBuffer :
+ * save of all retained variables at each cycle, as before */
+int __attribute__((weak)) InValidateRetainBufferMode(void)
+{
+    InValidateRetainBuffer();
+    return RETAIN_SAVE_FULL;
+}
 
 #define __ReForceOutput_case_p(TYPENAME)                                                            \
         case TYPENAME##_P_ENUM :                                                                    \
@@ -241,40 +416,61 @@ extern void InValidateRetainBuffer(void);
             break;
 void __publish_debug(void)
 {
-    InValidateRetainBuffer();
+    int retain_save = InValidateRetainBufferMode();
     
 #ifndef TARGET_ONLINE_DEBUG_DISABLE 
     /* Check there is no running debugger re-configuration */
     if(TryEnterDebugSection()){
-        /* Lock buffer */
-        long latest_state = AtomicCompareExchange(
-            &trace_buffer_state,
-            BUFFER_EMPTY,
-            BUFFER_FULL);
-            
-        /* If buffer was free */
-        if(latest_state == BUFFER_EMPTY)
-        {
-            int stop = 0;
-            /* Reset force list cursor */
-            force_list_apply_cursor = force_list;
+        int stop = 0;
+        long write_cursor = trace_ring_write_cursor;
 
-            /* iterate over force list */
-            while(!stop && force_list_apply_cursor < force_list_addvar_cursor){
-                dbgvardsc_t *dsc = &dbgvardsc[
-                    force_list_apply_cursor->dbgvardsc_index];
-                void *varp = dsc->ptr;
-                __IEC_types_enum vartype = dsc->type;
-                switch(vartype){
-                    __ANY(__ReForceOutput_case_p)
-                default:
-                    break;
-                }
-                force_list_apply_cursor++;
+        /* Reset force list cursor */
+        force_list_apply_cursor = force_list;
+
+        /* iterate over force list */
+        while(!stop && force_list_apply_cursor < force_list_addvar_cursor){
+            dbgvardsc_t *dsc = &dbgvardsc[
+                force_list_apply_cursor->dbgvardsc_index];
+            void *varp = dsc->ptr;
+            __IEC_types_enum vartype = dsc->type;
+            switch(vartype){
+                __ANY(__ReForceOutput_case_p)
+            default:
+                break;
             }
+            force_list_apply_cursor++;
+        }
+
+        unsigned long pending_frames = write_cursor - trace_ring_read_cursor;
+
+        /* If a frame is free in ring */
+        if(pending_frames < TRACE_RING_SIZE)
+        {
+            trace_frame_t *frame = &trace_ring[write_cursor & TRACE_RING_MASK];
+            char *trace_buffer_cursor = frame->buffer;
+            const char *trace_buffer_end = frame->buffer + TRACE_BUFFER_SIZE;
+            /* size that would be needed to trace all variables */
+            uint32_t trace_needed_size = 0;
+            int overflow = 0;
+            int keyframe = trace_keyframe_request;
+#if TRACE_DELTA
+            unsigned char *bitmap =
+                (unsigned char*)frame->buffer + TRACE_DELTA_HEADER_SIZE;
+            unsigned int bitmap_size = 
+                ((trace_list_addvar_cursor - trace_list) + 7) / 8;
+            unsigned int var_index = 0;
+            char *shadow_cursor = trace_shadow;
+
+            /* reserve space for flags, sequence number and bitmap */
+            trace_needed_size = TRACE_DELTA_HEADER_SIZE + bitmap_size;
+            if(trace_needed_size <= TRACE_BUFFER_SIZE){
+                memset(frame->buffer, 0, trace_needed_size);
+                trace_buffer_cursor += trace_needed_size;
+            }else{
+                overflow = 1;
+            }
+#endif
 
-            /* Reset buffer cursor */
-            trace_buffer_cursor = trace_buffer;
             /* Reset trace list cursor */
             trace_list_collect_cursor = trace_list;
 
@@ -283,12 +479,18 @@ void __publish_debug(void)
                 void *value_p = NULL;
                 size_t size;
                 char* next_cursor;
+                int changed = 1;
 
                 dbgvardsc_t *dsc = &dbgvardsc[
                     trace_list_collect_cursor->dbgvardsc_index];
 
                 UnpackVar(dsc, &value_p, NULL, &size);
 
+#if TRACE_DELTA
+                /* shadow uses full variable size, even for strings */
+                char *next_shadow_cursor = shadow_cursor + size;
+#endif
+
                 /* copy visible variable to buffer */;
                 if(__Is_a_string(dsc)){
                     /* optimization for strings */
@@ -296,51 +498,137 @@ void __publish_debug(void)
                     size = ((STRING*)value_p)->len + 1;
                 }
 
-                /* compute next cursor positon.*/
-                next_cursor = trace_buffer_cursor + size;
-                /* check for buffer overflow */
-                if(next_cursor < trace_buffer_end)
-                    /* copy data to the buffer */
-                    memcpy(trace_buffer_cursor, value_p, size);
-                else
-                    /* stop looping in case of overflow */
-                    break;
-                /* increment cursor according size*/
-                trace_buffer_cursor = next_cursor;
+#if TRACE_DELTA
+                if(!keyframe && next_shadow_cursor <= trace_shadow_end)
+                    changed = memcmp(shadow_cursor, value_p, size) != 0;
+#endif
+
+                if(changed){
+                    /* account size even after overflow, for statistics */
+                    trace_needed_size += size;
+
+                    if(!overflow){
+                        /* compute next cursor positon.*/
+                        next_cursor = trace_buffer_cursor + size;
+                        /* check for buffer overflow */
+                        if(next_cursor <= trace_buffer_end){
+                            /* copy data to the buffer */
+                            memcpy(trace_buffer_cursor, value_p, size);
+                            /* increment cursor according size*/
+                            trace_buffer_cursor = next_cursor;
+#if TRACE_DELTA
+                            /* mark variable as changed,
+                               and remember value as known by debug thread */
+                            bitmap[var_index >> 3] |= 1 << (var_index & 7);
+                            if(next_shadow_cursor <= trace_shadow_end)
+                                memcpy(shadow_cursor, value_p, size);
+#endif
+                        }else{
+                            /* stop copying in case of overflow */
+                            overflow = 1;
+                        }
+                    }
+                }
+#if TRACE_DELTA
+                shadow_cursor = next_shadow_cursor;
+                var_index++;
+#endif
                 trace_list_collect_cursor++;
             }
-            
-            /* Leave debug section,
-             * Trigger asynchronous transmission 
+
+            frame->session = trace_session;
+            frame->tick = __tick;
+            frame->size = trace_buffer_cursor - frame->buffer;
+            frame->flags = (keyframe || !TRACE_DELTA) ? TRACE_FRAME_KEY : 0;
+            if(overflow){
+                frame->flags |= TRACE_FRAME_INCOMPLETE;
+            }else if(keyframe){
+                /* keep requesting key frames until one is complete */
+                trace_keyframe_request = 0;
+            }
+#if TRACE_DELTA
+            if(frame->size){
+                frame->buffer[0] = frame->flags;
+                memcpy(frame->buffer + 1, &trace_frame_seq, sizeof(uint32_t));
+            }
+            trace_frame_seq++;
+#endif
+
+            __update_hwm(trace_buffer, trace_needed_size)
+            __update_hwm(trace_ring, pending_frames + 1)
+            if(overflow)
+                debug_stats.trace_buffer_overflows++;
+
+            /* Publish frame to debug thread.
+             * Atomic operation also acts as a memory barrier */
+            AtomicCompareExchange(
+                &trace_ring_write_cursor,
+                write_cursor,
+                write_cursor + 1);
+            trace_frames_captured++;
+
+            /* Trigger asynchronous transmission 
              * (returns immediately) */
             InitiateDebugTransfer(); /* size */
+        }else{
+            /* Debug thread is late, ring is full */
+            trace_frames_dropped++;
+            debug_stats.trace_ring_overflows++;
         }
         LeaveDebugSection();
     }
 #endif
-    unsigned int retain_offset = 0;
-    /* when not debugging, do only retain */
-    retain_list_collect_cursor = 0;
+    /* retained variables are only walked when retain backend saves */
+    if(retain_save != RETAIN_SAVE_NONE){
+        unsigned int retain_offset = 0;
+        uint32_t retain_saved_size = 0;
 
-    /* iterate over retain list */
-    while(retain_list_collect_cursor < retain_list_size){
-        void *value_p = NULL;
-        size_t size;
-        char* next_cursor;
+        /* periodic full checkpoint */
+        if(!retain_shadow ||
+           ++retain_saves_since_checkpoint >= RETAIN_CHECKPOINT_PERIOD)
+            retain_save = RETAIN_SAVE_FULL;
+        if(retain_save == RETAIN_SAVE_FULL)
+            retain_saves_since_checkpoint = 0;
 
-        dbgvardsc_t *dsc = &dbgvardsc[
-            retain_list[retain_list_collect_cursor]];
+        retain_list_collect_cursor = 0;
 
-        UnpackVar(dsc, &value_p, NULL, &size);
+        /* iterate over retain list */
+        while(retain_list_collect_cursor < retain_list_size){
+            void *value_p = NULL;
+            size_t size;
+            int changed = 1;
 
-        /* if buffer not full */
-        Retain(retain_offset, size, value_p);
-        /* increment cursor according size*/
-        retain_offset += size;
+            dbgvardsc_t *dsc = &dbgvardsc[
+                retain_list[retain_list_collect_cursor]];
 
-        retain_list_collect_cursor++;
+            UnpackVar(dsc, &value_p, NULL, &size);
+
+            if(retain_shadow){
+                char *shadow_p = retain_shadow + retain_offset;
+                changed = memcmp(shadow_p, value_p, size) != 0;
+                if(changed)
+                    memcpy(shadow_p, value_p, size);
+            }
+
+            if(changed || retain_save == RETAIN_SAVE_FULL){
+                Retain(retain_offset, size, value_p);
+                retain_saved_size += size;
+            }
+            /* increment cursor according size*/
+            retain_offset += size;
+
+            retain_list_collect_cursor++;
+        }
+        ValidateRetainBuffer();
+
+#ifndef TARGET_ONLINE_DEBUG_DISABLE
+        debug_stats.retain_saves++;
+        if(retain_save == RETAIN_SAVE_FULL)
+            debug_stats.retain_full_saves++;
+        debug_stats.retain_last_save_size = retain_saved_size;
+        __update_hwm(retain_saved_size, retain_saved_size)
+#endif
     }
-    ValidateRetainBuffer();
 }
 
 #ifndef TARGET_ONLINE_DEBUG_DISABLE
@@ -381,6 +669,7 @@ void __publish_debug(void)
                         *(((__IEC_##TYPENAME##_p *)varp)->value) = *((TYPENAME *)force);\
                 } else {                                                                \
                     error_code = FORCE_BUFFER_OVERFLOW;                                 \
+                    debug_stats.force_buffer_overflows++;                               \
                     goto error_cleanup;                                                 \
                 }                                                                       \
             }                                                                           \
@@ -397,8 +686,10 @@ int RegisterDebugVariable(dbgvardsc_index_t idx, void* force)
         if(trace_list_addvar_cursor <= trace_list_end){
             trace_list_addvar_cursor->dbgvardsc_index = idx;
             trace_list_addvar_cursor++;
+            __update_hwm(trace_list, trace_list_addvar_cursor - trace_list)
         } else {
             error_code = TRACE_LIST_OVERFLOW;
+            debug_stats.trace_list_overflows++;
             goto error_cleanup;
         }
         if(force){
@@ -415,8 +706,11 @@ int RegisterDebugVariable(dbgvardsc_index_t idx, void* force)
                 }
                 /* inc force_list cursor */
                 force_list_addvar_cursor++;
+                __update_hwm(force_list, force_list_addvar_cursor - force_list)
+                __update_hwm(force_buffer, force_buffer_cursor - force_buffer)
             } else {
                 error_code = FORCE_LIST_OVERFLOW;
+                debug_stats.force_list_overflows++;
                 goto error_cleanup;
             }
         }
@@ -425,7 +719,6 @@ int RegisterDebugVariable(dbgvardsc_index_t idx, void* force)
 
 error_cleanup:
     ResetDebugVariables();
-    trace_buffer_state = BUFFER_EMPTY;
     return error_code;
     
 }
@@ -451,6 +744,15 @@ void ResetDebugVariables(void)
     /* Reset trace list */
     trace_list_addvar_cursor = trace_list;
 
+    /* Start a new debug session, frames remaining in ring become obsolete */
+    trace_session++;
+    trace_keyframe_request = 1;
+#if TRACE_DELTA
+    trace_frame_seq = 0;
+#endif
+    trace_frames_captured = 0;
+    trace_frames_dropped = 0;
+
     force_list_apply_cursor = force_list;
     /* Restore forced variables */
     while(force_list_apply_cursor < force_list_addvar_cursor){
@@ -473,24 +775,77 @@ void ResetDebugVariables(void)
     force_buffer_cursor = force_buffer;
 }
 
-void FreeDebugData(void)
-{
-    /* atomically mark buffer as free */
-    AtomicCompareExchange(
-        &trace_buffer_state,
-        BUFFER_FULL,
-        BUFFER_EMPTY);
-}
 int WaitDebugData(unsigned long *tick);
-/* Wait until debug data ready and return pointer to it */
-int GetDebugData(unsigned long *tick, unsigned long *size, void **buffer){
-    int wait_error = WaitDebugData(tick);
+/* Wait until debug data ready, and copy all ready frames to given buffer.
+ * Each copied frame is a trace_frame_header_t followed by frame's data.
+ * Frames that don't fit in buffer are left in ring for next call. */
+int GetDebugData(char *buffer, uint32_t buffer_size,
+                 uint32_t *frames_count, uint32_t *data_size){
+    long read_cursor = trace_ring_read_cursor;
+    char *cursor = buffer;
+    int wait_error = 0;
+    unsigned long tick;
+
+    *frames_count = 0;
+    *data_size = 0;
+
+    if(read_cursor == trace_ring_write_cursor)
+        wait_error = WaitDebugData(&tick);
+
     if(!wait_error){
-        *size = trace_buffer_cursor - trace_buffer;
-        *buffer = trace_buffer;
+        /* Atomic read of write cursor also acts as a memory barrier */
+        long write_cursor = AtomicCompareExchange(
+            &trace_ring_write_cursor, 0, 0);
+
+        while(read_cursor != write_cursor){
+            trace_frame_t *frame = &trace_ring[read_cursor & TRACE_RING_MASK];
+            if(frame->session == trace_session){
+                trace_frame_header_t header;
+                uint32_t next_size = sizeof(header) + frame->size;
+                if(*data_size + next_size > buffer_size)
+                    break;
+                header.tick = frame->tick;
+                header.size = frame->size;
+                header.flags = frame->flags;
+                memcpy(cursor, &header, sizeof(header));
+                memcpy(cursor + sizeof(header), frame->buffer, frame->size);
+                cursor += next_size;
+                *data_size += next_size;
+                (*frames_count)++;
+            }
+            read_cursor++;
+        }
+
+        /* Free consumed frames */
+        AtomicCompareExchange(
+            &trace_ring_read_cursor,
+            trace_ring_read_cursor,
+            read_cursor);
     }
     return wait_error;
 }
+
+/* Next frame will hold all traced variables.
+ * Called by debug thread when it lost frames */
+void RequestDebugKeyFrame(void){
+    trace_keyframe_request = 1;
+}
+
+/* Size of buffer needed to get the whole ring content at once */
+uint32_t GetDebugDataMaxSize(void){
+    return TRACE_RING_SIZE * (sizeof(trace_frame_header_t) + TRACE_BUFFER_SIZE);
+}
+
+/* Copy debugger statistics */
+void GetDebugStats(debug_stats_t *stats){
+    memcpy(stats, &debug_stats, sizeof(debug_stats));
+}
+
+/* Frames captured and dropped since debug session started */
+void GetDebugFramesCount(uint32_t *captured, uint32_t *dropped){
+    *captured = trace_frames_captured;
+    *dropped = trace_frames_dropped;
+}
 #endif
 #endif
 
@@ -35,6 +35,11 @@ extern unsigned long greatest_tick_count__;
 /* Help to quit cleanly when init fail at a certain level */
 static int init_level = 0;
 
+/* Resources that no other PLC can use while this one runs,
+ * checked by runtime before hot reload. NULL terminated,
+ * not defined if some extension doesn't list resources it uses */
+%(exclusive_resources)s
+
 /*
  * Prototypes of functions exported by plugins
  **/
@@ -52,14 +52,25 @@ typedef struct {
 /* Log cursor : 64b
    |63 ... 32|31 ... 0|
    | Message | Buffer |
-   | counter | Index  | */
+   | counter | Offset |
+   Buffer offset is not masked, it counts bytes written modulo 2^32,
+   so that age of a message in buffer can be checked */
 static uint64_t LogCursor[LOG_LEVELS] LOG_BUFFER_ATTRS = {0x0,0x0,0x0,0x0};
 
+/* Log index : unmasked offset of each message's tail,
+   for LOG_INDEX_SIZE most recent messages of each level */
+#ifndef LOG_INDEX_SIZE
+#define LOG_INDEX_SIZE 256
+#endif
+#define LOG_INDEX_MASK (LOG_INDEX_SIZE-1)
+static uint32_t LogIndex[LOG_LEVELS][LOG_INDEX_SIZE] LOG_BUFFER_ATTRS;
+
 void ResetLogCount(void) {
 	uint8_t level;
 	for(level=0;level<LOG_LEVELS;level++){
 		LogCursor[level] = 0;
 	}
+	memset(LogIndex, 0, sizeof(LogIndex));
 }
 
 /* Store one log message of give size */
@@ -82,14 +93,15 @@ int LogMessage(uint8_t level, char* buf, uint32_t size){
             buffpos = (uint32_t)old_cursor;
             tail.msgidx = (old_cursor >> 32); 
             new_cursor = ((uint64_t)(tail.msgidx + 1)<<32) 
-                         | (uint64_t)((buffpos + size + sizeof(mTail)) & LOG_BUFFER_MASK);
+                         | (uint64_t)(uint32_t)(buffpos + size + sizeof(mTail));
         }while(AtomicCompareExchange64(
             (long long*)&LogCursor[level],
             (long long)old_cursor,
             (long long)new_cursor)!=(long long)old_cursor);
 
-        copy_to_log(level, buffpos, buf, size);
+        copy_to_log(level, buffpos & LOG_BUFFER_MASK, buf, size);
         copy_to_log(level, (buffpos + size) & LOG_BUFFER_MASK, &tail, sizeof(mTail));
+        LogIndex[level][tail.msgidx & LOG_INDEX_MASK] = buffpos + size;
 
         return 1; /* Success */
     }else{
@@ -103,38 +115,105 @@ uint32_t GetLogCount(uint8_t level){
     return (uint64_t)LogCursor[level] >> 32;
 }
 
+/* Find tail of given message, return 0 if not found (overwritten).
+   tailpos is set to tail position in buffer */
+static int find_log_tail(uint8_t level, uint64_t cursor, uint32_t msgidx, uint32_t* tailpos, mTail* tail){
+    uint32_t count = cursor >> 32;
+    uint32_t buffpos = (uint32_t)cursor;
+    uint32_t stailpos, smsgidx, age;
+
+    if(msgidx >= count) return 0;
+
+    /* Fast path : index gives tail offset, and offset distance
+       to cursor tells if message is still entirely in buffer */
+    stailpos = LogIndex[level][msgidx & LOG_INDEX_MASK];
+    age = buffpos - stailpos;
+    if(age >= sizeof(mTail) && age <= LOG_BUFFER_SIZE){
+        copy_from_log(level, stailpos & LOG_BUFFER_MASK, tail, sizeof(mTail));
+        if(tail->msgidx == msgidx && age + tail->msgsize <= LOG_BUFFER_SIZE){
+            *tailpos = stailpos & LOG_BUFFER_MASK;
+            return 1;
+        }
+    }
+
+    /* Slow path : message search loop, from newest message */
+    age = 0;
+    tail->msgidx = count;
+    tail->msgsize = 0;
+    do {
+        smsgidx = tail->msgidx;
+        age += sizeof(mTail) + tail->msgsize;
+        if(age > LOG_BUFFER_SIZE) return 0;
+        stailpos = (buffpos - age) & LOG_BUFFER_MASK;
+        copy_from_log(level, stailpos, tail, sizeof(mTail));
+    }while((tail->msgidx == smsgidx - 1) && (tail->msgidx > msgidx));
+
+    if(tail->msgidx == msgidx && age + tail->msgsize <= LOG_BUFFER_SIZE){
+        *tailpos = stailpos;
+        return 1;
+    }
+    return 0;
+}
+
 /* Return message size and content */
 uint32_t GetLogMessage(uint8_t level, uint32_t msgidx, char* buf, uint32_t max_size, uint32_t* tick, uint32_t* tv_sec, uint32_t* tv_nsec){
     uint64_t cursor = LogCursor[level];
-    if(cursor){
-        /* seach cursor */
-        uint32_t stailpos = (uint32_t)cursor; 
-        uint32_t smsgidx;
-        mTail tail;
-        tail.msgidx = cursor >> 32;
-        tail.msgsize = 0;
-
-        /* Message search loop */
-        do {
-            smsgidx = tail.msgidx;
-            stailpos = (stailpos - sizeof(mTail) - tail.msgsize ) & LOG_BUFFER_MASK;
-            copy_from_log(level, stailpos, &tail, sizeof(mTail));
-        }while((tail.msgidx == smsgidx - 1) && (tail.msgidx > msgidx));
-
-        if(tail.msgidx == msgidx){
-            uint32_t sbuffpos = (stailpos - tail.msgsize ) & LOG_BUFFER_MASK; 
-            uint32_t totalsize = tail.msgsize;
-            *tick = tail.tick; 
-            *tv_sec = tail.time.tv_sec; 
-            *tv_nsec = tail.time.tv_nsec; 
-            copy_from_log(level, sbuffpos, buf, 
-                          totalsize > max_size ? max_size : totalsize);
-            return totalsize;
-        }
+    uint32_t stailpos;
+    mTail tail;
+    if(cursor && find_log_tail(level, cursor, msgidx, &stailpos, &tail)){
+        uint32_t sbuffpos = (stailpos - tail.msgsize ) & LOG_BUFFER_MASK; 
+        uint32_t totalsize = tail.msgsize;
+        *tick = tail.tick; 
+        *tv_sec = tail.time.tv_sec; 
+        *tv_nsec = tail.time.tv_nsec; 
+        copy_from_log(level, sbuffpos, buf, 
+                      totalsize > max_size ? max_size : totalsize);
+        return totalsize;
     }
     return 0;
 }
 
+/* Batch of log messages, packed in buf as :
+   |<------ 5 x uint32_t ------>|<- size ->|
+   | msgidx, size, tick, tv_sec, tv_nsec | content |...
+
+   Messages are given from from_id down to older ones, until max_count
+   messages are given, buffer is full or message was overwritten.
+   First message is truncated if it doesn't fit in buffer.
+   Return size of data written in buf */
+#define LOG_PACKED_HEADER_SIZE (5 * sizeof(uint32_t))
+uint32_t GetLogMessages(uint8_t level, uint32_t from_id, uint32_t max_count, char* buf, uint32_t max_size){
+    uint64_t cursor = LogCursor[level];
+    uint32_t written = 0;
+    uint32_t msgidx = from_id;
+    uint32_t stailpos;
+    mTail tail;
+
+    if(!cursor) return 0;
+
+    while(max_count-- && find_log_tail(level, cursor, msgidx, &stailpos, &tail)){
+        uint32_t header[5];
+        uint32_t size = tail.msgsize;
+        if(written + LOG_PACKED_HEADER_SIZE > max_size) break;
+        if(written + LOG_PACKED_HEADER_SIZE + size > max_size){
+            if(written) break;
+            size = max_size - LOG_PACKED_HEADER_SIZE;
+        }
+        header[0] = msgidx;
+        header[1] = size;
+        header[2] = tail.tick;
+        header[3] = tail.time.tv_sec;
+        header[4] = tail.time.tv_nsec;
+        memcpy(buf + written, header, LOG_PACKED_HEADER_SIZE);
+        written += LOG_PACKED_HEADER_SIZE;
+        copy_from_log(level, (stailpos - tail.msgsize) & LOG_BUFFER_MASK,
+                      buf + written, size);
+        written += size;
+        if(msgidx-- == 0) break;
+    }
+    return written;
+}
+
 #endif
 
 #ifndef TARGET_EXT_SYNC_DISABLE
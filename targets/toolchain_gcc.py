@@ -27,14 +27,141 @@
 from __future__ import absolute_import
 import os
 import re
-import operator
 import hashlib
-from functools import reduce
+from time import time
+from threading import Thread, Lock, Event
+import multiprocessing
+from six.moves import queue, xrange
 from util.ProcessLogger import ProcessLogger
+from util.BuildCache import BuildCache, HashFile
 
 
 includes_re = re.compile(r'\s*#include\s*["<]([^">]*)[">].*')
 
+# include paths only matter to preprocessing, they are not part of cache key
+include_flags_re = re.compile(r'"?-I\s*(?:"[^"]*"|\S+)"?')
+
+
+class CompileJob(object):
+    """
+    Compilation of one C file, output is kept to be logged in build order.
+    When a build cache is given, object is looked up in cache with a key
+    made of preprocessed source and compiler flags before compiling it.
+    """
+    def __init__(self, CFile, bn, obn, objectfilename, command,
+                 cache=None, preprocess_command=None, cachekey_parts=()):
+        self.CFile = CFile
+        self.bn = bn
+        self.obn = obn
+        self.objectfilename = objectfilename
+        self.command = command
+        self.cache = cache
+        self.preprocess_command = preprocess_command
+        self.cachekey_parts = cachekey_parts
+        self.cached = False
+        self.process = None
+        self.status = None
+        self.out = ""
+        self.err = ""
+        self.cancelled = False
+        self.exception = None
+        self.done = Event()
+
+    def Spawn(self, pool, command):
+        with pool.lock:
+            if self.cancelled:
+                return None
+            self.process = ProcessLogger(None, command)
+        return self.process.spin()
+
+    def Run(self, pool):
+        key = None
+        if self.cache is not None and self.cache.enabled:
+            preprocessed = self.objectfilename + ".i"
+            res = self.Spawn(pool, self.preprocess_command + " -E -P -o \"%s\"" % preprocessed)
+            if res is None:
+                return
+            # failing preprocessing is reported by compilation
+            if res[0] == 0:
+                try:
+                    key = HashFile(preprocessed, *self.cachekey_parts)
+                    os.remove(preprocessed)
+                except (IOError, OSError):
+                    key = None
+            if key is not None and self.cache.GetObject(key, self.objectfilename):
+                # depfile of previous compilation doesn't apply anymore
+                try:
+                    os.remove(os.path.splitext(self.objectfilename)[0] + ".d")
+                except OSError:
+                    pass
+                self.status = 0
+                self.cached = True
+                return
+        res = self.Spawn(pool, self.command)
+        if res is None:
+            return
+        self.status, self.out, self.err = res
+        if self.status == 0 and key is not None:
+            self.cache.PutObject(key, self.objectfilename)
+
+
+class CompilePool(object):
+    """
+    Run compilation jobs on a bounded number of threads.
+    First failing job cancels pending jobs and kills running ones.
+    """
+    def __init__(self, jobs_count):
+        self.queue = queue.Queue()
+        self.lock = Lock()
+        self.running = []
+        self.failed = False
+        self.threads = []
+        for _i in xrange(jobs_count):
+            thread = Thread(target=self.WorkerProc)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def Submit(self, job):
+        self.queue.put(job)
+
+    def WorkerProc(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with self.lock:
+                if self.failed:
+                    job.cancelled = True
+                    job.done.set()
+                    continue
+                self.running.append(job)
+            try:
+                job.Run(self)
+            except Exception as e:
+                # i.e. compiler can't be spawned, or cache can't be accessed
+                job.status = -1
+                job.exception = e
+            finally:
+                with self.lock:
+                    self.running.remove(job)
+                    if job.status and not job.cancelled:
+                        self._Cancel()
+                job.done.set()
+
+    def _Cancel(self):
+        self.failed = True
+        for job in self.running:
+            job.cancelled = True
+            if job.process is not None:
+                job.process.kill()
+
+    def Close(self):
+        for _thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
 
 class toolchain_gcc(object):
     """
@@ -110,7 +237,15 @@ class toolchain_gcc(object):
             self.bin = self.CTRInstance.GetProjectName() + self.extension
             self.bin_path = os.path.join(self.buildpath, self.bin)
             self.md5key = None
+            # path : (stat, hash, direct deps) of sources and headers
             self.srcmd5 = {}
+            # C file path : deps given by compiler in last depfile
+            self.depfiles = {}
+            # C file path : deps digest when last compiled
+            self.objdigests = {}
+            # memos of current build
+            self.filehashes = {}
+            self.depsdigests = {}
 
     def append_cfile_deps(self, src, deps):
         for l in src.splitlines():
@@ -120,44 +255,177 @@ class toolchain_gcc(object):
                 if os.path.exists(os.path.join(self.buildpath, depfn)):
                     deps.append(depfn)
 
-    def concat_deps(self, bn):
-        # read source
-        src = open(os.path.join(self.buildpath, bn), "r").read()
-        # update direct dependencies
+    def get_hash_and_deps(self, path):
+        """
+        Returns file content hash and direct dependencies, once per build.
+        File is read and scanned only if its stat changed since last build,
+        or if it was modified too recently for its stat to be trusted.
+        """
+        res = self.filehashes.get(path)
+        if res is not None:
+            return res
+        try:
+            st = os.stat(path)
+        except OSError:
+            res = self.filehashes[path] = (None, [])
+            return res
+        stat = (st.st_mtime, st.st_size)
+        oldstat, oldhash, deps = self.srcmd5.get(path, (None, None, []))
+        if oldstat == stat and time() - st.st_mtime > 2:
+            res = self.filehashes[path] = (oldhash, deps)
+            return res
+        src = open(path).read()
         deps = []
         self.append_cfile_deps(src, deps)
-        # recurse through deps
-        # TODO detect cicular deps.
-        return reduce(operator.concat, map(self.concat_deps, deps), src)
-
-    def check_and_update_hash_and_deps(self, bn):
-        # Get latest computed hash and deps
-        oldhash, deps = self.srcmd5.get(bn, (None, []))
-        # read source
-        src = open(os.path.join(self.buildpath, bn)).read()
-        # compute new hash
+        deps = [os.path.abspath(os.path.join(self.buildpath, dep)) for dep in deps]
         newhash = hashlib.md5(src).hexdigest()
-        # compare
-        match = (oldhash == newhash)
-        if not match:
-            # file have changed
-            # update direct dependencies
-            deps = []
-            self.append_cfile_deps(src, deps)
-            # store that hashand deps
-            self.srcmd5[bn] = (newhash, deps)
-        # recurse through deps
-        # TODO detect cicular deps.
-        return reduce(operator.and_, map(self.check_and_update_hash_and_deps, deps), match)
+        self.srcmd5[path] = (stat, newhash, deps)
+        res = self.filehashes[path] = (newhash, deps)
+        return res
+
+    def get_deps_digest(self, CFile):
+        """
+        Returns hash of C file content and of all its dependencies.
+        Dependencies are included files found in sources, and those
+        listed in depfile of last compilation.
+        """
+        digest = self.depsdigests.get(CFile)
+        if digest is not None:
+            return digest
+        # walk dependency graph, cycles are ignored
+        todo = [CFile] + self.depfiles.get(CFile, [])
+        visited = set(todo)
+        hashes = []
+        while todo:
+            path = todo.pop()
+            filehash, deps = self.get_hash_and_deps(path)
+            hashes.append((path, filehash))
+            for dep in deps:
+                if dep not in visited:
+                    visited.add(dep)
+                    todo.append(dep)
+        s = hashlib.md5()
+        for path, filehash in sorted(hashes):
+            s.update(path)
+            s.update(str(filehash))
+        digest = s.hexdigest()
+        self.depsdigests[CFile] = digest
+        return digest
+
+    def read_depfile(self, CFile, objectfilename):
+        """
+        Keep dependencies listed in depfile written by compiler with -MMD
+        """
+        depfilename = os.path.splitext(objectfilename)[0] + ".d"
+        try:
+            data = open(depfilename).read()
+        except IOError:
+            self.depfiles.pop(CFile, None)
+            return
+        # make rule : "target: dep1 dep2 \\\n dep3"
+        data = data.replace("\\\n", " ")
+        deps = data[data.find(": ") + 2:].split()
+        self.depfiles[CFile] = [os.path.abspath(dep) for dep in deps
+                                if os.path.abspath(dep) != CFile]
+
+    def check_and_update_hash_and_deps(self, CFile):
+        """
+        Returns True if C file and its dependencies didn't change
+        since it was last compiled
+        """
+        digest = self.get_deps_digest(CFile)
+        match = self.objdigests.get(CFile) == digest
+        self.objdigests[CFile] = digest
+        return match
 
     def calc_source_md5(self):
-        wholesrcdata = ""
+        s = hashlib.md5()
         for _Location, CFilesAndCFLAGS, _DoCalls in self.CTRInstance.LocationCFilesAndCFLAGS:
-            # Get CFiles list to give it to makefile
             for CFile, _CFLAGS in CFilesAndCFLAGS:
-                CFileName = os.path.basename(CFile)
-                wholesrcdata += self.concat_deps(CFileName)
-        return hashlib.md5(wholesrcdata).hexdigest()
+                s.update(self.get_deps_digest(CFile))
+        return s.hexdigest()
+
+    def getJobsCount(self):
+        """
+        Returns count of C files compiled concurrently
+        """
+        jobs = self.CTRInstance.GetTarget().getcontent().getJobs()
+        if jobs > 0:
+            return jobs
+        try:
+            return multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 1
+
+    def compile_jobs(self, entries, jobs):
+        """
+        Run compilation jobs concurrently, and log entries in given order.
+        Entries are either text to log or compilation jobs.
+        """
+        logger = self.CTRInstance.logger
+        pool = CompilePool(min(self.getJobsCount(), len(jobs)))
+        for job in jobs:
+            pool.Submit(job)
+
+        start = time()
+        failed = False
+        for entry in entries:
+            if not isinstance(entry, CompileJob):
+                logger.write(entry)
+                continue
+            while not entry.done.wait(0.1):
+                logger.progress("%.3fs" % (time() - start))
+            if entry.cancelled:
+                continue
+            if entry.exception is not None:
+                logger.write_error(_("C compilation of {a1} failed : {a2}\n").format(
+                    a1=entry.bn, a2=str(entry.exception)))
+                failed = True
+                continue
+            if entry.cached:
+                logger.write("   [cache]  "+entry.bn+" -> "+entry.obn+"\n")
+                continue
+            logger.write("   [CC]  "+entry.bn+" -> "+entry.obn+"\n")
+            if entry.out:
+                logger.write(entry.out)
+            if entry.err:
+                logger.write_warning(entry.err)
+            if entry.status:
+                logger.write(entry.command + "\n")
+                logger.write_warning(_("exited with status {a1} (pid {a2})\n").format(
+                    a1=str(entry.status), a2=str(entry.process.Proc.pid)))
+                logger.write_error(_("C compilation of %s failed.\n") % entry.bn)
+                failed = True
+        pool.Close()
+
+        for job in jobs:
+            if job.status == 0:
+                # dependencies given by compiler are used for next builds
+                self.read_depfile(job.CFile, job.objectfilename)
+                self.depsdigests.pop(job.CFile, None)
+                self.objdigests[job.CFile] = self.get_deps_digest(job.CFile)
+
+        if failed:
+            # objects of failed or cancelled jobs must be built again
+            for job in jobs:
+                if job.status or job.cancelled:
+                    self.objdigests.pop(job.CFile, None)
+            return False
+
+        if self.cache.enabled and not all([job.cached for job in jobs]):
+            self.cache.Prune()
+        return True
+
+    def getCompilerIdentity(self):
+        """
+        Returns compiler path and version, part of object cache keys
+        """
+        try:
+            _status, result, _err_result = ProcessLogger(
+                None, "\"%s\" --version" % self.compiler).spin()
+        except Exception:
+            result = ""
+        return self.compiler + "\n" + result
 
     def build(self):
         # Retrieve compiler and linker
@@ -166,48 +434,65 @@ class toolchain_gcc(object):
 
         Builder_CFLAGS = ' '.join(self.getBuilderCFLAGS())
 
+        self.cache = BuildCache()
+        compiler_identity = None
+        # sources and headers are hashed once per build
+        self.filehashes = {}
+        self.depsdigests = {}
+
         # ----------------- GENERATE OBJECT FILES ------------------------
         obns = []
         objs = []
+        # text to log and compilation jobs, in build order
+        entries = []
+        jobs = []
         relink = not os.path.exists(self.bin_path)
         for Location, CFilesAndCFLAGS, _DoCalls in self.CTRInstance.LocationCFilesAndCFLAGS:
             if CFilesAndCFLAGS:
                 if Location:
-                    self.CTRInstance.logger.write(".".join(map(str, Location))+" :\n")
+                    entries.append(".".join(map(str, Location))+" :\n")
                 else:
-                    self.CTRInstance.logger.write(_("PLC :\n"))
+                    entries.append(_("PLC :\n"))
 
             for CFile, CFLAGS in CFilesAndCFLAGS:
                 if CFile.endswith(".c"):
+                    CFile = os.path.abspath(CFile)
                     bn = os.path.basename(CFile)
                     obn = os.path.splitext(bn)[0]+".o"
                     objectfilename = os.path.splitext(CFile)[0]+".o"
 
-                    match = self.check_and_update_hash_and_deps(bn)
+                    match = self.check_and_update_hash_and_deps(CFile)
 
                     if match:
-                        self.CTRInstance.logger.write("   [pass]  "+bn+" -> "+obn+"\n")
+                        entries.append("   [pass]  "+bn+" -> "+obn+"\n")
                     else:
                         relink = True
 
-                        self.CTRInstance.logger.write("   [CC]  "+bn+" -> "+obn+"\n")
-
-                        status, _result, _err_result = ProcessLogger(
-                            self.CTRInstance.logger,
-                            "\"%s\" -c \"%s\" -o \"%s\" -O2 %s %s" %
-                            (self.compiler, CFile, objectfilename, Builder_CFLAGS, CFLAGS)
-                        ).spin()
-
-                        if status:
-                            self.srcmd5.pop(bn)
-                            self.CTRInstance.logger.write_error(_("C compilation of %s failed.\n") % bn)
-                            return False
+                        if self.cache.enabled and compiler_identity is None:
+                            compiler_identity = self.getCompilerIdentity()
+                        flags = "-O2 %s %s" % (Builder_CFLAGS, CFLAGS)
+                        job = CompileJob(
+                            CFile, bn, obn, objectfilename,
+                            "\"%s\" -c \"%s\" -o \"%s\" -MMD %s" %
+                            (self.compiler, CFile, objectfilename, flags),
+                            self.cache,
+                            "\"%s\" \"%s\" %s" % (self.compiler, CFile, flags),
+                            (compiler_identity, include_flags_re.sub("", flags)))
+                        entries.append(job)
+                        jobs.append(job)
                     obns.append(obn)
                     objs.append(objectfilename)
                 elif CFile.endswith(".o"):
                     obns.append(os.path.basename(CFile))
                     objs.append(CFile)
 
+        if jobs:
+            if not self.compile_jobs(entries, jobs):
+                return False
+        else:
+            for entry in entries:
+                self.CTRInstance.logger.write(entry)
+
         # ---------------- GENERATE OUTPUT FILE --------------------------
         # Link all the object files into one binary file
         self.CTRInstance.logger.write(_("Linking :\n"))
@@ -0,0 +1,49 @@
+#!/bin/bash
+
+# Hot reload python example while it runs, first with a changed PLC,
+# then with a PLC failing to initialize, that must leave running PLC as is.
+
+rm -rf ./project ./runtime_wd ./runtime_stdout.txt
+cp -r $BEREMIZPATH/exemples/python ./project
+mkdir ./runtime_wd
+
+setsid $BEREMIZPYTHONPATH $BEREMIZPATH/Beremiz_service.py -x 0 -t 0 -p 61131 \
+    ./runtime_wd > ./runtime_stdout.txt 2>&1 &
+SERVICE_PID=$!
+trap "pkill -9 -s $SERVICE_PID" EXIT
+sleep 3
+
+beremiz_cli() {
+    $BEREMIZPYTHONPATH $BEREMIZPATH/Beremiz_cli.py --uri PYRO://127.0.0.1:61131 \
+        --project-home ./project "$@"
+}
+
+# Wait for python extension of running PLC to be called again
+wait_python_calls() {
+    count=$(grep -c "Python read PLC global :" ./runtime_stdout.txt)
+    for i in $(seq 10); do
+        sleep 1
+        if (( $(grep -c "Python read PLC global :" ./runtime_stdout.txt) > count )); then
+            return 0
+        fi
+    done
+    return 1
+}
+
+beremiz_cli build transfer run || exit 1
+wait_python_calls || exit 2
+
+# change initial value of a variable
+sed -i 's/<simpleValue value="151"\/>/<simpleValue value="152"\/>/' ./project/plc.xml
+beremiz_cli build transfer --hot-reload || exit 3
+grep -q "PLC hot reloaded" ./runtime_stdout.txt || exit 4
+wait_python_calls || exit 5
+
+# make C extension initialization fail
+sed -i '/<initFunction>/,/<\/initFunction>/ s/<!\[CDATA\[/<![CDATA[return 1;/' \
+    ./project/c_code@c_ext/cfile.xml
+beremiz_cli build transfer --hot-reload && exit 6
+grep -q "previous PLC kept running" ./runtime_stdout.txt || exit 7
+wait_python_calls || exit 8
+
+exit 0
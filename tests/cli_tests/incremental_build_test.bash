@@ -0,0 +1,37 @@
+#!/bin/bash
+
+# Run IEC61131 language test with incremental build enabled, so that
+# POUS.c generated by iec2c is split in one C file per POU.
+# Check that each POU got its own C file and that PLC built from them
+# still passes test.
+
+rm -rf ./project
+cp -r $BEREMIZPATH/tests/projects/iec61131_lang_test ./project
+sed -i 's/<BeremizRoot /<BeremizRoot Incremental_Build="true" /' ./project/beremiz.xml
+
+coproc setsid $BEREMIZPYTHONPATH $BEREMIZPATH/Beremiz_cli.py -k --project-home ./project build transfer run;
+
+split=0
+while read -t 5 -u ${COPROC[0]} line; do
+    echo "$line"
+    if [[ "$line" == *"can't be split"* ]]; then
+        echo "POUs C code was not split"
+        pkill -9 -s $COPROC_PID
+        exit 1
+    fi
+    if [[ "$line" == *"POUs C code split in 3 files"* ]]; then
+        split=1
+    fi
+    if [[ "$line" == *ALL\ TESTS\ OK* ]]; then
+        pkill -9 -s $COPROC_PID
+        (( split )) || exit 2
+        for pou in CONVERSION_TEST MAIN_TEST TEMPO_TEST; do
+            [[ -f ./project/build/POUS_$pou.c ]] || exit 3
+        done
+        # resources must not include whole POUS.c anymore
+        grep -q '#include "POUS.c"' ./project/build/*.c && exit 4
+        exit 0
+    fi
+done
+
+exit 42
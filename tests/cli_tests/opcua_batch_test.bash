@@ -0,0 +1,133 @@
+#!/bin/bash
+
+# Build and run OPC-UA client with several polled inputs, exchanged
+# with one Read request, outputs exchanged with one Write request,
+# and a subscribed input. Server changes subscribed value only once
+# PLC did write sum of polled inputs.
+# Server prints count of nodes of each client's Read and Write request,
+# test fails if outputs are written one node per request.
+
+rm -f ./SUMOK ./SUBOK ./READOK ./WRITEOK ./UNBATCHED
+
+# Run server
+$BEREMIZPYTHONPATH - > >(
+    echo "Start SRV loop"
+    while read line; do
+        # Wait for server to print values written by PLC
+        echo "SRV>> $line"
+        if [[ "$line" == "SUM 4.0"* ]]; then
+            echo "PLC could read polled values and write sum"
+            touch ./SUMOK
+        fi
+        if [[ "$line" == *"ECHO 7.5" ]]; then
+            echo "PLC could get subscribed value change"
+            touch ./SUBOK
+        fi
+        if [[ "$line" == "READ 2" ]]; then
+            echo "PLC did read both polled inputs with one request"
+            touch ./READOK
+        fi
+        if [[ "$line" == "WRITE 2" ]]; then
+            echo "PLC did write both outputs with one request"
+            touch ./WRITEOK
+        fi
+        if [[ "$line" == "WRITE 1" ]]; then
+            echo "PLC did write outputs one by one"
+            touch ./UNBATCHED
+        fi
+    done
+    echo "End SRV loop"
+) << EOF &
+
+import sys
+import os
+import time
+
+from opcua import ua, Server
+from opcua.server.internal_server import InternalSession
+
+server = Server()
+
+# print count of nodes in client requests, once for each count
+counts = set()
+def count_nodes(name, method, attr):
+    def wrapper(session, params):
+        if session is not server.iserver.isession:
+            count = len(getattr(params, attr))
+            if (name, count) not in counts:
+                counts.add((name, count))
+                print name, count
+                sys.stdout.flush()
+        return method(session, params)
+    return wrapper
+InternalSession.read = count_nodes("READ", InternalSession.read, "NodesToRead")
+InternalSession.write = count_nodes("WRITE", InternalSession.write, "NodesToWrite")
+
+host = os.environ.get("OPCUA_DEFAULT_HOST", "127.0.0.1")
+endpoint = "opc.tcp://"+host+":4840/freeopcua/server/"
+server.set_endpoint(endpoint)
+
+uri = "http://beremiz.github.io"
+idx = server.register_namespace(uri)
+
+objects = server.get_objects_node()
+
+testobj = objects.add_object(idx, "TestObject")
+testin0 = testobj.add_variable(idx, "TestIn0", 1.5)
+testin1 = testobj.add_variable(idx, "TestIn1", 2.5)
+testsub = testobj.add_variable(idx, "TestSub", 0.0)
+testsum = testobj.add_variable(idx, "TestSum", 0.0)
+testsum.set_writable()
+testecho = testobj.add_variable(idx, "TestEcho", 0.0)
+testecho.set_writable()
+
+server.start()
+
+try:
+    while True:
+        time.sleep(1)
+        if testsum.get_value() == 4.0:
+            testsub.set_value(7.5)
+        print "SUM", testsum.get_value(), "ECHO", testecho.get_value()
+        sys.stdout.flush()
+finally:
+    server.stop()
+EOF
+SERVER_PID=$!
+
+# Start PLC with opcua batch test
+setsid $BEREMIZPYTHONPATH $BEREMIZPATH/Beremiz_cli.py -k \
+     --project-home $BEREMIZPATH/tests/projects/opcua_client_batch build transfer run > >(
+echo "Start PLC loop"
+while read line; do
+    echo "PLC>> $line"
+done
+echo "End PLC loop"
+) &
+PLC_PID=$!
+
+echo all subprocess started, start polling results
+res=110  # default to ETIMEDOUT
+c=30
+while ((c--)); do
+    if [[ -a ./UNBATCHED ]]; then
+        echo unbatched writes.
+        res=1
+        break
+    fi
+    if [[ -a ./SUMOK && -a ./SUBOK && -a ./READOK && -a ./WRITEOK ]]; then
+        echo got results.
+        res=0  # OK success
+        break
+    else
+        echo waiting.... $c
+        sleep 1
+    fi
+done
+
+# Kill PLC and subprocess
+echo will kill PLC:$PLC_PID and SERVER:$SERVER_PID
+pkill -s $PLC_PID
+kill $SERVER_PID
+
+exit $res
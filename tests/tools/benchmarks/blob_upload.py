@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# See COPYING.Runtime file for copyrights details.
+#
+
+"""
+Blob upload benchmark, as done when transfering PLC to runtime.
+A local stand-in connector calls runtime's PLCObject directly, adding
+given latency to each call, as a remote WAMP link does. Compares chunks
+appended one at a time with windowed upload.
+
+Usage: python blob_upload.py [size in MB]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+import shutil
+import tempfile
+from threading import Thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+from runtime import MainWorker  # noqa
+from runtime.PLCObject import PLCObject  # noqa
+from connectors.ConnectorBase import ConnectorBase  # noqa
+
+
+class LatencyConnector(ConnectorBase):
+    """
+    Call PLCObject methods after half the latency, and return result
+    after other half, calls being concurrent as with WAMP
+    """
+    def __init__(self, plcobj, latency, chunksize, window):
+        self.plcobj = plcobj
+        self.latency = latency
+        self.chuncksize = chunksize
+        self.blobwindow = window
+        # None means runtime can only append chunks
+        self.blobchunksize = 0 if window is None else None
+
+    def __getattr__(self, name):
+        method = getattr(self.plcobj, name)
+
+        def LatencyCall(*args):
+            time.sleep(self.latency / 2.)
+            result = method(*args)
+            time.sleep(self.latency / 2.)
+            return result
+        return LatencyCall
+
+
+def Bench(plcobj, filepath, latency, chunksize, window):
+    connector = LatencyConnector(plcobj, latency, chunksize, window)
+    start = time.time()
+    connector.BlobFromFile(filepath, "seed")
+    duration = time.time() - start
+    plcobj.PurgeBlobs()
+    return os.path.getsize(filepath) / duration / (1024 * 1024)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    workdir = tempfile.mkdtemp()
+    filepath = os.path.join(workdir, "PLC.so")
+    with open(filepath, "wb") as f:
+        f.write(os.urandom(size * 1024 * 1024))
+
+    mainthread = Thread(target=MainWorker.runloop)
+    mainthread.start()
+    while not MainWorker.enabled:
+        time.sleep(0.01)
+    plcobj = PLCObject(workdir, [], None, None, None)
+
+    modes = [("append", 1024 * 1024, None)] + \
+            [("window %d" % window, 1024 * 1024, window) for window in [1, 4, 8]] + \
+            [("window 8", 256 * 1024, 8)]
+    print("%10s %10s %10s %10s" % ("latency", "mode", "chunk kB", "MB/s"))
+    for latency in [0, 0.01, 0.05, 0.2]:
+        for name, chunksize, window in modes:
+            print("%8dms %10s %10d %10.1f" % (
+                latency * 1000, name, chunksize / 1024,
+                Bench(plcobj, filepath, latency, chunksize, window)))
+
+    MainWorker.quit()
+    mainthread.join()
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
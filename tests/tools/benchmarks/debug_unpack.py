@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# See COPYING.Runtime file for copyrights details.
+#
+
+"""
+Micro-benchmark of trace buffer decoders used by IDE debugger.
+Compares compiled UnpackDebugBuffer with reference ctypes implementation,
+and times DeltaDebugBufferUnpacker on delta frames giving a different set
+of variables each time.
+
+Usage: python debug_unpack.py [variables count] [frames count]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import random
+import timeit
+from datetime import timedelta as td
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+from runtime.typemapping import \
+    TypeTranslator, UnpackDebugBuffer, UnpackDebugBufferCtypes, \
+    DeltaDebugBufferUnpacker, TRACE_FRAME_KEY, TraceFrameSeq  # noqa
+
+SAMPLES = [
+    ("BOOL", True),
+    ("INT", -1234),
+    ("UDINT", 123456),
+    ("LREAL", 3.25),
+    ("REAL", 0.5),
+    ("TIME", td(0, 12, 5000)),
+]
+
+
+def BuildFrame(types_values):
+    buff = ""
+    for iectype, value in types_values:
+        c_type, _unpack_func, pack_func = TypeTranslator[iectype]
+        data = buffer(pack_func(c_type, value))[:]
+        if iectype == "STRING":
+            data = data[:1 + len(value)]
+        buff += data
+    return buff
+
+
+def Bench(name, types_values, frames):
+    indexes = tuple([iectype for iectype, _value in types_values])
+    buff = BuildFrame(types_values)
+    expected = [value for _iectype, value in types_values]
+    for func in (UnpackDebugBufferCtypes, UnpackDebugBuffer):
+        assert func(buff, indexes) == expected, func.__name__
+    print(name, "(%d variables, %d frames)" % (len(indexes), frames))
+    results = []
+    for func in (UnpackDebugBufferCtypes, UnpackDebugBuffer):
+        duration = min(timeit.repeat(
+            lambda: func(buff, indexes), repeat=3, number=frames))
+        results.append(duration)
+        print("  %-24s %8.3f ms" % (func.__name__, duration * 1000))
+    print("  speedup %.1fx" % (results[0] / results[1]))
+
+
+def BuildDeltaFrame(types_values, changed, seq, flags=0):
+    bitmap = bytearray((len(types_values) + 7) // 8)
+    for i in changed:
+        bitmap[i >> 3] |= 1 << (i & 7)
+    return chr(flags) + TraceFrameSeq.pack(seq) + str(bitmap) + \
+        BuildFrame([types_values[i] for i in changed])
+
+
+def BenchDelta(name, types_values, frames):
+    indexes = tuple([iectype for iectype, _value in types_values])
+    expected = [value for _iectype, value in types_values]
+    count = len(indexes)
+    # every frame gives a random tenth of variables
+    rand = random.Random(0)
+    deltas = [BuildDeltaFrame(
+        types_values, sorted(rand.sample(range(count), count // 10 or 1)), n)
+              for n in range(1, frames + 1)]
+    keyframe = BuildDeltaFrame(types_values, range(count), 0, TRACE_FRAME_KEY)
+
+    unpacker = DeltaDebugBufferUnpacker(indexes)
+    assert unpacker(keyframe) == expected
+    for buff in deltas:
+        assert unpacker(buff) == expected
+    # frame lost
+    assert unpacker(deltas[0]) is None
+
+    print(name, "(%d variables, key frame and %d delta frames)" % (count, frames))
+    duration = min(timeit.repeat(
+        lambda: map(unpacker, [keyframe] + deltas), repeat=3, number=1))
+    print("  %-24s %8.3f ms" % ("DeltaDebugBufferUnpacker", duration * 1000))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    fixed = [SAMPLES[i % len(SAMPLES)] for i in range(count)]
+    Bench("fixed size types", fixed, frames)
+    mixed = [(("STRING", "var%d" % i) if i % 10 == 0 else sample)
+             for i, sample in enumerate(fixed)]
+    Bench("with STRINGs", mixed, frames)
+    BenchDelta("fixed size types", fixed, frames)
+    BenchDelta("with STRINGs", mixed, frames)
+
+
+if __name__ == '__main__':
+    main()
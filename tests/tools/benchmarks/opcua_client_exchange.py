@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# See COPYING.Runtime file for copyrights details.
+#
+
+"""
+OPC-UA client exchange benchmark.
+A local python-opcua server stands for PLC's OPC-UA server. Code generated
+by OPC-UA client extension is built against open62541 with a small driver
+that times one exchange of all mapped variables, done with one service
+request per variable (as before) and with batched Read/Write requests.
+
+open62541 must be built aside beremiz, as for OPC-UA client extension.
+No reference figures are given : they depend on round-trip time to the
+server, run the benchmark on target network to get meaningful ones.
+
+Usage: python opcua_client_exchange.py [exchanges count]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+import fake_wx  # noqa
+from opcua import Server  # noqa
+from opc_ua.client import Open62541IncludePaths, Open62541LibraryPath  # noqa
+from opc_ua.opcua_client_maker import OPCUAClientModel  # noqa
+
+Endpoint = "opc.tcp://127.0.0.1:4841/beremiz/bench/"
+
+# stands for beremiz.h, that needs matiec headers
+DriverHead = """
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <errno.h>
+
+#define LOG_CRITICAL 0
+#define LOG_WARNING 1
+#define LOG_INFO 2
+
+int LogMessage(uint8_t level, char* buf, uint32_t size);
+long AtomicCompareExchange(long* atomicvar, long compared, long exchange);
+"""
+
+Driver = """
+int LogMessage(uint8_t level, char* buf, uint32_t size){
+    return 0;
+}
+
+long AtomicCompareExchange(long* atomicvar, long compared, long exchange){
+    return __sync_val_compare_and_swap(atomicvar, compared, exchange);
+}
+
+static void PerNodeExchange(void){
+    UA_Variant value;
+    size_t i;
+    for(i = 0; i < INPUT_COUNT; i++){
+        UA_Variant_init(&value);
+        UA_Client_readValueAttribute(client, read_ids[i].nodeId, &value);
+        UA_Variant_clear(&value);
+    }
+    for(i = 0; i < OUTPUT_COUNT; i++)
+        UA_Client_writeValueAttribute(client, write_values[i].nodeId, &write_values[i].value.value);
+}
+
+static void BatchedExchange(void){
+    output_pending = 1;
+    __exchange_bench();
+}
+
+static double Bench(void (*exchange)(void), int count){
+    UA_DateTime start = UA_DateTime_nowMonotonic();
+    int i;
+    for(i = 0; i < count; i++)
+        exchange();
+    return (double)(UA_DateTime_nowMonotonic() - start) / UA_DATETIME_MSEC / count;
+}
+
+int main(int argc, char *argv[]){
+    int count = atoi(argv[1]);
+    if(__init_bench(argc, argv))
+        return EXIT_FAILURE;
+    /* driver exchanges by itself */
+    __stop_exchange_bench();
+    printf("%f %f\\n", Bench(PerNodeExchange, count), Bench(BatchedExchange, count));
+    __cleanup_bench();
+    return EXIT_SUCCESS;
+}
+"""
+
+
+def Build(workdir, modeldata):
+    c_path = os.path.join(workdir, "bench.c")
+    exe_path = os.path.join(workdir, "bench")
+    config = dict(URI=Endpoint, AuthType=None)
+    with open(c_path, "w") as c_file:
+        c_file.write(DriverHead + modeldata.GenerateC(c_path, "bench", config) + Driver)
+    subprocess.check_call(
+        ["gcc", "-O2", c_path, "-o", exe_path] +
+        ["-I" + path for path in Open62541IncludePaths] +
+        [os.path.join(Open62541LibraryPath, "libopen62541.a"), "-lcrypto", "-lpthread"])
+    return exe_path
+
+
+def Bench(server, workdir, size, count):
+    idx = server.register_namespace("http://beremiz.github.io/bench")
+    obj = server.get_objects_node().add_object(idx, "Bench%d" % size)
+    modeldata = OPCUAClientModel(print)
+    for direction, prefix in [("input", "In"), ("output", "Out")]:
+        for n in range(size):
+            var = obj.add_variable(idx, prefix + str(n), 0.0)
+            var.set_writable()
+            modeldata[direction].append([
+                prefix + str(n), var.nodeid.NamespaceIndex, "int",
+                var.nodeid.Identifier, "Double", n])
+
+    exe_path = Build(workdir, modeldata)
+    output = subprocess.check_output([exe_path, str(count)])
+    return [float(ms) for ms in output.split()]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    workdir = tempfile.mkdtemp()
+    server = Server()
+    server.set_endpoint(Endpoint)
+    server.start()
+
+    print("%10s %14s %14s %10s" % ("variables", "per node ms", "batched ms", "speed-up"))
+    try:
+        for size in [1, 10, 100, 500]:
+            per_node, batched = Bench(server, workdir, size, count)
+            print("%10d %14.2f %14.2f %9.1fx" % (
+                2 * size, per_node, batched, per_node / batched))
+    finally:
+        server.stop()
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# See COPYING.Runtime file for copyrights details.
+#
+
+"""
+Contention benchmark of runtime's main worker.
+Many threads issue calls concurrently, as IDEs, WAMP, web UI and SVGHMI
+do when polling PLC status. Compares calls through main thread with
+read-only calls taking the shared fast path.
+
+Usage: python worker_contention.py [calls per thread]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+from threading import Thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+from runtime.Worker import worker  # noqa
+
+
+def ReadOnlyCall():
+    # stands for GetPLCstatus
+    return "Started", [0, 0, 0, 0]
+
+
+def Bench(w, method, threads_count, calls):
+    def ClientProc():
+        for _i in range(calls):
+            method(ReadOnlyCall)
+
+    threads = [Thread(target=ClientProc) for _i in range(threads_count)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - start
+    return threads_count * calls / duration
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    w = worker()
+    mainthread = Thread(target=w.runloop)
+    mainthread.start()
+    while not w.enabled:
+        time.sleep(0.01)
+
+    print("%8s %16s %16s" % ("threads", "call/s", "call_shared/s"))
+    for threads_count in [1, 2, 4, 8, 16]:
+        print("%8d %16.0f %16.0f" % (
+            threads_count,
+            Bench(w, w.call, threads_count, calls),
+            Bench(w, w.call_shared, threads_count, calls)))
+
+    w.quit()
+    mainthread.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz, a Integrated Development Environment for
+# programming IEC 61131-3 automates supporting plcopen standard and CanFestival.
+#
+# See COPYING file for copyrights details.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+On-disk build cache, shared by all projects, content addressed.
+
+ - objects/XX/KEY.o : object file compiled from C source
+ - iec2c/KEY/ : files generated by IEC to C compiler, and its output
+   listing generated files in "iec2c.out"
+
+Least recently used entries are removed once cache exceeds its maximum
+size. Cache location and size can be changed with BEREMIZ_BUILD_CACHE
+and BEREMIZ_BUILD_CACHE_SIZE (in MB, 0 disables cache) environment
+variables.
+"""
+
+from __future__ import absolute_import
+import os
+import shutil
+import hashlib
+import tempfile
+
+DefaultCacheSize = 1024  # MB
+
+IEC2COutputFileName = "iec2c.out"
+
+
+def GetDefaultCachePath():
+    path = os.environ.get("BEREMIZ_BUILD_CACHE")
+    if path:
+        return path
+    if os.name in ("nt", "ce"):
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME",
+                              os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "beremiz", "build")
+
+
+def GetDefaultCacheSize():
+    try:
+        return int(os.environ.get("BEREMIZ_BUILD_CACHE_SIZE",
+                                  DefaultCacheSize)) * 1024 * 1024
+    except ValueError:
+        return DefaultCacheSize * 1024 * 1024
+
+
+def HashKey(*parts):
+    """
+    Return cache key made of given strings
+    """
+    s = hashlib.sha1()
+    for part in parts:
+        s.update(part)
+        s.update("\0")
+    return s.hexdigest()
+
+
+def HashFile(path, *parts):
+    """
+    Return cache key made of given file content and strings
+    """
+    s = hashlib.sha1()
+    for part in parts:
+        s.update(part)
+        s.update("\0")
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(1 << 16)
+            if not data:
+                break
+            s.update(data)
+    return s.hexdigest()
+
+
+def _touch(path):
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _rename(src, dst):
+    try:
+        os.rename(src, dst)
+    except OSError:
+        # already there, stored meanwhile by another build
+        if os.path.isdir(src):
+            shutil.rmtree(src, True)
+        elif os.path.exists(src):
+            os.remove(src)
+
+
+class BuildCache(object):
+    """
+    Cache errors never make build fail, they only lead to cache misses.
+    """
+    def __init__(self, path=None, max_size=None):
+        self.path = GetDefaultCachePath() if path is None else path
+        self.max_size = GetDefaultCacheSize() if max_size is None else max_size
+        self.enabled = self.max_size > 0
+        self.objects_path = os.path.join(self.path, "objects")
+        self.iec2c_path = os.path.join(self.path, "iec2c")
+
+    def _ObjectPath(self, key):
+        return os.path.join(self.objects_path, key[:2], key + ".o")
+
+    def _TempPath(self, dirpath, is_dir=False):
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath)
+        if is_dir:
+            return tempfile.mkdtemp(dir=dirpath, prefix=".tmp")
+        fd, path = tempfile.mkstemp(dir=dirpath, prefix=".tmp")
+        os.close(fd)
+        return path
+
+    def GetObject(self, key, objectfilename):
+        """
+        Copy cached object to given file
+        @return: True if object was found in cache
+        """
+        if not self.enabled:
+            return False
+        path = self._ObjectPath(key)
+        try:
+            shutil.copyfile(path, objectfilename)
+        except (IOError, OSError):
+            return False
+        _touch(path)
+        return True
+
+    def PutObject(self, key, objectfilename):
+        if not self.enabled:
+            return
+        path = self._ObjectPath(key)
+        try:
+            tmppath = self._TempPath(os.path.dirname(path))
+            shutil.copyfile(objectfilename, tmppath)
+            _rename(tmppath, path)
+        except (IOError, OSError):
+            pass
+
+    def GetIEC2CResult(self, key, buildpath):
+        """
+        Copy files generated by IEC to C compiler to build path
+        @return: IEC to C compiler output, or None if not found in cache
+        """
+        if not self.enabled:
+            return None
+        entrypath = os.path.join(self.iec2c_path, key)
+        outpath = os.path.join(entrypath, IEC2COutputFileName)
+        try:
+            with open(outpath, "r") as f:
+                result = f.read()
+            for fname in os.listdir(entrypath):
+                if fname != IEC2COutputFileName:
+                    shutil.copyfile(os.path.join(entrypath, fname),
+                                    os.path.join(buildpath, fname))
+        except (IOError, OSError):
+            return None
+        _touch(outpath)
+        return result
+
+    def PutIEC2CResult(self, key, buildpath, fnames, result):
+        if not self.enabled:
+            return
+        entrypath = os.path.join(self.iec2c_path, key)
+        try:
+            tmppath = self._TempPath(self.iec2c_path, is_dir=True)
+            for fname in fnames:
+                shutil.copyfile(os.path.join(buildpath, fname),
+                                os.path.join(tmppath, fname))
+            with open(os.path.join(tmppath, IEC2COutputFileName), "w") as f:
+                f.write(result)
+            _rename(tmppath, entrypath)
+        except (IOError, OSError):
+            pass
+
+    def GetEntries(self):
+        """
+        Return list of (last use time, size, path, kind) of cache entries
+        """
+        entries = []
+        if os.path.isdir(self.objects_path):
+            for dirpath, _dirnames, fnames in os.walk(self.objects_path):
+                for fname in fnames:
+                    if fname.startswith(".tmp"):
+                        continue
+                    path = os.path.join(dirpath, fname)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path, "objects"))
+        if os.path.isdir(self.iec2c_path):
+            for dname in os.listdir(self.iec2c_path):
+                if dname.startswith(".tmp"):
+                    continue
+                path = os.path.join(self.iec2c_path, dname)
+                try:
+                    size = sum([os.path.getsize(os.path.join(path, fname))
+                                for fname in os.listdir(path)])
+                    mtime = os.path.getmtime(
+                        os.path.join(path, IEC2COutputFileName))
+                except OSError:
+                    continue
+                entries.append((mtime, size, path, "iec2c"))
+        return entries
+
+    def GetStats(self):
+        """
+        Return dict of kind : (entries count, size)
+        """
+        stats = {"objects": (0, 0), "iec2c": (0, 0)}
+        for _mtime, size, _path, kind in self.GetEntries():
+            count, total = stats[kind]
+            stats[kind] = (count + 1, total + size)
+        return stats
+
+    def Prune(self, max_size=None):
+        """
+        Remove least recently used entries until cache fits in max_size
+        @return: (count of removed entries, freed size)
+        """
+        if max_size is None:
+            max_size = self.max_size
+        entries = self.GetEntries()
+        total = sum([size for _mtime, size, _path, _kind in entries])
+        removed = 0
+        freed = 0
+        entries.sort()
+        for _mtime, size, path, _kind in entries:
+            if total - freed <= max_size:
+                break
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += size
+        return removed, freed
+
+    def Clear(self):
+        return self.Prune(0)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Beremiz, a Integrated Development Environment for
+# programming IEC 61131-3 automates supporting plcopen standard and CanFestival.
+#
+# See COPYING file for copyrights details.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+Split POUS.c generated by iec2c into one C file per POU, so that
+unchanged POUs keep their object file when program is built again.
+
+POUS.c is included by resources C files. Split files are compiled with
+the part of resource C file preceding that include instead.
+Splitting is given up, and POUS.c kept as is, as soon as generated code
+doesn't look like a sequence of POU functions that can be compiled apart.
+"""
+
+from __future__ import absolute_import
+import re
+
+POUS_C_INCLUDE = '#include "POUS.c"'
+
+function_re = re.compile(
+    r'^\s*(static\s+)?(?:inline\s+)?[A-Za-z_][\w\s\*]*?\b([A-Za-z_]\w*)\s*\(')
+define_re = re.compile(r'^\s*#\s*define\s+([A-Za-z_]\w*)')
+undef_re = re.compile(r'^\s*#\s*undef\s+([A-Za-z_]\w*)')
+include_re = re.compile(r'^\s*#\s*include\b')
+preamble_re = re.compile(r'^\s*(#|//|/\*|\*|extern\b|$)')
+
+
+class CScanner(object):
+    """
+    Track braces depth in C code, ignoring comments and literals
+    """
+    def __init__(self):
+        self.depth = 0
+        self.in_comment = False
+
+    def feed(self, line):
+        i = 0
+        n = len(line)
+        while i < n:
+            c = line[i]
+            if self.in_comment:
+                if line.startswith("*/", i):
+                    self.in_comment = False
+                    i += 1
+            elif line.startswith("/*", i):
+                self.in_comment = True
+                i += 1
+            elif line.startswith("//", i):
+                return
+            elif c in "\"'":
+                i += 1
+                while i < n and line[i] != c:
+                    if line[i] == "\\":
+                        i += 1
+                    i += 1
+            elif c == "{":
+                self.depth += 1
+            elif c == "}":
+                self.depth -= 1
+            i += 1
+
+
+def _SplitItems(source):
+    """
+    Return common includes, and list of top level items as
+    (static, function name, text), or None if unexpected code is found
+    """
+    includes = []
+    items = []
+    pending = []
+    scanner = CScanner()
+    head = None
+    for line in source.splitlines(True):
+        was_toplevel = scanner.depth == 0 and not scanner.in_comment
+        scanner.feed(line)
+        if was_toplevel and head is None:
+            if include_re.match(line):
+                includes.append(line)
+                continue
+            undef = undef_re.match(line)
+            if undef is not None and items and not "".join(pending).strip():
+                # closes macro defined for previous item
+                static, name, text = items[-1]
+                items[-1] = (static, name, text + "".join(pending) + line)
+                pending = []
+                continue
+            stripped = line.strip()
+            if stripped.startswith("#") or stripped.startswith("//") or \
+               stripped.startswith("/*") or not stripped or \
+               scanner.in_comment:
+                pending.append(line)
+                continue
+            head = function_re.match(line)
+            if head is None:
+                # top level declaration, possibly shared by POUs
+                return None
+        if head is not None:
+            pending.append(line)
+            if scanner.depth == 0 and "{" in "".join(pending):
+                items.append((head.group(1) is not None, head.group(2),
+                              "".join(pending)))
+                pending = []
+                head = None
+            elif scanner.depth == 0 and line.rstrip().endswith(";"):
+                # prototype or declaration
+                return None
+    if head is not None or scanner.depth != 0:
+        return None
+    if pending and items:
+        static, name, text = items[-1]
+        items[-1] = (static, name, text + "".join(pending))
+    return includes, items
+
+
+def SplitPOUsC(source):
+    """
+    Return list of (POU name, C code) of POUs defined in POUS.c source,
+    with static helpers preceding each POU, or None if it can't be split.
+    """
+    res = _SplitItems(source)
+    if res is None or not res[1]:
+        return None
+    includes, items = res
+
+    units = []
+    current = []
+    for static, name, text in items:
+        current.append((static, name, text))
+        # function blocks and programs are made of init and body functions
+        if not static and not name.endswith("_init__"):
+            pouname = name[:-len("_body__")] if name.endswith("_body__") else name
+            units.append((pouname, current))
+            current = []
+    if current:
+        if not units:
+            return None
+        pouname, unit = units[-1]
+        units[-1] = (pouname, unit + current)
+
+    result = []
+    for pouname, unit in units:
+        text = "".join([item_text for _static, _name, item_text in unit])
+        # macros must not leak to other POUs
+        defines = set()
+        for line in text.splitlines():
+            define = define_re.match(line)
+            if define is not None:
+                defines.add(define.group(1))
+            undef = undef_re.match(line)
+            if undef is not None:
+                defines.discard(undef.group(1))
+        if defines:
+            return None
+        result.append((pouname, "".join(includes) + text))
+
+    # static functions can't be used by other POUs
+    for pouname, unit in units:
+        for static, name, _text in unit:
+            if static:
+                used = re.compile(r"\b%s\b" % name)
+                for other, text in result:
+                    if other != pouname and used.search(text):
+                        return None
+
+    return result
+
+
+def GetResourcePreamble(resource_source):
+    """
+    Return part of resource C code preceding POUS.c include, or None
+    if there is no such include, or if it defines anything
+    """
+    idx = resource_source.find(POUS_C_INCLUDE)
+    if idx == -1:
+        return None
+    preamble = resource_source[:idx]
+    in_comment = False
+    for line in preamble.splitlines():
+        if in_comment or line.strip().startswith("/*"):
+            in_comment = "*/" not in line
+            continue
+        if not preamble_re.match(line):
+            return None
+    return preamble